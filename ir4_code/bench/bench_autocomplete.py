@@ -0,0 +1,79 @@
+# bench_autocomplete.py
+# 对比 /autocomplete 原来的 Elasticsearch 前缀查询与进程内补全索引（query/suggest.py）的单次查询延迟。
+# 用法：python bench/bench_autocomplete.py [es_url]   （在 ir4_code 目录下运行）
+# 给出 es_url 时从该 Elasticsearch 的 my_index 中读取标题构建补全索引，并对其发送前缀查询；
+# 不指定时使用合成的标题和本地 mock Elasticsearch（只有请求往返的开销，是真实 ES 延迟的下限）。
+import os
+import random
+import sys
+import tempfile
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query'))
+
+from mock_es import start_server
+from suggest import SuggestionIndex, collect, write_suggestions
+
+NUM_TITLES = 100000
+NUM_PREFIXES = 500
+WORDS = ['南开大学', '计算机学院', '关于', '举办', '学术讲座', '通知', '公告', '研究生', '招生', '考试', '安排',
+         '2024年', '第十届', '人工智能', '网络空间安全', '实验室', '开放日', '奖学金', '评选', '结果公示']
+
+
+def synthetic_titles():
+    random.seed(0)
+    return [(''.join(random.choices(WORDS, k=random.randint(2, 6))), random.random()) for _ in range(NUM_TITLES)]
+
+
+def es_titles(es):
+    return [(hit["_source"].get("title", ""), hit["_source"].get("pagerank_score"))
+            for hit in helpers.scan(es, index="my_index", query={"query": {"match_all": {}}},
+                                    _source=["title", "pagerank_score"], size=2000)]
+
+
+def es_prefix(es, term):
+    """query.py 原来的 /autocomplete。"""
+    resp = es.search(index="my_index", body={"query": {"prefix": {"title": term}}, "size": 10, "_source": ["title"]})
+    return [hit["_source"].get("title", "") for hit in resp["hits"]["hits"]]
+
+
+def latencies(func, prefixes):
+    result = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        func(prefix)
+        result.append((time.perf_counter() - start) * 1e6)
+    result.sort()
+    return result
+
+
+def report(name, values):
+    pct = lambda p: values[min(len(values) - 1, int(len(values) * p))]
+    print(f"{name:<24} {pct(0.5):>10.1f} {pct(0.99):>10.1f} {sum(values) / len(values):>10.1f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        es = Elasticsearch([sys.argv[1]], request_timeout=60)
+        titles = es_titles(es)
+    else:
+        server, url = start_server()
+        es = Elasticsearch([url], request_timeout=60)
+        titles = synthetic_titles()
+
+    random.seed(1)
+    prefixes = [t[:random.randint(1, 4)] for t, _ in random.choices(titles, k=NUM_PREFIXES) if t]
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        entries = collect(titles, [])
+        write_suggestions(entries, os.path.join(tmp, 'suggestions'))
+        print(f"Built suggestion index: {len(entries)} entries in {time.perf_counter() - start:.2f}s")
+        index = SuggestionIndex(os.path.join(tmp, 'suggestions'))
+
+        es_prefix(es, prefixes[0])  # 建立连接
+        print(f"\n{'method':<24} {'p50 (us)':>10} {'p99 (us)':>10} {'mean (us)':>10}")
+        report("elasticsearch prefix", latencies(lambda p: es_prefix(es, p), prefixes))
+        report("suggestion index", latencies(lambda p: index.complete(p, 10), prefixes))
+        index.snapshot = None  # 释放映射，Windows 上才能删除临时目录
@@ -0,0 +1,46 @@
+# bench_crawl.py
+# 用本地 mock 站点测量 spider.main() 在不同并发设置下的抓取速度（pages/sec）。
+# 用法：python bench/bench_crawl.py （在 ir4_code 目录下运行）
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spider
+from mock_site import start_server
+
+PAGES = 300
+SETTINGS = [  # (CONCURRENCY, PER_HOST_CONCURRENCY)
+    (1, 1),
+    (4, 4),
+    (16, 16),
+    (32, 32),
+]
+
+
+def run(concurrency, per_host, start_url, save_path):
+    spider.START_URL = start_url
+    spider.SAVE_PATH = save_path
+    spider.MAX_PAGES = PAGES
+    spider.DELAY = 0
+    spider.CONCURRENCY = concurrency
+    spider.PER_HOST_CONCURRENCY = per_host
+    spider.STATS_INTERVAL = PAGES + 1
+    start = time.perf_counter()
+    spider.main()
+    return PAGES / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    server, url = start_server(latency=0.05)
+    results = []
+    for concurrency, per_host in SETTINGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            results.append((concurrency, per_host, run(concurrency, per_host, url, tmp)))
+    server.shutdown()
+
+    print("\nconcurrency  per_host  pages/sec")
+    for concurrency, per_host, rate in results:
+        print(f"{concurrency:>11}  {per_host:>8}  {rate:>9.1f}")
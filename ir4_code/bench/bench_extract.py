@@ -0,0 +1,72 @@
+# bench_extract.py
+# 页面提取微基准：对比原来的 BeautifulSoup(html.parser) + extract_links + extract_page_info 路径
+# 与 extract.extract_page（单次遍历，lxml）在单进程和进程池下的速度，并检查提取结果是否一致。
+# 用法：python bench/bench_extract.py [数据目录]   （在 ir4_code 目录下运行）
+# 数据目录中应为 spider.py 保存的分片（含 raw_html）；不指定时使用 mock 站点生成的页面。
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+import spider
+from extract import extract_page
+from mock_site import render_page
+from shards import iter_docs
+
+MAX_DOCS = 2000
+
+
+def load_pages(data_dir):
+    pages = []
+    if data_dir:
+        for doc in iter_docs(data_dir):
+            if doc.get('raw_html'):
+                pages.append((doc['url'], doc['raw_html'].encode('utf-8')))
+            if len(pages) >= MAX_DOCS:
+                break
+    else:
+        for n in range(MAX_DOCS // 4):
+            pages.append((f'http://127.0.0.1/page/{n}', render_page(n, 5000, 40).encode('utf-8')))
+    return pages
+
+
+def old_path(url, content, domain):
+    soup = BeautifulSoup(content, 'html.parser')
+    anchor_texts = set(a.get_text(strip=True) for a in soup.find_all('a', href=True) if a.get_text(strip=True))
+    outlinks, attachments = spider.extract_links(soup, url, domain)
+    return spider.extract_page_info(url, soup, anchor_texts, outlinks, attachments, None)
+
+
+def timed(name, func, pages):
+    start = time.perf_counter()
+    results = func(pages)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {len(pages) / elapsed:>10.1f} pages/sec")
+    return results
+
+
+def same(a, b):
+    keys = ['title', 'content', 'anchor_texts', 'outlinks', 'attachments']
+    return all(set(a[k]) == set(b[k]) if isinstance(a[k], list) else a[k] == b[k] for k in keys)
+
+
+if __name__ == '__main__':
+    pages = load_pages(sys.argv[1] if len(sys.argv) > 1 else None)
+    jobs = [(url, content, urlparse(url).netloc) for url, content in pages]
+    print(f"{len(jobs)} 个页面")
+
+    old = timed("BeautifulSoup (html.parser)", lambda js: [old_path(*j) for j in js], jobs)
+    new = timed("extract_page", lambda js: [extract_page(*j) for j in js], jobs)
+    workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pool.submit(int).result()  # 预先启动进程
+        timed(f"extract_page x{workers} 进程",
+              lambda js: list(pool.map(extract_page, *zip(*js), chunksize=16)), jobs)
+
+    mismatched = sum(1 for a, b in zip(old, new) if not same(a, b))
+    print(f"结果不一致的页面: {mismatched} / {len(jobs)}")
@@ -0,0 +1,80 @@
+# bench_index.py
+# 用本地 mock Elasticsearch 对比原来的单线程 streaming_bulk（固定 500 条一批）与 bulk_ingest.ingest 的导入速度，
+# 并检查每个文档都恰好写入一次（mock 按比例返回 429，验证退避重试不丢文档、不重复写入）。
+# 最后一行在同一个 mock 上导入两次，第二次所有文档内容都没有变化，应全部跳过。
+# 用法：python bench/bench_index.py   （在 ir4_code 目录下运行）
+import os
+import sys
+import tempfile
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'index'))
+
+import bulk_ingest
+from mock_es import start_server
+from mock_site import render_page
+from shards import ShardWriter, iter_records, list_shards
+
+NUM_DOCS = 20000
+RECORDS_PER_SHARD = 1000
+SENDERS = [1, 4, 8]
+MOCK_OPTIONS = dict(latency=0.02, latency_per_mb=0.05, item_reject_rate=0.01, max_concurrent=6)
+
+
+def make_corpus(path):
+    writer = ShardWriter(path, max_records=RECORDS_PER_SHARD)
+    for n in range(NUM_DOCS):
+        html = render_page(n, NUM_DOCS, 20)
+        writer.write({'url': f'http://example.com/page/{n}', 'title': f'测试页面 {n}', 'anchor_texts': [],
+                      'content': html[:2000], 'outlinks': [], 'attachments': [], 'raw_html': html})
+    writer.close()
+
+
+def run_streaming_bulk(url, path):
+    """原 index_data.py 的做法。"""
+    es = Elasticsearch([url], request_timeout=360)
+    actions = ({"_index": "my_index", "_source": doc} for f in list_shards(path) for doc in iter_records(f))
+    ok = 0
+    for success, _ in helpers.streaming_bulk(es, actions, chunk_size=500, max_retries=8,
+                                             raise_on_error=False, raise_on_exception=False):
+        ok += success
+    return ok
+
+
+def run_ingest(url, path, senders):
+    es = Elasticsearch([url], request_timeout=360)
+    return bulk_ingest.ingest(es, list_shards(path), "my_index", senders=senders, report_interval=2).docs
+
+
+def run_ingest_twice(url, path):
+    run_ingest(url, path, 4)
+    es = Elasticsearch([url], request_timeout=360)
+    stats = bulk_ingest.ingest(es, list_shards(path), "my_index", report_interval=2)
+    return stats.skipped
+
+
+def measure(name, func, *args):
+    server, url = start_server(**MOCK_OPTIONS)
+    start = time.perf_counter()
+    ok = func(url, *args)
+    elapsed = time.perf_counter() - start
+    handler = server.RequestHandlerClass
+    server.shutdown()
+    exact = len(handler.received) == NUM_DOCS and all(v == 1 for v in handler.received.values())
+    return name, ok, ok / elapsed, handler.requests['rejected'] + handler.requests['items_rejected'], exact
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        make_corpus(tmp)
+        results = [measure("streaming_bulk(500)", run_streaming_bulk, tmp)]
+        for senders in SENDERS:
+            results.append(measure(f"ingest(senders={senders})", run_ingest, tmp, senders))
+        results.append(measure("ingest re-run (skipped)", run_ingest_twice, tmp))
+
+    print(f"\n{'method':<24} {'docs':>6} {'docs/sec':>9} {'429s':>6}  exactly-once")
+    for name, ok, rate, rejected, exact in results:
+        print(f"{name:<24} {ok:>6} {rate:>9.1f} {rejected:>6}  {exact}")
@@ -0,0 +1,64 @@
+# bench_pagerank.py
+# 对比 networkx 与 sparse_pagerank 的 PageRank 计算：耗时，以及两者分数的差异是否在容差内。
+# 用法：python bench/bench_pagerank.py [link_cache]   （在 ir4_code 目录下运行）
+# link_cache 为 pagerank.py 生成的链接图缓存目录；不指定时使用合成的链接图。
+import os
+import sys
+import time
+
+import networkx as nx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pagerank'))
+
+from bench_schedule import synthetic_graph
+from link_graph import load_links
+from sparse_pagerank import LinkGraph, pagerank, scores_dict
+
+TOLERANCE = 1e-10
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{name:<28} {time.perf_counter() - start:>8.2f} s")
+    return result
+
+
+def build_networkx(links):
+    G = nx.DiGraph()
+    for url, outlinks in links.items():
+        if not G.has_node(url):
+            G.add_node(url)
+        for link in outlinks:
+            if link and link != url:
+                G.add_edge(url, link)
+    return G
+
+
+def build_sparse(links):
+    graph = LinkGraph()
+    for url, outlinks in links.items():
+        graph.add_links(url, outlinks)
+    return graph
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        links = load_links(sys.argv[1])
+    else:
+        links = synthetic_graph(200000)
+
+    G = timed("networkx: build graph", lambda: build_networkx(links))
+    expected = timed("networkx: pagerank", lambda: nx.pagerank(G, tol=TOLERANCE))
+    graph = timed("sparse: build graph", lambda: build_sparse(links))
+    x = timed("sparse: pagerank", lambda: pagerank(graph, tol=TOLERANCE))
+    actual = scores_dict(graph, x)
+    timed("sparse: warm start", lambda: pagerank(graph, tol=TOLERANCE, init=actual))
+
+    max_diff = max(abs(actual[url] - score) for url, score in expected.items())
+    l1_diff = sum(abs(actual[url] - score) for url, score in expected.items())
+    print(f"{len(expected)} 个节点，最大绝对误差 {max_diff:.2e}，L1 误差 {l1_diff:.2e}")
+    assert set(actual) == set(expected)
+    assert l1_diff < len(expected) * TOLERANCE, "分数差异超出容差"
+    print("分数在容差范围内一致")
@@ -0,0 +1,73 @@
+# bench_schedule.py
+# 在给定链接图上模拟有预算的抓取，比较 BFS（Frontier）与 OPIC（PriorityFrontier）调度：
+# 统计前 B 个抓取的页面覆盖了多少 PageRank 最高的 TOP_K 个页面。
+# 用法：python bench/bench_schedule.py [link_cache] [起始URL]   （在 ir4_code 目录下运行）
+# link_cache 为 pagerank.py 生成的链接图缓存目录；不指定时使用合成的链接图。
+import os
+import random
+import sys
+import tempfile
+
+import networkx as nx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pagerank'))
+
+from frontier import Frontier, PriorityFrontier
+from link_graph import load_links
+
+TOP_K_RATIO = 0.01              # 取 PageRank 最高的前 1% 页面作为“重要页面”
+BUDGET_RATIOS = [0.02, 0.05, 0.1, 0.25, 0.5]  # 抓取预算占页面总数的比例
+
+
+def synthetic_graph(num_pages=20000, seed=0):
+    """首页链接少量栏目页，每个页面既链接热门页面（编号小的页面更常被链接）也链接随机的深层页面。"""
+    rng = random.Random(seed)
+    graph = {}
+    for n in range(num_pages):
+        popular = {int(num_pages ** rng.random()) - 1 for _ in range(5)}
+        deep = {rng.randrange(num_pages) for _ in range(5)}
+        graph[f'p{n}'] = [f'p{m}' for m in (popular | deep) if m != n]
+    graph['p0'] = [f'p{m}' for m in range(1, 30)] + [f'p{rng.randrange(num_pages)}' for _ in range(30)]
+    return graph
+
+
+def crawl_order(frontier, graph, start_url, budget):
+    frontier.push(start_url)
+    order = []
+    while len(order) < budget:
+        url = frontier.pop()
+        if url is None:
+            break
+        order.append(url)
+        frontier.push_links(url, graph.get(url, []))
+        frontier.done(url)
+    return order
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        graph = load_links(sys.argv[1])
+        start_url = sys.argv[2] if len(sys.argv) > 2 else next(iter(graph))
+    else:
+        graph = synthetic_graph()
+        start_url = 'p0'
+
+    G = nx.DiGraph()
+    for url, outlinks in graph.items():
+        G.add_node(url)
+        G.add_edges_from((url, link) for link in outlinks if link != url)
+    scores = nx.pagerank(G)
+    top_k = max(1, int(len(scores) * TOP_K_RATIO))
+    top = set(sorted(scores, key=scores.get, reverse=True)[:top_k])
+    print(f"{len(scores)} 个页面，{G.number_of_edges()} 条边，统计 PageRank 前 {top_k} 个页面的覆盖率")
+
+    print("\n  预算    BFS覆盖率   OPIC覆盖率")
+    for ratio in BUDGET_RATIOS:
+        budget = max(1, int(len(scores) * ratio))
+        row = []
+        for frontier_class in (Frontier, PriorityFrontier):
+            with tempfile.TemporaryDirectory() as tmp:
+                order = crawl_order(frontier_class(tmp), graph, start_url, budget)
+            row.append(len(top.intersection(order)) / top_k)
+        print(f"{budget:>6}    {row[0]:>8.1%}    {row[1]:>8.1%}")
@@ -0,0 +1,138 @@
+# bench_serving.py
+# /search 的压力测试：对比原来的服务方式（Flask 开发服务器，每个请求一个线程，同步 Elasticsearch 客户端）
+# 与现在的 query.py（Quart + AsyncElasticsearch，hypercorn 运行 1 个和 WORKERS 个 worker 进程）的吞吐量和延迟。
+# 后端为本地 mock Elasticsearch（每个查询延迟 SEARCH_LATENCY 秒，模拟真实集群的处理时间）；
+# 每个请求使用不同的查询词，结果缓存不会命中，每个请求都会查询 Elasticsearch。
+# 用法：python bench/bench_serving.py   （在 ir4_code 目录下运行，需要安装 quart、hypercorn、aiohttp）
+import asyncio
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from mock_es import start_server
+
+QUERY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query')
+ES_PORT = 9299
+APP_PORT = 5099
+SEARCH_LATENCY = 0.1     # 带高亮和 function_score 的查询在真实集群上的典型耗时
+CONCURRENCY = [8, 64]    # 同时在途的请求数
+DURATION = 10            # 每种配置的测试时间（秒）
+WORKERS = [1, os.cpu_count() or 1]
+
+
+def run_mock_es():
+    server, url = start_server(ES_PORT, search_latency=SEARCH_LATENCY)
+    server.serve_forever()
+
+
+def run_sync_app():
+    """原来的 /search：同步客户端（默认连接池）依次查询 Elasticsearch 并渲染结果页。"""
+    from elasticsearch import Elasticsearch
+    from flask import Flask, render_template, request
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    app = Flask(__name__, template_folder=os.path.join(QUERY_DIR, 'templates'))
+    es = Elasticsearch([f"http://127.0.0.1:{ES_PORT}"])
+
+    @app.route("/search")
+    def search():
+        query_term = request.args.get("q", "")
+        response = es.search(index="my_index", body={
+            "query": {"multi_match": {"query": query_term, "fields": ["title", "content", "anchor_texts"]}},
+            "size": 15})
+        hits = response["hits"]["hits"]
+        return render_template("results.html", query=query_term, results=hits,
+                               total_results=response["hits"]["total"]["value"], query_type="standard",
+                               page=1, page_size=15, next_after=None, logged_in=False, user_id=None)
+
+    app.run(host="127.0.0.1", port=APP_PORT, threaded=True)
+
+
+def start_async_app(workers, workdir):
+    env = dict(os.environ, ES_URL=f"http://127.0.0.1:{ES_PORT}", PYTHONPATH=QUERY_DIR)
+    return subprocess.Popen([sys.executable, '-m', 'hypercorn', '-c', os.path.join(QUERY_DIR, 'hypercorn.toml'),
+                             '-b', f'127.0.0.1:{APP_PORT}', '-w', str(workers), 'query:app'],
+                            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(session):
+    for _ in range(200):
+        try:
+            async with session.get(f"http://127.0.0.1:{APP_PORT}/search?q=ready") as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def load(concurrency, tag):
+    """concurrency 个客户端连续发送请求 DURATION 秒，返回 (每秒请求数, 延迟列表 ms, 失败数)。"""
+    latencies, errors = [], 0
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await wait_ready(session)
+        deadline = time.perf_counter() + DURATION
+        counter = iter(range(10 ** 9))
+
+        async def client():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    async with session.get(f"http://127.0.0.1:{APP_PORT}/search",
+                                           params={"q": f"{tag}{next(counter)}"}) as resp:
+                        await resp.read()
+                        ok = resp.status == 200
+                except aiohttp.ClientError:
+                    ok = False
+                if ok:
+                    latencies.append((time.perf_counter() - start) * 1000)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies, errors
+
+
+def report(name, concurrency, result):
+    rps, latencies, errors = result
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float('nan')
+    print(f"{name:<28} {concurrency:>6} {rps:>10.0f} {pct(0.5):>10.1f} {pct(0.99):>10.1f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    mock = multiprocessing.Process(target=run_mock_es, daemon=True)
+    mock.start()
+    print(f"mock Elasticsearch: {SEARCH_LATENCY * 1000:.0f} ms per search; {DURATION}s per run\n")
+    print(f"{'server':<28} {'conc':>6} {'req/s':>10} {'p50 (ms)':>10} {'p99 (ms)':>10} {'errors':>7}")
+
+    for concurrency in CONCURRENCY:
+        server = multiprocessing.Process(target=run_sync_app, daemon=True)
+        server.start()
+        try:
+            report("flask threaded + sync es", concurrency, asyncio.run(load(concurrency, f"s{concurrency}-")))
+        finally:
+            server.terminate()
+            server.join()
+
+        for workers in sorted(set(WORKERS)):
+            with tempfile.TemporaryDirectory() as workdir:
+                server = start_async_app(workers, workdir)
+                try:
+                    report(f"hypercorn x{workers} + async es", concurrency,
+                           asyncio.run(load(concurrency, f"a{workers}-{concurrency}-")))
+                finally:
+                    server.terminate()
+                    server.wait()
+    mock.terminate()
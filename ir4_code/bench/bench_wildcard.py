@@ -0,0 +1,103 @@
+# bench_wildcard.py
+# 对比通配查询原来的 query_string（*词*，前导通配符需要遍历词典）与 infix 子字段（wildcard 类型）上的 wildcard 查询。
+# 用法：python bench/bench_wildcard.py es_url [查询数]   （在 ir4_code 目录下运行）
+# 需要真实的 Elasticsearch 和用 index_lifecycle.py build 重建过（含 infix 子字段）的 my_index；
+# mock Elasticsearch 不执行查询，测不出两者的差别。
+# 查询词为标题中随机截取的 2~4 个字（中缀）和查询日志 query/query_log.db 中的查询，两种查询各取前 10 条结果。
+import os
+import random
+import sys
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query'))
+
+from query_log import QueryLog
+
+INDEX = "my_index"
+NUM_QUERIES = 200
+QUERY_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query', 'query_log.db')
+WILDCARD_FIELDS = {"title.infix": 3, "content.infix": 2, "anchor_texts.infix": 1}  # 与 query.py 相同
+
+
+def query_string_query(term):
+    """query.py 原来的 wildcard_search。"""
+    return {"query_string": {"query": f"*{term}*", "fields": ["title^3", "content^2", "anchor_texts"],
+                             "default_operator": "AND"}}
+
+
+def infix_query(term):
+    """query.py 现在的 wildcard_search。"""
+    clauses = []
+    for token in term.split():
+        pattern = token if '*' in token or '?' in token else f"*{token}*"
+        clauses.append({"bool": {"should": [
+            {"wildcard": {field: {"value": pattern, "case_insensitive": True, "boost": boost}}}
+            for field, boost in WILDCARD_FIELDS.items()]}})
+    return {"bool": {"must": clauses}}
+
+
+def sample_terms(es, n):
+    random.seed(0)
+    titles = [hit["_source"].get("title", "") for hit in helpers.scan(
+        es, index=INDEX, query={"query": {"match_all": {}}}, _source=["title"], size=2000)]
+    titles = [t.strip() for t in titles if t and len(t.strip()) >= 4]
+    terms = []
+    for title in random.sample(titles, min(n // 2, len(titles))):
+        length = random.randint(2, 4)
+        start = random.randint(0, len(title) - length)
+        terms.append(title[start:start + length])
+    if os.path.exists(QUERY_LOG):
+        logged = [q for q in dict.fromkeys(QueryLog(QUERY_LOG).queries()) if q]
+        terms += random.sample(logged, min(n - len(terms), len(logged)))
+    return [t for t in terms if t.strip()]
+
+
+def run(es, make_query, terms):
+    """返回 (客户端延迟 ms, ES took ms, 每个查询的前 10 个 _id, 每个查询的结果总数)。"""
+    latency, took, ids, totals = [], [], [], []
+    for term in terms:
+        start = time.perf_counter()
+        resp = es.search(index=INDEX, body={"query": make_query(term), "size": 10, "_source": False,
+                                            "track_total_hits": True})
+        latency.append((time.perf_counter() - start) * 1000)
+        took.append(resp["took"])
+        ids.append([hit["_id"] for hit in resp["hits"]["hits"]])
+        totals.append(resp["hits"]["total"]["value"])
+    return latency, took, ids, totals
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report(name, latency, took):
+    print(f"{name:<20} {pct(latency, 0.5):>10.1f} {pct(latency, 0.99):>10.1f} "
+          f"{pct(took, 0.5):>10.1f} {pct(took, 0.99):>10.1f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python bench/bench_wildcard.py es_url [num_queries]")
+        sys.exit(1)
+    es = Elasticsearch([sys.argv[1]], request_timeout=120)
+    terms = sample_terms(es, int(sys.argv[2]) if len(sys.argv) > 2 else NUM_QUERIES)
+    print(f"{len(terms)} queries, e.g. {terms[:5]}")
+
+    # 先各运行一遍预热缓存，再交替测量两种查询
+    run(es, query_string_query, terms)
+    run(es, infix_query, terms)
+    old = run(es, query_string_query, terms)
+    new = run(es, infix_query, terms)
+
+    print(f"\n{'query':<20} {'p50 (ms)':>10} {'p99 (ms)':>10} {'took p50':>10} {'took p99':>10}")
+    report("query_string *term*", old[0], old[1])
+    report("infix wildcard", new[0], new[1])
+
+    overlap = [len(set(a) & set(b)) / len(a) for a, b in zip(old[2], new[2]) if a]
+    more = sum(b > a for a, b in zip(old[3], new[3]))
+    print(f"\ntop-10 overlap: {sum(overlap) / max(1, len(overlap)):.2f}; "
+          f"infix finds more matches for {more}/{len(terms)} queries "
+          f"(total hits {sum(old[3])} -> {sum(new[3])})")
@@ -0,0 +1,151 @@
+# mock_es.py
+# 本地 mock Elasticsearch，只实现导入用到的接口（/_bulk、/_mget、索引设置、delete_by_query），
+# 用于在没有 Elasticsearch 的环境下测试和调优 index/bulk_ingest.py；/_search 总是返回空结果（只有请求往返的开销，
+# 可以用 search_latency 模拟查询的处理时间，供 bench_serving.py 使用）。
+# 可以模拟每个请求的处理延迟（按请求体大小），以及按比例返回 429（整个请求或单个文档）。
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LATENCY = 0.02             # 每个 bulk 请求的固定延迟（秒）
+LATENCY_PER_MB = 0.05      # 每 MB 请求体增加的延迟（秒）
+REJECT_RATE = 0.0          # 整个 bulk 请求返回 429 的比例
+ITEM_REJECT_RATE = 0.0     # 单个文档返回 429 的比例
+ITEM_ERROR_RATE = 0.0      # 单个文档返回 400（不可重试的错误，如字段映射错误）的比例
+MAX_CONCURRENT = 0         # 同时处理的 bulk 请求数上限，超出时返回 429（0 表示不限制）
+SEARCH_LATENCY = 0.0       # 每个 _search 请求的延迟（秒）
+
+
+class MockESHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # 否则小请求会因 Nagle 与延迟确认的相互作用多等约 40ms
+    latency = LATENCY
+    latency_per_mb = LATENCY_PER_MB
+    reject_rate = REJECT_RATE
+    item_reject_rate = ITEM_REJECT_RATE
+    item_error_rate = ITEM_ERROR_RATE
+    max_concurrent = MAX_CONCURRENT
+    search_latency = SEARCH_LATENCY
+
+    # 以下由 start_server 为每个服务器单独创建
+    lock = None
+    received = None   # Counter: 文档 _id（没有 _id 时为 url）-> 成功写入次数
+    store = None      # 文档 _id -> content_hash，用于响应 _mget
+    requests = None   # Counter: 'bulk' / 'rejected' / 'items_rejected'
+    active = None     # [当前处理中的 bulk 请求数]
+
+    def do_GET(self):
+        self._send(200, {"name": "mock", "cluster_name": "mock", "version": {"number": "8.0.0"},
+                         "tagline": "You Know, for Search"})
+
+    def do_HEAD(self):
+        self._send(200, None)
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.split('?')[0]
+        if path.endswith('/_bulk'):
+            self._bulk(body)
+        elif path.endswith('/_mget'):
+            ids = json.loads(body).get("ids", [])
+            with self.lock:
+                docs = [{"_id": i, "found": True, "_source": {"content_hash": self.store[i]}} if i in self.store
+                        else {"_id": i, "found": False} for i in ids]
+            self._send(200, {"docs": docs})
+        elif path.endswith('/_search'):
+            time.sleep(self.search_latency)
+            self._send(200, {"took": 0, "timed_out": False, "hits": {"total": {"value": 0, "relation": "eq"},
+                                                                    "max_score": None, "hits": []}})
+        elif path.endswith('/_delete_by_query'):
+            self._send(200, {"deleted": 0})
+        else:
+            self._send(200, {"acknowledged": True})
+
+    do_PUT = do_POST  # elasticsearch 8.x 客户端用 PUT 发送 bulk 请求
+
+    def _bulk(self, body):
+        with self.lock:
+            self.requests['bulk'] += 1
+            busy = self.max_concurrent and self.active[0] >= self.max_concurrent
+            if busy or random.random() < self.reject_rate:
+                self.requests['rejected'] += 1
+                reject = True
+            else:
+                self.active[0] += 1
+                reject = False
+        if reject:
+            self._send(429, {"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+            return
+        try:
+            time.sleep(self.latency + self.latency_per_mb * len(body) / 1024 / 1024)
+            lines = body.split(b'\n')
+            items = []
+            accepted = []
+            for i in range(0, len(lines) - 1, 2):
+                action = json.loads(lines[i])
+                op, meta = next(iter(action.items()))
+                if random.random() < self.item_reject_rate:
+                    items.append({op: {"_index": meta.get("_index"), "status": 429,
+                                       "error": {"type": "es_rejected_execution_exception"}}})
+                    continue
+                if random.random() < self.item_error_rate:
+                    items.append({op: {"_index": meta.get("_index"), "status": 400,
+                                       "error": {"type": "document_parsing_exception", "reason": "mock error"}}})
+                    continue
+                doc = json.loads(lines[i + 1])
+                doc = doc.get("doc", doc)  # update 请求的文档在 doc 字段中
+                accepted.append(meta.get("_id") or doc.get("url"))
+                if meta.get("_id"):
+                    with self.lock:
+                        self.store[meta["_id"]] = doc.get("content_hash")
+                items.append({op: {"_index": meta.get("_index"), "_id": meta.get("_id", str(i)),
+                                   "status": 201, "result": "created"}})
+            with self.lock:
+                self.received.update(accepted)
+                self.requests['items_rejected'] += sum(1 for item in items if next(iter(item.values()))['status'] == 429)
+            self._send(200, {"took": 1, "errors": len(accepted) < len(items), "items": items})
+        finally:
+            with self.lock:
+                self.active[0] -= 1
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-Elastic-Product', 'Elasticsearch')  # elasticsearch 8.x 客户端会检查该响应头
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, **options):
+    """
+    在后台线程启动 mock Elasticsearch，返回 (server, url)。options 可覆盖 latency/latency_per_mb/
+    reject_rate/item_reject_rate/item_error_rate/max_concurrent/search_latency；server.RequestHandlerClass.received 记录收到的文档。
+    """
+    handler = type('Handler', (MockESHandler,), dict(options, lock=threading.Lock(), received=Counter(),
+                                                     requests=Counter(), store={}, active=[0]))
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    server, url = start_server(9200)
+    print(f"Mock Elasticsearch running at {url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,90 @@
+# mock_site.py
+# 本地 mock HTTP 站点，用于在不访问真实网站的情况下测试和调优爬虫。
+# 每个页面 /page/N 含有若干指向其它页面的链接和一段正文，可以模拟网络延迟。
+import hashlib
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+NUM_PAGES = 5000      # 站点页面总数
+LINKS_PER_PAGE = 20   # 每个页面的出链数
+LATENCY = 0.05        # 每次响应的模拟延迟（秒）
+VERSION = 0           # 内容版本：修改后编号能被 CHANGE_EVERY 整除的页面内容会变化
+CHANGE_EVERY = 10
+
+
+def render_page(n, num_pages, links_per_page, version=0, print_view=False):
+    rng = random.Random(n)
+    links = ''.join(
+        f'<a href="/page/{rng.randrange(num_pages)}">链接{i}</a>\n' for i in range(links_per_page)
+    )
+    body = ''.join(f'第{n}号页面的测试正文内容，段落{i}。' for i in range(30))
+    if version and n % CHANGE_EVERY == 0:
+        body += f' 版本 {version}'
+    # 打印视图与原页面几乎相同，用于测试近似重复检测
+    title = f'测试页面 {n}' + (' - 打印' if print_view else '')
+    return (f'<html><head><title>{title}</title></head><body>'
+            f'<div class="article-content">{body} {n}</div>{links}'
+            f'<a href="/print/{n}">打印</a><a href="/files/{n}.pdf">附件</a></body></html>')
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 支持 keep-alive
+    num_pages = NUM_PAGES
+    links_per_page = LINKS_PER_PAGE
+    latency = LATENCY
+    version = VERSION
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.path == '/robots.txt':
+            self._send(200, 'User-agent: *\nDisallow: /private/\n', 'text/plain')
+        elif self.path == '/' or self.path.startswith(('/page/', '/print/')):
+            try:
+                n = int(self.path.rsplit('/', 1)[1] or 0)
+            except ValueError:
+                n = 0
+            page = render_page(n, self.num_pages, self.links_per_page, self.version,
+                               print_view=self.path.startswith('/print/'))
+            # 支持 ETag 条件请求，用于测试增量抓取
+            etag = '"' + hashlib.md5(page.encode('utf-8')).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, '', etag=etag)
+            else:
+                self._send(200, page, etag=etag)
+        else:
+            self._send(404, 'not found', 'text/plain')
+
+    def _send(self, status, text, content_type='text/html', etag=None):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, **options):
+    """在后台线程启动 mock 站点，返回 (server, base_url)。options 可覆盖 num_pages/links_per_page/latency/version。"""
+    handler = type('Handler', (MockHandler,), options)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+if __name__ == '__main__':
+    server, url = start_server(8000)
+    print(f"Mock site running at {url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,82 @@
+# crawl_meta.py
+# 增量抓取用的 URL 元数据库（SQLite）：
+# 保存每个 URL 的 ETag、Last-Modified、内容哈希和出链，
+# 下次抓取时发送条件请求（If-None-Match / If-Modified-Since），
+# 未变化的页面（304 或内容哈希相同）不再重新解析和保存。
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def content_hash(data):
+    """页面内容哈希（data 为 bytes）。"""
+    return hashlib.sha1(data).hexdigest()
+
+
+class CrawlMetaStore:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " url TEXT PRIMARY KEY,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " content_hash TEXT,"
+                " outlinks TEXT,"
+                " crawled_at REAL)"
+            )
+            self.conn.commit()
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, content_hash, outlinks FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'content_hash': row[2],
+            'outlinks': json.loads(row[3]) if row[3] else [],
+        }
+
+    def conditional_headers(self, record):
+        """根据上次抓取记录（get() 的返回值）构造条件请求头，没有记录时返回空字典。"""
+        headers = {}
+        if record:
+            if record['etag']:
+                headers['If-None-Match'] = record['etag']
+            if record['last_modified']:
+                headers['If-Modified-Since'] = record['last_modified']
+        return headers
+
+    def update(self, url, etag, last_modified, digest, outlinks):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, content_hash, outlinks, crawled_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, digest, json.dumps(list(outlinks), ensure_ascii=False), time.time())
+            )
+
+    def touch(self, url):
+        """页面未变化（304），只更新抓取时间。"""
+        with self.lock:
+            self.conn.execute("UPDATE pages SET crawled_at = ? WHERE url = ?", (time.time(), url))
+
+    def remove(self, url):
+        with self.lock:
+            self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
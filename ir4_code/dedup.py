@@ -0,0 +1,94 @@
+# dedup.py
+# 抓取时的近似重复检测：SimHash 指纹 + 分段（banded）LSH 索引。
+# 两个 64 位指纹的汉明距离不超过 k 时，把指纹切成 k+1 段，至少有一段完全相同（抽屉原理），
+# 所以只需按段查哈希表，再对少量候选计算汉明距离，查询代价与已收录页面数无关。
+import hashlib
+import json
+import os
+from collections import Counter, defaultdict
+
+SHINGLE_SIZE = 3     # 中文按字切分，取连续 3 个字符作为特征
+MIN_TEXT_LENGTH = 50  # 文本太短时不做去重（大量空页面的指纹会相同）
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+# 把 1 个字节的 8 个二进制位展开到 8 个 32 位的“通道”里，
+# 这样用一次大整数加法就能同时累加 64 个位置的计数，不必逐位循环
+LANE_BITS = 32
+SPREAD = [sum(((v >> i) & 1) << (i * LANE_BITS) for i in range(8)) for v in range(256)]
+LANE_MASK = (1 << LANE_BITS) - 1
+
+
+def _spread(h):
+    return sum(SPREAD[(h >> (8 * j)) & 0xFF] << (j * 8 * LANE_BITS) for j in range(8))
+
+
+def simhash(text):
+    """计算文本的 64 位 SimHash；文本过短时返回 None。"""
+    text = ''.join(text.split())
+    if len(text) < MIN_TEXT_LENGTH:
+        return None
+    features = Counter(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+    total = 0
+    acc = 0  # 第 bit 个通道 = 该位为 1 的特征的权重之和
+    for feature, count in features.items():
+        acc += count * _spread(_feature_hash(feature))
+        total += count
+    fp = 0
+    for bit in range(64):
+        # 该位为 1 的权重多于为 0 的权重
+        if 2 * ((acc >> (bit * LANE_BITS)) & LANE_MASK) > total:
+            fp |= 1 << bit
+    return fp
+
+
+class NearDupIndex:
+    """
+    SimHash 指纹索引：find(fp) 返回汉明距离不超过 max_distance 的已收录页面 URL（没有时返回 None），
+    add(fp, url) 收录一个页面。save()/load() 配合抓取 checkpoint 保存和恢复。
+    """
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self.tables = [defaultdict(list) for _ in range(self.bands)]
+        self.entries = []  # (fp, url)
+
+    def _band_keys(self, fp):
+        mask = (1 << self.band_bits) - 1
+        return [(fp >> (i * self.band_bits)) & mask for i in range(self.bands)]
+
+    def find(self, fp):
+        for table, key in zip(self.tables, self._band_keys(fp)):
+            for entry_id in table.get(key, ()):
+                other, url = self.entries[entry_id]
+                if bin(fp ^ other).count('1') <= self.max_distance:
+                    return url
+        return None
+
+    def add(self, fp, url):
+        entry_id = len(self.entries)
+        self.entries.append((fp, url))
+        for table, key in zip(self.tables, self._band_keys(fp)):
+            table[key].append(entry_id)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self, path):
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for fp, url in self.entries:
+                f.write(json.dumps([fp, url], ensure_ascii=False) + '\n')
+        os.replace(path + '.tmp', path)
+
+    def load(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fp, url = json.loads(line)
+                self.add(fp, url)
@@ -0,0 +1,129 @@
+# extract.py
+# 页面信息提取：一次遍历同时取出标题、正文、锚文本、出链和附件链接。
+# 优先使用 lxml（C 实现）解析，未安装时退回 BeautifulSoup，并且只遍历一次 <a> 标签。
+# 提取函数只依赖参数和模块级常量，可以直接提交到进程池中并行执行。
+import re
+from urllib.parse import urljoin, urlparse
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    lxml_html = None
+
+from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector, UnicodeDammit
+
+# 附件链接的判断规则（只编译一次）
+ATTACHMENT_PATTERN = re.compile(r'.*\.(pdf|docx?|xlsx?|pptx?)$', re.IGNORECASE)
+HTTP_PATTERN = re.compile(r'^https?://')
+CONTENT_LIMIT = 2000  # 没有正文区域时，取全页文本的前多少个字符
+
+
+def classify_link(href, base_url, domain, links, attachments):
+    """与 spider.extract_links 相同的规则：仅保留同域链接，去掉锚点，区分附件。"""
+    full_url = urljoin(base_url, href.strip())
+    if urlparse(full_url).netloc.endswith(domain):
+        full_url = full_url.split('#')[0]
+        if HTTP_PATTERN.match(full_url):
+            if ATTACHMENT_PATTERN.match(full_url):
+                attachments.add(full_url)
+            else:
+                links.add(full_url)
+
+
+def _strip_join(strings):
+    # 等价于 BeautifulSoup 的 get_text(strip=True)
+    return ''.join(s.strip() for s in strings if s.strip())
+
+
+def _decode(content):
+    # 编码判断顺序与 BeautifulSoup 一致：先看页面声明的编码，再尝试 UTF-8，最后自动检测
+    declared = EncodingDetector.find_declared_encoding(content, is_html=True)
+    if declared:
+        try:
+            return content.decode(declared)
+        except (LookupError, UnicodeDecodeError):
+            pass
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return UnicodeDammit(content, is_html=True).unicode_markup
+
+
+def _extract_lxml(url, content, domain):
+    root = lxml_html.fromstring(_decode(content))
+    # script/style/注释不属于页面文本（与 BeautifulSoup 的 get_text 一致），保留其后的文本
+    etree.strip_elements(root, 'script', 'style', etree.Comment, with_tail=False)
+
+    title = ''
+    title_found = False
+    article = None
+    anchor_texts = set()
+    links, attachments = set(), set()
+    for el in root.iter('title', 'div', 'a'):
+        tag = el.tag
+        if tag == 'a':
+            href = el.get('href')
+            if href is None:
+                continue
+            text = _strip_join(el.itertext())
+            if text:
+                anchor_texts.add(text)
+            classify_link(href, url, domain, links, attachments)
+        elif tag == 'div':
+            if article is None and 'article-content' in (el.get('class') or '').split():
+                article = el
+        elif not title_found:
+            title = _strip_join(el.itertext())
+            title_found = True
+
+    if article is not None:
+        text = _strip_join(article.itertext())
+    else:
+        text = _strip_join(root.itertext())[:CONTENT_LIMIT]
+    return title, text, anchor_texts, links, attachments
+
+
+def _extract_bs4(url, content, domain):
+    soup = BeautifulSoup(content, 'html.parser')
+    title_tag = soup.find('title')
+    title = title_tag.get_text(strip=True) if title_tag else ''
+
+    anchor_texts = set()
+    links, attachments = set(), set()
+    for a_tag in soup.find_all('a', href=True):
+        text = a_tag.get_text(strip=True)
+        if text:
+            anchor_texts.add(text)
+        classify_link(a_tag['href'], url, domain, links, attachments)
+
+    article_div = soup.find('div', {'class': 'article-content'})
+    if article_div:
+        text = article_div.get_text(strip=True)
+    else:
+        text = soup.get_text(strip=True)[:CONTENT_LIMIT]
+    return title, text, anchor_texts, links, attachments
+
+
+def extract_page(url, content, domain):
+    """
+    从页面字节内容中提取信息，返回与 spider.extract_page_info 相同结构的字典（不含 raw_html，
+    由调用方补上，避免原始 HTML 在进程间来回传递）。
+    """
+    result = None
+    if lxml_html is not None and content.strip():
+        try:
+            result = _extract_lxml(url, content, domain)
+        except (etree.ParserError, ValueError):
+            result = None
+    if result is None:
+        result = _extract_bs4(url, content, domain)
+    title, text, anchor_texts, links, attachments = result
+    return {
+        'url': url,
+        'title': title,
+        'anchor_texts': list(anchor_texts),
+        'content': text,
+        'outlinks': list(links),
+        'attachments': list(attachments),
+    }
@@ -0,0 +1,161 @@
+# fetcher.py
+# 并发抓取引擎：线程池 + requests.Session 连接池（keep-alive 复用），
+# 在多个主机之间保持多个请求同时在途，同时对每个主机限制并发数和请求间隔。
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def make_session(headers, pool_size):
+    """创建带连接池的 Session，连接数与工作线程数一致，避免连接被反复新建。"""
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class HostThrottle:
+    """按主机控制请求间隔：同一主机的两次请求至少间隔 delay 秒。"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.next_time = {}
+
+    def wait(self, host):
+        # 在锁内预约下一个时间槽，锁外睡眠，不阻塞其它主机的请求
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_time.get(host, 0.0))
+            self.next_time[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CrawlStats:
+    """抓取速度统计（pages/sec），用于对照本地 mock 服务器调参。"""
+
+    def __init__(self, window=10.0):
+        self.window = window
+        self.start_time = time.monotonic()
+        self.pages = 0
+        self.errors = 0
+        self.bytes = 0
+        self.recent = deque()
+
+    def record(self, ok=True, nbytes=0):
+        now = time.monotonic()
+        if ok:
+            self.pages += 1
+            self.bytes += nbytes
+            self.recent.append(now)
+        else:
+            self.errors += 1
+        while self.recent and now - self.recent[0] > self.window:
+            self.recent.popleft()
+
+    def rate(self):
+        """整个抓取过程的平均速度。"""
+        elapsed = time.monotonic() - self.start_time
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+    def recent_rate(self):
+        """最近 window 秒内的速度。"""
+        span = min(self.window, time.monotonic() - self.start_time)
+        return len(self.recent) / span if span > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.pages} 页, {self.errors} 错误, "
+                f"平均 {self.rate():.2f} pages/sec, 最近 {self.recent_rate():.2f} pages/sec, "
+                f"{self.bytes / 1024 / 1024:.1f} MB")
+
+
+class CrawlEngine:
+    """
+    并发抓取调度：
+    - 最多 concurrency 个请求同时在途（线程池 + 共享连接池）
+    - 每个主机最多 per_host 个请求同时在途，超出的 URL 暂存等待
+    - 每个主机的请求间隔由 HostThrottle 保证
+    回调 handle(url, result) 在主线程中执行，可以继续向 frontier 添加链接。
+    """
+
+    def __init__(self, headers, concurrency=16, per_host=2, delay=1, timeout=10, max_deferred=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.session = make_session(headers, concurrency)
+        self.throttle = HostThrottle(delay)
+        self.stats = CrawlStats()
+        self.active = defaultdict(int)     # 每个主机在途请求数（仅主线程访问）
+        self.deferred = defaultdict(deque)  # 因主机并发已满而暂存的 URL
+        self.deferred_count = 0
+        self.max_deferred = max_deferred or concurrency * 8
+        self.stopped = False
+
+    def fetch(self, url, headers=None):
+        """在工作线程中调用：等待主机时间槽后发起请求。headers 为额外请求头（如条件请求头）。"""
+        self.throttle.wait(urlparse(url).netloc)
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    def stop(self):
+        """停止派发新请求，已在途的请求仍会回调 handle。"""
+        self.stopped = True
+
+    def _submit(self, pool, task, url, host, in_flight):
+        self.active[host] += 1
+        in_flight[pool.submit(task, url)] = url
+
+    def _dispatch(self, pool, next_url, task, in_flight):
+        # 先派发暂存的 URL（其主机可能已有空闲并发槽）
+        for host in list(self.deferred):
+            waiting = self.deferred[host]
+            while waiting and self.active[host] < self.per_host and len(in_flight) < self.concurrency:
+                self._submit(pool, task, waiting.popleft(), host, in_flight)
+                self.deferred_count -= 1
+            if not waiting:
+                del self.deferred[host]
+
+        # 再从 frontier 取新 URL；暂存区满时停止取，保证内存有界
+        while len(in_flight) < self.concurrency and self.deferred_count < self.max_deferred:
+            url = next_url()
+            if url is None:
+                break
+            host = urlparse(url).netloc
+            if self.active[host] >= self.per_host:
+                self.deferred[host].append(url)
+                self.deferred_count += 1
+            else:
+                self._submit(pool, task, url, host, in_flight)
+
+    def run(self, next_url, task, handle):
+        """
+        next_url(): 返回下一个待抓取的 URL，没有时返回 None
+        task(url): 在工作线程中执行的抓取函数，一般会调用 self.fetch
+        handle(url, result): 在主线程中处理结果；task 抛出异常时 result 为 None
+        """
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                if not self.stopped:
+                    self._dispatch(pool, next_url, task, in_flight)
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = in_flight.pop(future)
+                    self.active[urlparse(url).netloc] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"处理URL {url} 时出错: {e}")
+                        self.stats.record(ok=False)
+                        result = None
+                    handle(url, result)
+        self.session.close()
@@ -0,0 +1,291 @@
+# frontier.py
+# 磁盘溢出、可断点续爬的抓取队列（frontier）。
+# - 入队时去重：用 64 位 URL 指纹集合判断是否见过，每个 URL 只入队一次
+# - 队列超过内存上限的部分写入磁盘分段文件，内存占用有界
+# - checkpoint() 把指纹集合、队列和抓取进度写入状态目录，崩溃后可以从中恢复
+# Frontier 按广度优先（FIFO）调度；PriorityFrontier 按 OPIC 在线重要性估计调度。
+import hashlib
+import heapq
+import json
+import os
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+
+def url_fingerprint(url):
+    """URL 的 64 位指纹。"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class FingerprintSet:
+    """
+    紧凑的 64 位指纹集合：已合并的部分保存在有序 array('Q') 中（每个 URL 8 字节），
+    新加入的指纹先放在小的 set 里，积累到 merge_size 后合并进有序数组。
+    """
+
+    def __init__(self, merge_size=65536):
+        self.sorted = array('Q')
+        self.recent = set()
+        self.merge_size = merge_size
+
+    def __len__(self):
+        return len(self.sorted) + len(self.recent)
+
+    def __contains__(self, fp):
+        if fp in self.recent:
+            return True
+        i = bisect_left(self.sorted, fp)
+        return i < len(self.sorted) and self.sorted[i] == fp
+
+    def add(self, fp):
+        """加入指纹，返回是否是新指纹。"""
+        if fp in self:
+            return False
+        self.recent.add(fp)
+        if len(self.recent) >= self.merge_size:
+            self.merge()
+        return True
+
+    def merge(self):
+        if self.recent:
+            # 两个有序序列归并，不生成完整的 Python 列表
+            self.sorted = array('Q', heapq.merge(self.sorted, sorted(self.recent)))
+            self.recent = set()
+
+    def save(self, path):
+        self.merge()
+        with open(path, 'wb') as f:
+            self.sorted.tofile(f)
+
+    def load(self, path):
+        self.sorted = array('Q')
+        self.recent = set()
+        with open(path, 'rb') as f:
+            self.sorted.frombytes(f.read())
+
+
+class Frontier:
+    """
+    FIFO 抓取队列，接口：
+    push(url) 入队（已见过的 URL 直接丢弃），pop() 取出下一个 URL，
+    done(url) 标记处理完成，checkpoint(meta) 保存状态，load() 恢复状态。
+    已 pop 但尚未 done 的 URL 在 checkpoint 时会放回队首，恢复后重新抓取。
+    """
+
+    def __init__(self, state_dir, mem_limit=10000, segment_size=10000):
+        self.state_dir = state_dir
+        self.mem_limit = mem_limit
+        self.segment_size = segment_size
+        self.seen = FingerprintSet()
+        self.head = deque()   # 队首（内存中，pop 从这里取）
+        self.tail = []        # 队尾写缓冲（有磁盘分段时新 URL 先写到这里）
+        self.segments = deque()  # 磁盘分段文件编号，按先后顺序
+        self.next_segment = 0
+        self.consumed = []    # 已读入内存的分段，下次 checkpoint 后才删除
+        self.in_progress = set()
+        self.size = 0
+        os.makedirs(os.path.join(state_dir, 'segments'), exist_ok=True)
+
+    def __len__(self):
+        return self.size
+
+    def _segment_path(self, n):
+        return os.path.join(self.state_dir, 'segments', f'{n:08d}.txt')
+
+    def _spill(self):
+        path = self._segment_path(self.next_segment)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.tail) + '\n')
+        self.segments.append(self.next_segment)
+        self.next_segment += 1
+        self.tail = []
+
+    def push(self, url):
+        """URL 入队，返回是否是新 URL。"""
+        if not self.seen.add(url_fingerprint(url)):
+            return False
+        # 已经有磁盘分段时必须先写到队尾缓冲，保持先进先出
+        if not self.segments and not self.tail and len(self.head) < self.mem_limit:
+            self.head.append(url)
+        else:
+            self.tail.append(url)
+            if len(self.tail) >= self.segment_size:
+                self._spill()
+        self.size += 1
+        return True
+
+    def pop(self):
+        if not self.head:
+            if self.segments:
+                n = self.segments.popleft()
+                path = self._segment_path(n)
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.head.extend(line for line in f.read().split('\n') if line)
+                self.consumed.append(path)
+            elif self.tail:
+                self.head.extend(self.tail)
+                self.tail = []
+        if not self.head:
+            return None
+        url = self.head.popleft()
+        self.size -= 1
+        self.in_progress.add(url)
+        return url
+
+    def push_links(self, url, outlinks):
+        """页面 url 抓取完成后，把它的出链入队。"""
+        for link in outlinks:
+            self.push(link)
+
+    def done(self, url):
+        self.in_progress.discard(url)
+
+    def checkpoint(self, meta=None):
+        """
+        保存状态：先写临时文件再原子替换，崩溃时不会留下写了一半的状态。
+        先写队列再写指纹：两者之间崩溃时，最坏情况是个别 URL 被重复抓取，而不会丢失。
+        """
+        # 队首 = 未完成的 URL + 内存中的 head；队尾缓冲单独保存
+        queue_tmp = os.path.join(self.state_dir, 'queue.json.tmp')
+        state = {
+            'head': list(self.in_progress) + list(self.head),
+            'tail': self.tail,
+            'segments': list(self.segments),
+            'next_segment': self.next_segment,
+            'meta': meta or {},
+        }
+        with open(queue_tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(queue_tmp, os.path.join(self.state_dir, 'queue.json'))
+
+        seen_tmp = os.path.join(self.state_dir, 'seen.bin.tmp')
+        self.seen.save(seen_tmp)
+        os.replace(seen_tmp, os.path.join(self.state_dir, 'seen.bin'))
+
+        for path in self.consumed:
+            os.remove(path)
+        self.consumed = []
+
+    def load(self):
+        """从状态目录恢复，返回 checkpoint 时保存的 meta；没有状态时返回 None。"""
+        queue_path = os.path.join(self.state_dir, 'queue.json')
+        seen_path = os.path.join(self.state_dir, 'seen.bin')
+        if not os.path.exists(queue_path) or not os.path.exists(seen_path):
+            return None
+        with open(queue_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.seen.load(seen_path)
+        self.head = deque(state['head'])
+        self.tail = state['tail']
+        self.segments = deque(state['segments'])
+        self.next_segment = state['next_segment']
+        self.consumed = []
+        self.in_progress = set()
+        # 删除不属于该 checkpoint 的分段：之前已消费的，或 checkpoint 之后才写出的
+        # （后者中的 URL 不在恢复的指纹集合里，会被重新发现）
+        for name in os.listdir(os.path.join(self.state_dir, 'segments')):
+            n = int(name.split('.')[0])
+            if n not in self.segments:
+                os.remove(os.path.join(self.state_dir, 'segments', name))
+        self.size = len(self.head) + len(self.tail) + sum(
+            self._count_lines(self._segment_path(n)) for n in self.segments)
+        return state['meta']
+
+    def _count_lines(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return sum(1 for line in f if line.strip())
+
+
+class PriorityFrontier:
+    """
+    按 OPIC（Online Page Importance Computation）调度的抓取队列，接口与 Frontier 相同。
+    每个页面持有一定“现金”（cash），抓取后把现金平均分给它的出链；
+    待抓取的 URL 按累计现金从高到低出队，因此被大量重要页面链接的页面会先被抓取。
+    有限的抓取预算下，重要的入口页会优先于深层的归档页。
+    待抓取 URL 及其现金保存在内存中（每个 URL 一个字典项），适合有页数预算的抓取。
+    """
+
+    def __init__(self, state_dir, initial_cash=1.0):
+        self.state_dir = state_dir
+        self.initial_cash = initial_cash
+        self.seen = FingerprintSet()
+        self.cash = {}         # 待抓取 URL -> 累计现金
+        self.heap = []         # (-cash, 序号, url)，现金更新时压入新项，出队时跳过过期项
+        self.counter = 0
+        self.in_progress = {}  # 已出队未完成的 URL -> 出队时的现金
+        os.makedirs(state_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self.cash)
+
+    def _heap_push(self, url):
+        self.counter += 1
+        heapq.heappush(self.heap, (-self.cash[url], self.counter, url))
+        # 过期项过多时重建堆，避免堆随边数无限增长
+        if len(self.heap) > 4 * len(self.cash) + 1024:
+            self.heap = [(-c, i, u) for i, (u, c) in enumerate(self.cash.items())]
+            heapq.heapify(self.heap)
+
+    def push(self, url, cash=None):
+        """URL 入队并获得 cash（默认 initial_cash），返回是否是新 URL；已在队列中的 URL 累加现金。"""
+        cash = self.initial_cash if cash is None else cash
+        if url in self.cash:
+            self.cash[url] += cash
+            self._heap_push(url)
+            return False
+        if not self.seen.add(url_fingerprint(url)):
+            # 已抓取过的页面，现金不再回收
+            return False
+        self.cash[url] = cash
+        self._heap_push(url)
+        return True
+
+    def push_links(self, url, outlinks):
+        """把 url 出队时持有的现金平均分给它的出链。"""
+        outlinks = list(outlinks)
+        if not outlinks:
+            return
+        share = self.in_progress.get(url, 0.0) / len(outlinks)
+        for link in outlinks:
+            self.push(link, share)
+
+    def pop(self):
+        while self.heap:
+            neg_cash, _, url = heapq.heappop(self.heap)
+            if self.cash.get(url) == -neg_cash:
+                self.in_progress[url] = self.cash.pop(url)
+                return url
+        return None
+
+    def done(self, url):
+        self.in_progress.pop(url, None)
+
+    def checkpoint(self, meta=None):
+        """保存状态，顺序和原子替换方式同 Frontier.checkpoint。"""
+        pending = dict(self.cash)
+        for url, cash in self.in_progress.items():
+            pending[url] = pending.get(url, 0.0) + cash
+        queue_tmp = os.path.join(self.state_dir, 'queue.json.tmp')
+        with open(queue_tmp, 'w', encoding='utf-8') as f:
+            json.dump({'cash': pending, 'meta': meta or {}}, f, ensure_ascii=False)
+        os.replace(queue_tmp, os.path.join(self.state_dir, 'queue.json'))
+
+        seen_tmp = os.path.join(self.state_dir, 'seen.bin.tmp')
+        self.seen.save(seen_tmp)
+        os.replace(seen_tmp, os.path.join(self.state_dir, 'seen.bin'))
+
+    def load(self):
+        queue_path = os.path.join(self.state_dir, 'queue.json')
+        seen_path = os.path.join(self.state_dir, 'seen.bin')
+        if not os.path.exists(queue_path) or not os.path.exists(seen_path):
+            return None
+        with open(queue_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        self.seen.load(seen_path)
+        self.cash = state['cash']
+        self.in_progress = {}
+        self.heap = [(-c, i, u) for i, (u, c) in enumerate(self.cash.items())]
+        heapq.heapify(self.heap)
+        self.counter = len(self.heap)
+        return state['meta']
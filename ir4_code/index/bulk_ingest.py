@@ -0,0 +1,509 @@
+# bulk_ingest.py
+# 流式并行批量导入：
+# - 分片按记录区间（每段 PIECE_RECORDS 条，借助 .idx 偏移索引直接 seek）交给进程池解析并序列化为 bulk 请求体，
+#   任意大小的分片都只占用常数内存；旧的 .json 文件用 ijson 在主进程中流式读取
+# - 按字节数而不是文档数切分 bulk 请求，大页面不会产生过大的请求
+# - raw_html 不写入索引：解析进程计算哈希并压缩后交给主进程写入本地快照存储（见 snapshot_store.py）
+# - 文档 _id 由规范化的 URL 生成，并保存内容哈希 content_hash：重复导入是按 _id 的 upsert，
+#   发送前先批量查询已有文档的哈希，未变化的文档直接跳过，重新导入的工作量只与变化的部分有关
+# - 多个线程同时发送 bulk 请求
+# - 收到 429（队列已满）时按指数退避重试被拒绝的文档，其余文档不重复发送
+# - 最终仍然失败的文档连同错误信息写入死信文件（dead letter），之后可以只重放这些文档
+# - 每段记录全部处理完（成功或写入死信）后记录到进度文件，中断后重新运行会跳过已完成的部分
+# - 定时打印导入速度（docs/sec）
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit, urlunsplit
+
+from elasticsearch import ApiError, ConnectionError as ESConnectionError, ConnectionTimeout
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shards import iter_records, read_offsets, read_record_range
+from snapshot_store import compress_snapshot, snapshot_digest
+
+MAX_CHUNK_BYTES = 5 * 1024 * 1024  # 每个 bulk 请求体的大小上限
+PIECE_RECORDS = 1000               # 每个解析任务处理的记录数，也是进度记录的粒度
+SENDERS = 4                        # 同时发送 bulk 请求的线程数
+PARSE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))  # 解析分片的进程数
+MAX_RETRIES = 8                    # 429 / 连接错误的最大重试次数
+INITIAL_BACKOFF = 0.5              # 第一次重试前等待的秒数，之后每次翻倍
+MAX_BACKOFF = 30
+REPORT_INTERVAL = 5                # 打印导入速度的间隔（秒）
+MAX_ERRORS_SHOWN = 10              # 最多打印多少条失败文档的错误信息
+
+
+# 不参与内容哈希的字段（由导入流程或 enrich_pagerank.py 写入）
+DERIVED_FIELDS = ('content_hash', 'pagerank_score', 'has_attachment', 'attachment_types')
+# 导入时计算的派生字段（包括 mapping.py 中的 infix 子字段）的版本，参与内容哈希：
+# 修改派生字段的计算方式或增加子字段后加 1，下次导入会重新写入所有文档
+DERIVED_VERSION = 3
+DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+def normalize_url(url):
+    """规范化 URL：协议和主机名小写，去掉默认端口和锚点，空路径补为 /。"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if netloc.endswith(DEFAULT_PORTS.get(scheme, '\0')):
+        netloc = netloc[:-len(DEFAULT_PORTS[scheme])]
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def doc_id(url):
+    """文档 _id：规范化 URL 的 sha1，同一页面无论导入多少次都对应同一个文档。"""
+    return hashlib.sha1(normalize_url(url).encode('utf-8')).hexdigest()
+
+
+def doc_hash(doc):
+    """文档内容哈希（不含派生字段），用于判断页面是否变化。"""
+    content = {k: v for k, v in doc.items() if k not in DERIVED_FIELDS}
+    data = json.dumps([DERIVED_VERSION, content], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def attachment_fields(doc):
+    """附件的派生字段：has_attachment 和 attachment_types（小写扩展名，如 ["doc", "pdf"]），供文档查询过滤。"""
+    types = sorted({os.path.splitext(urlsplit(url).path)[1][1:].lower()
+                    for url in doc.get("attachments") or [] if isinstance(url, str)} - {''})
+    return {"has_attachment": bool(types), "attachment_types": types}
+
+
+def encode_doc(doc, index_name):
+    """
+    一个文档对应的 bulk 请求行，返回 (_id, content_hash, bytes)。有 url 的文档按 _id upsert
+    （doc 局部更新，保留 pagerank_score 等其它字段）；没有 url 的文档只能自动生成 _id。
+    """
+    if not doc.get("url"):
+        action = json.dumps({"index": {"_index": index_name}})
+        source = dict(doc, **attachment_fields(doc))
+        return None, None, (action + '\n' + json.dumps(source, ensure_ascii=False) + '\n').encode('utf-8')
+    _id = doc_id(doc["url"])
+    digest = doc_hash(doc)
+    source = dict(doc, content_hash=digest, **attachment_fields(doc))
+    action = json.dumps({"update": {"_index": index_name, "_id": _id}})
+    body = json.dumps({"doc": source, "doc_as_upsert": True}, ensure_ascii=False)
+    return _id, digest, (action + '\n' + body + '\n').encode('utf-8')
+
+
+def take_snapshot(doc, keep=True):
+    """
+    从文档中取出 raw_html（索引中不保存）。keep 时返回 (url, 内容哈希, gzip 数据) 交给 SnapshotWriter，
+    否则直接丢弃。
+    """
+    html = doc.pop("raw_html", None)
+    if not keep or not html or not doc.get("url"):
+        return None
+    data = html.encode('utf-8')
+    return doc["url"], snapshot_digest(data), compress_snapshot(data)
+
+
+def _source_of(entry):
+    """从 bulk 请求行中取回文档本身（写入死信文件时使用）。"""
+    body = json.loads(entry.split(b'\n', 1)[1])
+    return body["doc"] if "doc_as_upsert" in body else body
+
+
+def encode_range(path, start, stop, index_name, snapshots=False):
+    """
+    读取分片中第 start 到 stop-1 条记录并序列化，返回 ([(记录序号, (_id, hash, bulk 行))], [快照])。
+    在进程池中执行；snapshots 为 False 时不生成快照。
+    """
+    entries, snaps = [], []
+    for i, line in enumerate(read_record_range(path, start, stop), start):
+        doc = json.loads(line)
+        if isinstance(doc, dict):
+            snap = take_snapshot(doc, snapshots)
+            if snap:
+                snaps.append(snap)
+            entries.append((i, encode_doc(doc, index_name)))
+    return entries, snaps
+
+
+def _offsets(path):
+    """JSONL 分片的偏移索引；旧的 .json 文件或缺少 .idx 时返回 None。"""
+    if path.endswith('.json'):
+        return None
+    try:
+        return read_offsets(path)
+    except OSError:
+        return None
+
+
+def split_chunks(entries, max_bytes=MAX_CHUNK_BYTES):
+    """把 [(ref, (_id, hash, bulk 行))] 按字节数切分为多个请求（单个文档超过上限时单独成为一个请求）。"""
+    chunks, current, size = [], [], 0
+    for entry in entries:
+        nbytes = len(entry[1][2])
+        if current and size + nbytes > max_bytes:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += nbytes
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class IngestProgress:
+    """
+    导入进度：每个分片中已经处理完的记录区间 [[start, stop], ...]（已合并），保存在 JSON 文件中。
+    目标索引或数据目录与上次不同、上次已正常完成或 resume=False 时重新开始。
+    """
+
+    def __init__(self, path, index_name, sources, resume=True):
+        self.path = path
+        self.lock = threading.Lock()
+        self.key = {"index": index_name, "sources": sorted(os.path.abspath(s) for s in sources)}
+        self.done = {}
+        self.resumed = False
+        if resume and path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("key") == self.key and not state.get("finished"):
+                self.done = state.get("done", {})
+                self.resumed = True
+                print(f"Resuming ingest: {sum(e - s for r in self.done.values() for s, e in r)} records already done")
+
+    def is_done(self, name, start, stop):
+        return any(s <= start and stop <= e for s, e in self.done.get(name, ()))
+
+    def mark_done(self, name, start, stop):
+        with self.lock:
+            ranges = sorted(self.done.get(name, []) + [[start, stop]])
+            merged = [ranges[0]]
+            for s, e in ranges[1:]:
+                if s <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], e)
+                else:
+                    merged.append([s, e])
+            self.done[name] = merged
+            self._save(False)
+
+    def finish(self):
+        with self.lock:
+            self._save(True)
+
+    def _save(self, finished):
+        if not self.path:
+            return
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({"key": self.key, "finished": finished, "done": self.done}, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
+
+
+class DeadLetterQueue:
+    """死信文件：每行一个最终导入失败的文档 {"shard", "offset", "error", "doc"}。"""
+
+    def __init__(self, path, append=True):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8') if path else None
+
+    def write(self, ref, entry, error):
+        with self.lock:
+            self.count += 1
+        if self.file is None:
+            return
+        shard, offset = ref
+        doc = _source_of(entry[2])
+        line = json.dumps({"shard": shard, "offset": offset, "error": error, "doc": doc}, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()  # 在进度文件记录该段完成之前落盘
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class IngestStats:
+    """导入速度统计，多个发送线程共享。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.docs = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.retries = 0
+        self.errors_shown = 0
+
+    def record(self, docs=0, failed=0, nbytes=0, retries=0, skipped=0):
+        with self.lock:
+            self.docs += docs
+            self.skipped += skipped
+            self.failed += failed
+            self.bytes += nbytes
+            self.retries += retries
+
+    def error(self, message):
+        with self.lock:
+            self.errors_shown += 1
+            show = self.errors_shown <= MAX_ERRORS_SHOWN
+        if show:
+            print(message)
+
+    def rate(self):
+        elapsed = time.monotonic() - self.start_time
+        return self.docs / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"{self.docs} docs, {self.skipped} unchanged, {self.failed} failures, {self.retries} retries, "
+                f"{self.rate():.1f} docs/sec, {self.bytes / 1024 / 1024:.1f} MB")
+
+
+def _backoff(attempt):
+    delay = min(MAX_BACKOFF, INITIAL_BACKOFF * 2 ** attempt)
+    return delay * (0.5 + random.random() / 2)
+
+
+def skip_unchanged(es, index_name, entries, request_timeout=120):
+    """批量查询索引中已有文档的 content_hash，去掉内容没有变化的文档。"""
+    ids = [entry[0] for _, entry in entries if entry[0]]
+    if not ids:
+        return entries
+    try:
+        resp = es.options(request_timeout=request_timeout).mget(index=index_name, ids=ids,
+                                                                source_includes=["content_hash"])
+    except (ApiError, ESConnectionError, ConnectionTimeout):
+        return entries  # 查询失败时照常发送，upsert 本身是幂等的
+    existing = {d["_id"]: d.get("_source", {}).get("content_hash") for d in resp["docs"] if d.get("found")}
+    return [(ref, entry) for ref, entry in entries if not entry[0] or existing.get(entry[0]) != entry[1]]
+
+
+def send_chunk(es, entries, stats, dead_letters, index_name=None, request_timeout=120):
+    """
+    发送一个 bulk 请求（entries 为 [(ref, (_id, hash, bulk 行))]）；给出 index_name 时先跳过内容未变化的文档。
+    整体或部分文档被 429 拒绝时退避后只重发被拒绝的文档，其它错误以及重试次数用完的文档写入死信文件。
+    """
+    if index_name:
+        total = len(entries)
+        entries = skip_unchanged(es, index_name, entries, request_timeout)
+        stats.record(skipped=total - len(entries))
+    attempt = 0
+    while entries:
+        body = b''.join(entry[2] for _, entry in entries)
+        try:
+            resp = es.options(request_timeout=request_timeout).bulk(body=body)
+        except (ApiError, ESConnectionError, ConnectionTimeout) as e:
+            status = getattr(e, 'status_code', None)
+            if (status == 429 or status is None) and attempt < MAX_RETRIES:
+                time.sleep(_backoff(attempt))
+                attempt += 1
+                stats.record(retries=len(entries))
+                continue
+            stats.record(failed=len(entries))
+            stats.error(f"Bulk request failed: {e}")
+            for ref, entry in entries:
+                dead_letters.write(ref, entry, str(e))
+            return
+
+        rejected = []
+        ok = 0
+        for (ref, entry), item in zip(entries, resp["items"]):
+            result = next(iter(item.values()))
+            status = result.get("status", 500)
+            if status == 429 and attempt < MAX_RETRIES:
+                rejected.append((ref, entry))
+            elif status >= 300:
+                stats.record(failed=1)
+                stats.error(f"Document failed: {result.get('error')}")
+                dead_letters.write(ref, entry, result.get('error'))
+            else:
+                ok += 1
+        stats.record(docs=ok, nbytes=len(body))
+
+        if rejected:
+            time.sleep(_backoff(attempt))
+            attempt += 1
+            stats.record(retries=len(rejected))
+        entries = rejected
+
+
+def _report(stats, stop_event, interval):
+    while not stop_event.wait(interval):
+        print(f"Indexing: {stats.summary()}")
+
+
+def _pieces(parse_pool, paths, index_name, progress, prefetch, snapshots=False):
+    """
+    按顺序返回每段待导入的记录 (分片名, start, stop, ([(记录序号, bulk 行)], [快照]))，跳过进度中已完成的段。
+    JSONL 分片的各段提前提交到进程池解析，同时在途的段数不超过 prefetch。
+    """
+    def tasks():
+        for path in paths:
+            name = os.path.basename(path)
+            print(f"Processing file: {name}")
+            offsets = _offsets(path)
+            if offsets is not None:
+                for start in range(0, len(offsets), PIECE_RECORDS):
+                    stop = min(start + PIECE_RECORDS, len(offsets))
+                    if not progress.is_done(name, start, stop):
+                        yield name, start, stop, parse_pool.submit(encode_range, path, start, stop, index_name,
+                                                                       snapshots)
+                continue
+            # 旧格式：主进程中流式读取，不能跳过已完成的段，但不会重复发送
+            entries, snaps, start, count = [], [], 0, 0
+            for count, doc in enumerate(iter_records(path), 1):
+                if isinstance(doc, dict):
+                    snap = take_snapshot(doc, snapshots)
+                    if snap:
+                        snaps.append(snap)
+                    entries.append((count - 1, encode_doc(doc, index_name)))
+                if count - start == PIECE_RECORDS:
+                    if not progress.is_done(name, start, count):
+                        yield name, start, count, (entries, snaps)
+                    entries, snaps, start = [], [], count
+            if count > start and not progress.is_done(name, start, count):
+                yield name, start, count, (entries, snaps)
+
+    pending = deque()
+    for task in tasks():
+        pending.append(task)
+        while pending and (len(pending) > prefetch or not isinstance(pending[0][3], Future)):
+            yield _resolve(pending.popleft())
+    while pending:
+        yield _resolve(pending.popleft())
+
+
+def _resolve(task):
+    name, start, stop, entries = task
+    if isinstance(entries, Future):
+        try:
+            entries = entries.result()
+        except Exception as e:
+            print(f"Error processing file '{name}' records {start}-{stop}: {e}")
+            return name, start, stop, None
+    return name, start, stop, entries
+
+
+def _send_all(es, pieces, index_name, stats, dead_letters, progress, senders, max_bytes, snapshots=None):
+    """
+    把各段记录切分为 bulk 请求并发发送；一段的所有请求完成后记录进度。
+    快照在发送之前写入 snapshots（SnapshotWriter），记录进度时快照已经在 journal 中。
+    """
+    sending = set()
+    with ThreadPoolExecutor(senders) as send_pool:
+        for name, start, stop, parsed in pieces:
+            if parsed is None:
+                continue  # 解析失败的段不记录进度，下次运行时重试
+            entries, snaps = parsed
+            if snapshots is not None:
+                for url, digest, blob in snaps:
+                    snapshots.put_compressed(url, digest, blob)
+            chunks = split_chunks([((name, i), entry) for i, entry in entries], max_bytes)
+            if not chunks:
+                progress.mark_done(name, start, stop)
+                continue
+            remaining = [len(chunks)]
+            lock = threading.Lock()
+
+            def chunk_done(future, name=name, start=start, stop=stop, remaining=remaining, lock=lock):
+                if future.exception() is not None:
+                    return
+                with lock:
+                    remaining[0] -= 1
+                    finished = remaining[0] == 0
+                if finished:
+                    progress.mark_done(name, start, stop)
+
+            for chunk in chunks:
+                # 在途请求数有上限，发送跟不上时等待
+                while len(sending) >= senders * 2:
+                    done, sending = wait(sending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        f.result()
+                future = send_pool.submit(send_chunk, es, chunk, stats, dead_letters, index_name)
+                future.add_done_callback(chunk_done)
+                sending.add(future)
+
+        for f in wait(sending).done:
+            f.result()
+
+
+def ingest(es, paths, index_name, progress=None, dead_letters=None, snapshots=None, check_existing=True,
+           parse_workers=PARSE_WORKERS, senders=SENDERS, max_bytes=MAX_CHUNK_BYTES, report_interval=REPORT_INTERVAL):
+    """
+    把 paths 中的数据文件并行导入 index_name，返回 IngestStats。
+    progress（IngestProgress）用于跳过已完成的部分并记录进度，dead_letters（DeadLetterQueue）接收最终失败的文档，
+    snapshots（SnapshotWriter）接收文档的 raw_html；为 None 时 raw_html 直接丢弃。
+    导入新建的空索引时 check_existing=False，不查询已有文档的 content_hash。
+    """
+    progress = progress or IngestProgress(None, index_name, [])
+    dead_letters = dead_letters or DeadLetterQueue(None)
+    stats = IngestStats()
+    stop_event = threading.Event()
+    reporter = threading.Thread(target=_report, args=(stats, stop_event, report_interval), daemon=True)
+    reporter.start()
+    try:
+        with ProcessPoolExecutor(parse_workers) as parse_pool:
+            # 预先解析的段数有上限，避免解析远快于发送时占用过多内存
+            pieces = _pieces(parse_pool, paths, index_name, progress, parse_workers * 2, snapshots is not None)
+            _send_all(es, pieces, index_name if check_existing else None, stats, dead_letters, progress, senders,
+                      max_bytes, snapshots)
+        if snapshots is not None:
+            snapshots.flush()
+        progress.finish()
+    finally:
+        stop_event.set()
+        reporter.join()
+    print(f"Indexing finished: {stats.summary()}, {dead_letters.count} written to dead letter file")
+    return stats
+
+
+def replay_dead_letters(es, path, index_name, senders=SENDERS, max_bytes=MAX_CHUNK_BYTES,
+                        report_interval=REPORT_INTERVAL):
+    """重新导入死信文件中的文档；仍然失败的文档写回死信文件，全部成功时死信文件为空。"""
+    if not os.path.exists(path):
+        print(f"Dead letter file '{path}' not found")
+        return None
+
+    def pieces():
+        entries = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                letter = json.loads(line)
+                take_snapshot(letter["doc"], False)  # 旧版本写入的死信可能仍带有 raw_html
+                entries.append(((letter["shard"], letter["offset"]), encode_doc(letter["doc"], index_name)))
+                if len(entries) == PIECE_RECORDS:
+                    yield entries
+                    entries = []
+        if entries:
+            yield entries
+
+    retry = DeadLetterQueue(path + '.retry', append=False)
+    stats = IngestStats()
+    stop_event = threading.Event()
+    reporter = threading.Thread(target=_report, args=(stats, stop_event, report_interval), daemon=True)
+    reporter.start()
+    try:
+        sending = set()
+        with ThreadPoolExecutor(senders) as send_pool:
+            for entries in pieces():
+                for chunk in split_chunks(entries, max_bytes):
+                    while len(sending) >= senders * 2:
+                        done, sending = wait(sending, return_when=FIRST_COMPLETED)
+                        for f in done:
+                            f.result()
+                    sending.add(send_pool.submit(send_chunk, es, chunk, stats, retry, index_name))
+            for f in wait(sending).done:
+                f.result()
+    finally:
+        stop_event.set()
+        reporter.join()
+        retry.close()
+    os.replace(path + '.retry', path)
+    print(f"Replay finished: {stats.summary()}, {retry.count} still failing")
+    return stats
@@ -0,0 +1,92 @@
+# enrich_pagerank.py
+# 把 pagerank.py 计算出的 PageRank 分数写入索引中每个文档的 pagerank_score 字段，
+# 让查询时的 PageRank 加权直接在 Elasticsearch 的 function_score 中完成。
+# 只读取索引中的 url 和现有的 pagerank_score，分数没有变化的文档不发送更新（重复运行时只写入变化部分），
+# 其余文档用多线程并发的 bulk 局部更新（update + doc）写入，不重新发送整个文档。
+import os
+import sys
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pagerank'))
+from score_store import ScoreStore
+
+# 连接 Elasticsearch
+es = Elasticsearch(["http://localhost:9200"], verify_certs=False, request_timeout=360)
+
+index_name = "my_index"
+PAGERANK_SCORES_BASE = r"E:\ir24\ir_lab4\ir4_code\pagerank\pagerank_scores"  # pagerank.py 写入的二进制分数文件
+
+SCAN_SIZE = 2000         # 每次滚动查询读取的文档数
+CHUNK_SIZE = 1000        # 每个 bulk 请求的更新数
+THREAD_COUNT = 4         # 并发发送 bulk 请求的线程数
+UPDATE_TOLERANCE = 1e-3  # 新旧分数的相对差小于该值时不更新
+
+
+def changed(old, new):
+    if old is None:
+        return True
+    return abs(new - old) > UPDATE_TOLERANCE * max(abs(old), abs(new))
+
+
+def generate_updates(store, stats, target):
+    """滚动读取索引中的 url 和 pagerank_score，按批查询新分数，只为变化的文档生成局部更新。"""
+    batch = []
+
+    def flush():
+        scores = store.get_many([hit["_source"].get("url", "") for hit in batch])
+        for hit, score in zip(batch, scores):
+            stats["scanned"] += 1
+            if changed(hit["_source"].get("pagerank_score"), score):
+                yield {
+                    "_op_type": "update",
+                    "_index": hit["_index"],
+                    "_id": hit["_id"],
+                    "doc": {"pagerank_score": score},
+                }
+        batch.clear()
+
+    for hit in helpers.scan(es, index=target, query={"query": {"match_all": {}}},
+                            _source=["url", "pagerank_score"], size=SCAN_SIZE):
+        batch.append(hit)
+        if len(batch) >= SCAN_SIZE:
+            yield from flush()
+    yield from flush()
+
+
+def enrich(target=index_name):
+    """为 target（索引名或别名，index_lifecycle.py 构建新版本时为版本索引名）中的文档写入 PageRank 分数。"""
+    store = ScoreStore(PAGERANK_SCORES_BASE)
+    if len(store) == 0:
+        print("没有可用的 PageRank 分数，请先运行 pagerank.py")
+        return
+
+    # 旧索引中没有该字段时补充映射（已存在时不会改变）
+    es.indices.put_mapping(index=target, body={"properties": {"pagerank_score": {"type": "float"}}})
+
+    stats = {"scanned": 0}
+    success, failed = 0, 0
+    start_time = time.time()
+    try:
+        print("Disabling index refresh interval...")
+        es.indices.put_settings(index=target, body={"index": {"refresh_interval": "-1"}})
+        for ok, item in helpers.parallel_bulk(es, generate_updates(store, stats, target), thread_count=THREAD_COUNT,
+                                              chunk_size=CHUNK_SIZE, raise_on_error=False, request_timeout=120):
+            if ok:
+                success += 1
+            else:
+                failed += 1
+                if failed <= 10:
+                    print(f"Update failed: {item}")
+    finally:
+        print("Re-enabling index refresh interval...")
+        es.indices.put_settings(index=target, body={"index": {"refresh_interval": "1s"}})
+
+    elapsed = time.time() - start_time
+    print(f"PageRank enrichment completed in {elapsed:.1f}s: {stats['scanned']} documents scanned, "
+          f"{success} updated, {stats['scanned'] - success - failed} unchanged, {failed} failures.")
+
+
+if __name__ == "__main__":
+    enrich()
@@ -1,7 +1,12 @@
-import json
 import os
+import sys
 from elasticsearch import Elasticsearch, helpers
-from elasticsearch.helpers import BulkIndexError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shards import list_shards
+from snapshot_store import SnapshotWriter
+from mapping import settings as index_settings
+from bulk_ingest import DeadLetterQueue, IngestProgress, doc_id, ingest, replay_dead_letters
 
 # 连接 Elasticsearch
 es = Elasticsearch(["http://localhost:9200"], verify_certs=False, request_timeout=360)
@@ -9,55 +14,69 @@ es = Elasticsearch(["http://localhost:9200"], verify_certs=False, request_timeou
 index_name = "my_index"
 json_dir = r"E:\ir24\ir_lab4\ir4_code\JSON\government_output"
 
-# 定义数据生成函数
-def generate_actions():
-    # 遍历 JSON 目录中的所有文件
-    for filename in os.listdir(json_dir):
-        if filename.endswith(".json"):  # 只处理 .json 文件
-            file_path = os.path.join(json_dir, filename)
-            print(f"Processing file: {filename}")
-            with open(file_path, 'r', encoding='utf-8') as f:
-                try:
-                    data = json.load(f)  # 加载整个 JSON 文件
-
-                    # 如果是 JSON 数组，每个元素为一个文档
-                    if isinstance(data, list):
-                        for doc in data:
-                            yield {"_index": index_name, "_source": doc}
-
-                    # 如果是单个 JSON 对象
-                    elif isinstance(data, dict):
-                        yield {"_index": index_name, "_source": data}
-
-                except json.JSONDecodeError as e:
-                    print(f"Invalid JSON in file '{filename}': {e}")
-                except Exception as e:
-                    print(f"Error processing file '{filename}': {e}")
-
-# 批量导入数据
-try:
-    print("Disabling index refresh interval...")
-    es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "-1"}})
-
-    print("Starting bulk indexing...")
-    success, failed = 0, 0
-    for ok, action in helpers.streaming_bulk(
-        client=es,
-        actions=generate_actions(),
-        chunk_size=500,  # 每批次 500 条文档
-        request_timeout=120
-    ):
-        if ok:
-            success += 1
+# 增量导入：设置为 spider.py 增量抓取生成的 delta_* 目录时，只导入其中新增/变化的页面，
+# 并删除 removed.txt 中已失效的页面。
+# 文档 _id 由 URL 生成，重复导入同一目录不会产生重复文档，内容未变化的文档会被跳过
+DELTA_DIR = None
+
+# 导入进度和死信文件：中断后重新运行会跳过已完成的部分（RESUME = False 则重新开始）；
+# 最终导入失败的文档及错误信息写入 DEAD_LETTER_FILE，设置 REPLAY_DEAD_LETTERS = True 后运行只重新导入这些文档
+STATE_FILE = 'ingest_state.json'
+DEAD_LETTER_FILE = 'dead_letter.jsonl'
+RESUME = True
+REPLAY_DEAD_LETTERS = False
+
+# 网页快照（raw_html）不写入索引，保存到本地快照存储，由 query.py 的 /snapshot 读取；
+# 与 spider.py 的 SNAPSHOT_DIR 相同，爬虫已经保存过的快照不会重复存储
+SNAPSHOT_DIR = r"E:\ir24\ir_lab4\ir4_code\JSON\snapshots"
+
+# 删除增量目录中 removed.txt 记录的失效页面；新增和变化的页面按 URL 对应的 _id 直接覆盖，不需要先删除
+def delete_removed_docs(delta_dir):
+    removed_path = os.path.join(delta_dir, "removed.txt")
+    if not os.path.exists(removed_path):
+        return
+    with open(removed_path, 'r', encoding='utf-8') as f:
+        actions = [{"_op_type": "delete", "_index": index_name, "_id": doc_id(line.strip())}
+                   for line in f if line.strip()]
+    deleted, errors = helpers.bulk(es, actions, raise_on_error=False)
+    # 已经不存在的文档（404）不算错误
+    missing = sum(1 for e in errors if e.get("delete", {}).get("status") == 404)
+    print(f"Deleted {deleted} removed documents ({missing} already absent, {len(errors) - missing} errors).")
+
+# 批量导入数据（解析分片使用进程池，Windows 下子进程会重新导入本模块，导入过程必须放在 main 中）
+if __name__ == "__main__":
+    try:
+        # 由旧版本建立的索引中补充导入时写入的派生字段和 infix 子字段的映射（已存在时不会改变）
+        properties = index_settings["mappings"]["properties"]
+        es.indices.put_mapping(index=index_name, body={"properties": {
+            field: properties[field] for field in ("has_attachment", "attachment_types", "content_hash",
+                                                   "title", "content", "anchor_texts")}})
+
+        print("Disabling index refresh interval...")
+        es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "-1"}})
+
+        if REPLAY_DEAD_LETTERS:
+            print("Replaying dead letters...")
+            replay_dead_letters(es, DEAD_LETTER_FILE, index_name)
         else:
-            failed += 1
-
-    print(f"Bulk indexing completed: {success} successes, {failed} failures.")
-except BulkIndexError as e:
-    print(f"BulkIndexError encountered: {e}")
-except Exception as e:
-    print(f"An unexpected error occurred: {e}")
-finally:
-    print("Re-enabling index refresh interval...")
-    es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "1s"}})
-    print("Data indexing process completed successfully!")
+            data_dir = DELTA_DIR or json_dir
+            progress = IngestProgress(STATE_FILE, index_name, [data_dir], resume=RESUME)
+            if DELTA_DIR:
+                delete_removed_docs(DELTA_DIR)
+
+            print("Starting bulk indexing...")
+            # 进程池按记录区间解析分片 + 多线程发送按字节切分的 bulk 请求，429 时退避重试（见 bulk_ingest.py）
+            dead_letters = DeadLetterQueue(DEAD_LETTER_FILE, append=progress.resumed)
+            snapshots = SnapshotWriter(SNAPSHOT_DIR)
+            try:
+                stats = ingest(es, list_shards(data_dir), index_name, progress, dead_letters, snapshots)
+            finally:
+                dead_letters.close()
+                snapshots.close()
+            print(f"Bulk indexing completed: {stats.docs} successes, {stats.failed} failures.")
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+    finally:
+        print("Re-enabling index refresh interval...")
+        es.indices.put_settings(index=index_name, body={"index": {"refresh_interval": "1s"}})
+        print("Data indexing process completed successfully!")
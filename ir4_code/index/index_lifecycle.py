@@ -0,0 +1,198 @@
+# index_lifecycle.py
+# 零停机重建索引：query.py 读取的 my_index 是一个别名，指向某个版本索引 my_index-v<时间戳>。
+#   python index_lifecycle.py build            在新的版本索引中全量构建（导入分片、写入 PageRank 分数），
+#                                              force merge 并预热后原子切换别名
+#   python index_lifecycle.py list             列出所有版本及别名当前指向的版本
+#   python index_lifecycle.py rollback [版本]  把别名切回上一个（或指定的）版本
+#   python index_lifecycle.py prune            删除最近 KEEP_VERSIONS 个版本之外的旧版本
+# 构建期间查询服务继续使用旧版本；构建中断后再次运行 build 会继续写入同一个版本索引（跳过已完成的段）。
+import json
+import os
+import sys
+import time
+
+from elasticsearch import Elasticsearch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query'))
+from shards import list_shards
+from snapshot_store import SnapshotWriter
+from bulk_ingest import DeadLetterQueue, IngestProgress, ingest
+from enrich_pagerank import enrich
+from index_data import DEAD_LETTER_FILE, SNAPSHOT_DIR, json_dir
+from mapping import settings as index_settings
+from query_log import QueryLog
+
+es = Elasticsearch(["http://localhost:9200"], verify_certs=False, request_timeout=360)
+
+ALIAS = "my_index"           # query.py / index_data.py / enrich_pagerank.py 使用的名称
+KEEP_VERSIONS = 3            # prune 保留的版本数（别名当前指向的版本总会保留）
+REPLICAS = 0                 # 切换前设置的副本数；单节点集群没有地方放置副本，多节点时改为 1
+FORCE_MERGE_SEGMENTS = 1     # 构建完成后合并到的段数（版本索引之后只有少量增量写入）
+MIN_DOC_RATIO = 0.9          # 新版本文档数低于当前版本的该比例时不切换（防止导入大量失败后切到不完整的索引）
+BUILD_STATE_FILE = 'index_build.json'              # 记录正在构建的版本，中断后继续
+BUILD_PROGRESS_FILE = 'build_ingest_state.json'    # 构建时的导入进度（见 bulk_ingest.IngestProgress）
+QUERY_LOG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'query', 'query_log.db')
+WARM_QUERIES = 50            # 用查询日志中最近的多少个查询预热
+
+# 构建期间的设置：不复制、不刷新、translog 异步落盘；切换前恢复为查询时的设置
+BULK_SETTINGS = {"number_of_replicas": 0, "refresh_interval": "-1", "translog.durability": "async"}
+SERVING_SETTINGS = {"number_of_replicas": REPLICAS, "refresh_interval": "1s", "translog.durability": "request"}
+
+
+def versions():
+    """所有版本索引（按构建时间从旧到新）。"""
+    return sorted(es.indices.get(index=f"{ALIAS}-v*"))
+
+
+def current():
+    """别名当前指向的版本索引；尚未使用别名时返回 None。"""
+    if not es.indices.exists_alias(name=ALIAS):
+        return None
+    return next(iter(es.indices.get_alias(name=ALIAS)))
+
+
+def load_state():
+    if not os.path.exists(BUILD_STATE_FILE):
+        return {}
+    with open(BUILD_STATE_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(BUILD_STATE_FILE + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(BUILD_STATE_FILE + '.tmp', BUILD_STATE_FILE)
+
+
+def swap(target):
+    """在一个 _aliases 请求中把别名从旧版本移到 target，查询不会看到中间状态。"""
+    actions = []
+    if es.indices.exists_alias(name=ALIAS):
+        actions += [{"remove": {"index": old, "alias": ALIAS}} for old in es.indices.get_alias(name=ALIAS)]
+    elif es.indices.exists(index=ALIAS):
+        # 旧版本 mapping.py 直接创建的同名索引：在同一个请求中删除，由别名取代
+        actions.append({"remove_index": {"index": ALIAS}})
+    actions.append({"add": {"index": target, "alias": ALIAS}})
+    es.indices.update_aliases(actions=actions)
+    print(f"Alias '{ALIAS}' now points to {target}")
+
+
+def recent_queries(limit=WARM_QUERIES):
+    if not os.path.exists(QUERY_LOG):
+        return []
+    return [log['query'] for log in QueryLog(QUERY_LOG).recent(limit=limit)]
+
+
+def warm(name):
+    """用最近的查询预热新版本（加载词典、倒排表和 pagerank_score 的 doc values），切换后的第一批查询不会变慢。"""
+    queries = recent_queries()
+    start = time.time()
+    for query in queries:
+        es.search(index=name, body={
+            "query": {
+                "function_score": {
+                    "query": {"multi_match": {"query": query, "fields": ["title", "content", "anchor_texts"]}},
+                    "field_value_factor": {"field": "pagerank_score", "missing": 0},
+                    "boost_mode": "sum"
+                }
+            },
+            "size": 10
+        })
+    es.search(index=name, body={"query": {"match_all": {}}, "sort": [{"pagerank_score": "desc"}], "size": 10})
+    print(f"Warmed {name} with {len(queries)} logged queries in {time.time() - start:.1f}s")
+
+
+def finalize(name):
+    """合并段、恢复查询时的设置，等待分片就绪。"""
+    print(f"Force merging {name} to {FORCE_MERGE_SEGMENTS} segment(s)...")
+    es.indices.refresh(index=name)
+    es.options(request_timeout=3600).indices.forcemerge(index=name, max_num_segments=FORCE_MERGE_SEGMENTS)
+    # 合并之后再增加副本，副本直接复制合并后的段
+    es.indices.put_settings(index=name, body={"index": SERVING_SETTINGS})
+    es.indices.refresh(index=name)
+    es.cluster.health(index=name, wait_for_status="green", timeout="10m")
+
+
+def build():
+    state = load_state()
+    name = state.get("building")
+    if name and es.indices.exists(index=name):
+        print(f"Resuming build of {name}")
+    else:
+        name = f"{ALIAS}-v{time.strftime('%Y%m%d%H%M%S')}"
+        body = dict(index_settings, settings=dict(index_settings["settings"], index=BULK_SETTINGS))
+        es.indices.create(index=name, body=body)
+        save_state({"building": name})
+        print(f"Created {name}")
+
+    # 进度以版本索引名为键，只有继续同一个版本时才会跳过已完成的段
+    progress = IngestProgress(BUILD_PROGRESS_FILE, name, [json_dir])
+    dead_letters = DeadLetterQueue(DEAD_LETTER_FILE, append=progress.resumed)
+    snapshots = SnapshotWriter(SNAPSHOT_DIR)
+    try:
+        # 新建的版本索引中没有文档，只有继续中断的构建时才需要查询已有文档的 content_hash
+        stats = ingest(es, list_shards(json_dir), name, progress, dead_letters, snapshots,
+                       check_existing=progress.resumed)
+    finally:
+        dead_letters.close()
+        snapshots.close()
+
+    es.indices.refresh(index=name)
+    enrich(name)
+    finalize(name)
+
+    old = current() or (ALIAS if es.indices.exists(index=ALIAS) else None)
+    count = es.count(index=name)["count"]
+    if old:
+        old_count = es.count(index=old)["count"]
+        if count < MIN_DOC_RATIO * old_count:
+            print(f"{name} has {count} documents, {old} has {old_count}; not switching. "
+                  f"Check {DEAD_LETTER_FILE}, then run 'python index_lifecycle.py build' again to resume.")
+            return
+    warm(name)
+    swap(name)
+    save_state({})
+    print(f"Build finished: {count} documents ({stats.failed} failures), previous version: {old or 'none'}")
+    prune()
+
+
+def rollback(target=None):
+    cur = current()
+    if target is None:
+        older = [v for v in versions() if cur is None or v < cur]
+        if not older:
+            print("No older version to roll back to")
+            return
+        target = older[-1]
+    swap(target)
+
+
+def prune(keep=KEEP_VERSIONS):
+    cur = current()
+    building = load_state().get("building")
+    for name in versions()[:-keep]:
+        if name not in (cur, building):
+            es.indices.delete(index=name)
+            print(f"Deleted old version {name}")
+
+
+def show():
+    cur = current()
+    for name in versions():
+        marker = '*' if name == cur else ' '
+        print(f"{marker} {name}  {es.count(index=name)['count']} docs")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'build':
+        build()
+    elif command == 'rollback':
+        rollback(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == 'prune':
+        prune()
+    elif command == 'list':
+        show()
+    else:
+        print("usage: python index_lifecycle.py build | list | rollback [version] | prune")
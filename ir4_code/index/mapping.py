@@ -1,4 +1,6 @@
 # mapping.py
+import sys
+
 from elasticsearch import Elasticsearch
 
 # 连接 Elasticsearch（无用户名密码）
@@ -30,31 +32,46 @@ settings = {
             "url": {"type": "keyword",
             "ignore_above": 256  # 避免过长字符串浪费空间
             },
+            # infix 子字段为 wildcard 类型（按 3-gram 索引原文），通配查询不依赖分词结果，
+            # 前导通配符也不需要扫描整个词典
             "title": {
                 "type": "text",
                 "analyzer": "ik_max_word_analyzer",
-                "index_options": "offsets"
+                "index_options": "offsets",
+                "fields": {"infix": {"type": "wildcard"}}
             },
             "anchor_texts": {
                 "type": "text",
                 "analyzer": "ik_smart_analyzer",
+                "fields": {"infix": {"type": "wildcard"}}
             },
             "content": {
                 "type": "text",
                 "analyzer": "ik_max_word_analyzer",
-                "index_options": "offsets"
+                "index_options": "offsets",
+                "fields": {"infix": {"type": "wildcard"}}
             },
             "outlinks": {"type": "keyword"},
-            "raw_html": {"type": "text"}, 
-            "attachments": {"type": "keyword"} 
+            "attachments": {"type": "keyword"},
+            "has_attachment": {"type": "boolean"},  # 由 bulk_ingest.py 根据 attachments 写入
+            "attachment_types": {"type": "keyword"},  # 附件扩展名（pdf、docx 等），文档查询按此过滤
+            "pagerank_score": {"type": "float"},  # 由 enrich_pagerank.py 写入
+            "content_hash": {"type": "keyword", "index": False}  # 由 bulk_ingest.py 写入，用于跳过未变化的文档
         }
     }
 }
 
-# 删除已有的同名索引（可选）
-if es.indices.exists(index=index_name):
-    es.indices.delete(index=index_name)
+# 线上重建索引请使用 index_lifecycle.py build：在新的版本索引中构建完成后再切换别名，查询服务不会中断。
+# 直接运行本文件会删除并重新创建 index_name（仅用于初始化；index_name 已经是别名时不执行）
+if __name__ == "__main__":
+    if es.indices.exists_alias(name=index_name):
+        print(f"'{index_name}' is an alias managed by index_lifecycle.py; use 'python index_lifecycle.py build' instead.")
+        sys.exit(1)
+
+    # 删除已有的同名索引（可选）
+    if es.indices.exists(index=index_name):
+        es.indices.delete(index=index_name)
 
-# 创建索引
-es.indices.create(index=index_name, body=settings)
-print(f"Index '{index_name}' created with given mapping.")
+    # 创建索引
+    es.indices.create(index=index_name, body=settings)
+    print(f"Index '{index_name}' created with given mapping.")
@@ -0,0 +1,173 @@
+# link_graph.py
+# 流式提取链接图：只从分片中取出 url 和 outlinks 两个字段，不把 raw_html / content 组装成对象，
+# 内存占用只与图的规模（URL 数、边数）有关，与语料大小无关。
+# 链接图以紧凑的二进制边表缓存在磁盘上（urls.txt + edges.bin），数据没有变化时直接复用。
+import io
+import json
+import os
+import sys
+from array import array
+
+import ijson
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shards import list_shards, iter_lines
+
+from sparse_pagerank import LinkGraph
+
+
+def _links_from_events(events, prefix=''):
+    """从 ijson 事件流中取出一个文档的 url 和 outlinks；outlinks 结束后立即返回，不再解析后面的字段。"""
+    url, outlinks = None, []
+    got_outlinks = False
+    for event_prefix, event, value in events:
+        if event_prefix == prefix + 'url' and event == 'string':
+            url = value
+        elif event_prefix == prefix + 'outlinks.item' and event == 'string':
+            outlinks.append(value)
+        elif event_prefix == prefix + 'outlinks' and event == 'end_array':
+            got_outlinks = True
+        if url is not None and got_outlinks:
+            break
+    return url, outlinks
+
+
+def iter_links(path):
+    """逐个返回数据文件中每个文档的 (url, outlinks)。"""
+    if path.endswith('.json'):
+        # 旧格式：整个 JSON 数组，用 ijson 流式解析（同 shards.iter_records）
+        url, outlinks = None, []
+        with open(path, 'rb') as f:
+            for prefix, event, value in ijson.parse(f):
+                if prefix in ('item.url', 'url') and event == 'string':
+                    url = value
+                elif prefix in ('item.outlinks.item', 'outlinks.item') and event == 'string':
+                    outlinks.append(value)
+                elif prefix in ('item', '') and event == 'end_map':
+                    if url:
+                        yield url, outlinks
+                    url, outlinks = None, []
+        return
+
+    # JSONL 分片：spider.py 写入的字段顺序中 outlinks 在 raw_html 之前，读到 outlinks 即可停止
+    for line in iter_lines(path):
+        url, outlinks = _links_from_events(ijson.parse(io.BytesIO(line)))
+        if url:
+            yield url, outlinks
+
+
+def read_aliases(data_dir):
+    """近似重复页面的别名（spider.py 写入 aliases.jsonl）：别名 URL -> canonical URL。"""
+    aliases = {}
+    path = os.path.join(data_dir, "aliases.jsonl")
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                aliases[entry["url"]] = entry["canonical"]
+    return aliases
+
+
+def read_removed(data_dir):
+    path = os.path.join(data_dir, "removed.txt")
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def source_signature(data_dir):
+    """数据目录中所有分片的文件名、大小和修改时间，用于判断缓存是否仍然有效。"""
+    return [[os.path.basename(p), os.path.getsize(p), int(os.path.getmtime(p))] for p in list_shards(data_dir)]
+
+
+def build_graph(data_dir, aliases=None, graph=None):
+    """从数据目录流式构建链接图；传入 graph 时在其基础上追加。返回 (graph, 本次出现的源 URL 编号集合)。"""
+    graph = graph or LinkGraph()
+    aliases = aliases if aliases is not None else read_aliases(data_dir)
+    sources = set()
+    for path in list_shards(data_dir):
+        print(f"Processing file: {os.path.basename(path)}")
+        for url, outlinks in iter_links(path):
+            sources.add(graph.intern(url))
+            graph.add_links(url, (aliases.get(link, link) for link in outlinks))
+    return graph, sources
+
+
+def save_cache(graph, cache_dir, signature):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, 'urls.txt.tmp'), 'w', encoding='utf-8') as f:
+        for url in graph.urls:
+            f.write(url + '\n')
+    # 边表：int32 的 (源编号, 目标编号) 交替排列
+    edges = np.empty(2 * graph.num_edges(), dtype=np.int32)
+    edges[0::2] = np.frombuffer(graph.src, dtype=np.int32)
+    edges[1::2] = np.frombuffer(graph.dst, dtype=np.int32)
+    edges.tofile(os.path.join(cache_dir, 'edges.bin.tmp'))
+    with open(os.path.join(cache_dir, 'signature.json.tmp'), 'w', encoding='utf-8') as f:
+        json.dump(signature, f)
+    for name in ('urls.txt', 'edges.bin', 'signature.json'):
+        os.replace(os.path.join(cache_dir, name + '.tmp'), os.path.join(cache_dir, name))
+
+
+def load_cache(cache_dir):
+    """读取缓存的链接图，返回 (graph, signature)；没有缓存时返回 (None, None)。"""
+    paths = [os.path.join(cache_dir, name) for name in ('urls.txt', 'edges.bin', 'signature.json')]
+    if not all(os.path.exists(p) for p in paths):
+        return None, None
+    graph = LinkGraph()
+    with open(paths[0], 'r', encoding='utf-8') as f:
+        for line in f:
+            graph.intern(line.rstrip('\n'))
+    edges = np.fromfile(paths[1], dtype=np.int32)
+    graph.src = array('i', edges[0::2].tobytes())
+    graph.dst = array('i', edges[1::2].tobytes())
+    with open(paths[2], 'r', encoding='utf-8') as f:
+        signature = json.load(f)
+    return graph, signature
+
+
+def apply_delta(graph, delta_dir, aliases=None):
+    """
+    在已有链接图上应用增量：替换变化页面的出链；removed.txt 中的页面（本次没有重新抓取到的）
+    连同指向它们的链接一起从图中删除，并压缩节点编号，不再参与计算，也不会写入分数文件。
+    """
+    delta, sources = build_graph(delta_dir, aliases)
+    # delta 是在空图上构建的，编号需要映射到原图
+    mapping = np.array([graph.intern(url) for url in delta.urls], dtype=np.int32)
+    source_ids = {int(mapping[s]) for s in sources}
+    removed = np.array([graph.ids[url] for url in read_removed(delta_dir)
+                        if url in graph.ids and graph.ids[url] not in source_ids], dtype=np.int32)
+    stale_ids = np.array(sorted(source_ids), dtype=np.int32)
+    src = np.frombuffer(graph.src, dtype=np.int32)
+    dst = np.frombuffer(graph.dst, dtype=np.int32)
+    keep = ~np.isin(src, stale_ids)
+    src = np.concatenate([src[keep], mapping[np.frombuffer(delta.src, dtype=np.int32)]])
+    dst = np.concatenate([dst[keep], mapping[np.frombuffer(delta.dst, dtype=np.int32)]])
+    if len(removed) == 0:
+        graph.src = array('i', src.tobytes())
+        graph.dst = array('i', dst.tobytes())
+        return graph
+
+    alive = np.ones(len(graph), dtype=bool)
+    alive[removed] = False
+    keep = alive[src] & alive[dst]
+    new_ids = (np.cumsum(alive) - 1).astype(np.int32)
+    compact = LinkGraph()
+    for url, live in zip(graph.urls, alive):
+        if live:
+            compact.intern(url)
+    compact.src = array('i', new_ids[src[keep]].tobytes())
+    compact.dst = array('i', new_ids[dst[keep]].tobytes())
+    print(f"Removed {len(removed)} pages from the link graph")
+    return compact
+
+
+def load_links(cache_dir):
+    """把缓存的链接图还原为 url -> outlinks 字典（供 bench 脚本使用）。"""
+    graph, _ = load_cache(cache_dir)
+    links = {url: [] for url in graph.urls}
+    for s, d in zip(graph.src, graph.dst):
+        links[graph.urls[s]].append(graph.urls[d])
+    return links
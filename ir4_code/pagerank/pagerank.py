@@ -1,42 +1,60 @@
 # pagerank.py
 import json
 import os
-import networkx as nx
+
+from link_graph import apply_delta, build_graph, load_cache, read_aliases, save_cache, source_signature
+from score_store import write_scores
+from sparse_pagerank import pagerank, scores_dict
 
 json_dir = r"E:\ir24\ir_lab4\ir4_code\JSON"
 
-G = nx.DiGraph()
-
-# 从JSON中读取数据并构建图
-for filename in os.listdir(json_dir):
-    if filename.endswith(".json"):
-        file_path = os.path.join(json_dir, filename)
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            # 同index_data.py一致的结构判断
-            docs = data if isinstance(data, list) else [data]
-            for doc in docs:
-                url = doc.get("url")
-                outlinks = doc.get("outlinks", [])
-                if url:
-                    if not G.has_node(url):
-                        G.add_node(url)
-                    for link in outlinks:
-                        if link and link != url:  # 避免自环
-                            if not G.has_node(link):
-                                G.add_node(link)
-                            G.add_edge(url, link)
+# 增量计算：设置为 spider.py 增量抓取生成的 delta_* 目录时，
+# 在缓存的链接图上只替换变化页面的出链、删除 removed.txt 中的页面，不再读取全部数据
+DELTA_DIR = None
+LINK_CACHE_DIR = 'link_cache'  # 链接图缓存（urls.txt + edges.bin），数据目录未变化时直接复用
+WARM_START = True  # 以上一次的 pagerank_scores.json 作为迭代初值，图变化不大时迭代次数更少
+TOLERANCE = 1e-6   # 收敛阈值（与 nx.pagerank 的 tol 含义相同）
+
+# 近似重复页面的别名（spider.py 写入 aliases.jsonl），指向别名的链接计入其 canonical 页面
+aliases = read_aliases(json_dir)
+if DELTA_DIR:
+    aliases.update(read_aliases(DELTA_DIR))
+
+# 只流式读取每个文档的 url 和 outlinks，不加载 raw_html / content
+graph, signature = load_cache(LINK_CACHE_DIR)
+if DELTA_DIR:
+    if graph is None:
+        signature = source_signature(json_dir)
+        graph, _ = build_graph(json_dir, aliases)
+    graph = apply_delta(graph, DELTA_DIR, aliases)
+    # 记录已应用的增量，之后的全量计算不会误用这份缓存
+    save_cache(graph, LINK_CACHE_DIR, signature + [['delta', os.path.basename(os.path.normpath(DELTA_DIR))]])
+elif graph is None or signature != source_signature(json_dir):
+    signature = source_signature(json_dir)
+    graph, _ = build_graph(json_dir, aliases)
+    save_cache(graph, LINK_CACHE_DIR, signature)
+else:
+    print(f"Using cached link graph in {LINK_CACHE_DIR}")
+print(f"Link graph: {len(graph)} nodes, {graph.num_edges()} edges")
+
+output_file = 'pagerank_scores.json'
+previous_scores = None
+if WARM_START and os.path.exists(output_file):
+    with open(output_file, 'r', encoding='utf-8') as f:
+        previous_scores = json.load(f)
 
 # 计算 PageRank
-pagerank_scores = nx.pagerank(G)
+pagerank_scores = scores_dict(graph, pagerank(graph, tol=TOLERANCE, init=previous_scores))
 
 # 排序
 sorted_scores = sorted(pagerank_scores.items(), key=lambda x: x[1], reverse=True)
 sorted_url_scores = {url: score for url, score in sorted_scores}
 
 # 将结果写入JSON
-output_file = 'pagerank_scores.json'
 with open(output_file, 'w', encoding='utf-8') as f:
     json.dump(sorted_url_scores, f, ensure_ascii=False, indent=4)
 
 print(f"PageRank scores saved to {output_file}")
+
+# 同时写入查询服务使用的二进制分数文件（内存映射读取，服务运行中自动切换到新版本）
+print(f"Score store saved to {write_scores(pagerank_scores, os.path.splitext(output_file)[0])}")
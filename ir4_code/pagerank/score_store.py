@@ -0,0 +1,169 @@
+# score_store.py
+# PageRank 分数的二进制存储：按 URL 的 64 位指纹排序的 uint64 数组 + 对应的 float32 分数数组。
+# 查询服务通过内存映射读取，启动时不需要解析 JSON，多个 worker 进程共享同一份页缓存；
+# 查找一个 URL 是对指纹数组的二分查找。
+#
+# 每次 pagerank.py 计算完成后写入一个新的分数文件（pagerank_scores.<时间戳>.bin），
+# 再原子地替换指针文件 pagerank_scores.current 指向它；查询服务发现指针文件变化（或收到 SIGHUP）后
+# 映射新文件并整体替换引用，正在处理的请求继续使用旧的映射，不会读到写了一半的数据。
+# SIGHUP 处理函数只调用 request_reload() 做标记，由下一次查询重新加载：信号可能在主线程正持有锁（reload() 中）时到达，
+# 在处理函数中再获取锁会死锁。
+import glob
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frontier import url_fingerprint
+
+MAGIC = b'PRSCORE1'
+HEADER_SIZE = 16   # MAGIC + uint64 记录数
+KEEP_VERSIONS = 2  # 保留最近几个版本的分数文件（旧版本可能仍被正在运行的服务映射）
+
+
+def _pointer_path(base):
+    return base + '.current'
+
+
+def write_scores(scores, base):
+    """
+    把 url -> score 字典写成新版本的分数文件，并把指针文件切换到它。
+    base 为不带扩展名的路径，如 'pagerank_scores'。返回新文件的路径。
+    """
+    n = len(scores)
+    fps = np.fromiter((url_fingerprint(url) for url in scores), dtype=np.uint64, count=n)
+    values = np.fromiter(scores.values(), dtype=np.float32, count=n)
+    order = np.argsort(fps, kind='stable')
+    fps, values = fps[order], values[order]
+    # 指纹冲突（概率极小）时只保留第一个
+    fps, first = np.unique(fps, return_index=True)
+    values = values[first]
+
+    path = f"{base}.{time.strftime('%Y%m%d_%H%M%S')}.bin"
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(fps)).tobytes())
+        f.write(fps.astype('<u8').tobytes())
+        f.write(values.astype('<f4').tobytes())
+    os.replace(path + '.tmp', path)
+
+    pointer = _pointer_path(base)
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(path))
+    os.replace(pointer + '.tmp', pointer)
+
+    # 清理旧版本；Windows 上仍被映射的文件删除失败时留到下次再删
+    for old in sorted(glob.glob(f"{glob.escape(base)}.*.bin"))[:-KEEP_VERSIONS]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+
+class _Snapshot:
+    """一个版本的分数文件的内存映射。"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:8] != MAGIC:
+            raise ValueError(f"{path} 不是 PageRank 分数文件")
+        n = int(np.frombuffer(header[8:], dtype='<u8')[0])
+        self.path = path
+        self.fps = np.memmap(path, dtype='<u8', mode='r', offset=HEADER_SIZE, shape=(n,)) if n else np.zeros(0, '<u8')
+        self.values = (np.memmap(path, dtype='<f4', mode='r', offset=HEADER_SIZE + 8 * n, shape=(n,))
+                       if n else np.zeros(0, '<f4'))
+
+    def lookup(self, fps):
+        if len(self.fps) == 0:
+            return np.zeros(len(fps))
+        pos = np.searchsorted(self.fps, fps)
+        pos[pos == len(self.fps)] = 0
+        found = self.fps[pos] == fps
+        return np.where(found, self.values[pos], 0.0)
+
+
+class ScoreStore:
+    """
+    只读的 PageRank 分数存储。get(url) / get_many(urls) 查询分数（不存在时为 0.0）；
+    每隔 check_interval 秒检查一次指针文件的修改时间，变化时自动切换到新版本，也可以直接调用 reload()，
+    或调用 request_reload() 让下一次查询重新加载。
+    """
+
+    def __init__(self, base, check_interval=5.0):
+        self.base = base
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.mtime = None
+        self.next_check = 0.0
+        self.reload_requested = False
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """重新读取指针文件并映射其指向的分数文件；失败时保留当前版本。"""
+        pointer = _pointer_path(self.base)
+        with self.lock:
+            try:
+                mtime = os.path.getmtime(pointer)
+                with open(pointer, 'r', encoding='utf-8') as f:
+                    name = f.read().strip()
+                snapshot = _Snapshot(os.path.join(os.path.dirname(pointer), name))
+            except (OSError, ValueError) as e:
+                if self.snapshot is None:
+                    print(f"PageRank 分数文件不可用: {e}")
+                return False
+            # 只替换引用：已经拿到旧快照的请求继续使用旧的映射
+            self.snapshot = snapshot
+            self.mtime = mtime
+            print(f"Loaded PageRank scores: {snapshot.path} ({len(snapshot.fps)} urls)")
+            return True
+
+    def request_reload(self):
+        """标记为需要重新加载（不获取锁，可以在信号处理函数中调用），下一次查询时执行。"""
+        self.reload_requested = True
+        self.next_check = 0.0
+
+    def _current(self):
+        now = time.monotonic()
+        if now >= self.next_check:
+            self.next_check = now + self.check_interval
+            requested, self.reload_requested = self.reload_requested, False
+            try:
+                changed = os.path.getmtime(_pointer_path(self.base)) != self.mtime
+            except OSError:
+                changed = False
+            if changed or requested:
+                self.reload()
+        return self.snapshot
+
+    def get_many(self, urls):
+        snapshot = self._current()
+        if snapshot is None:
+            return [0.0] * len(urls)
+        fps = np.fromiter((url_fingerprint(url) for url in urls), dtype=np.uint64, count=len(urls))
+        return [float(v) for v in snapshot.lookup(fps)]
+
+    def get(self, url):
+        return self.get_many([url])[0]
+
+    def version(self):
+        """当前使用的分数文件路径（分数更新后变化，用于使依赖分数的缓存失效）。"""
+        snapshot = self._current()
+        return None if snapshot is None else snapshot.path
+
+    def __len__(self):
+        snapshot = self.snapshot
+        return 0 if snapshot is None else len(snapshot.fps)
+
+
+if __name__ == '__main__':
+    # 把已有的 pagerank_scores.json 转换为二进制分数文件：python score_store.py [pagerank_scores.json]
+    import json
+    source = sys.argv[1] if len(sys.argv) > 1 else 'pagerank_scores.json'
+    with open(source, 'r', encoding='utf-8') as f:
+        print(f"Saved {write_scores(json.load(f), os.path.splitext(source)[0])}")
@@ -0,0 +1,223 @@
+# metrics.py
+# 查询服务的延迟统计，以 Prometheus 文本格式在 /metrics 导出：
+# - query_request_seconds{route, type}：每个路由（/search 还按查询类型）的请求延迟直方图
+# - query_stage_seconds{route, stage}：请求中各阶段（span）的耗时直方图，如 /search 的 cache / es / render
+# - query_requests_total{route, status}：请求数
+# 请求开始时 begin()，结束时 end()；请求中用 with span("es"): ... 记录一个阶段，同一阶段多次出现时累加。
+# 当前请求保存在 contextvars 中，每个 asyncio 任务（请求）各自独立。
+# 多个 worker 进程时，每个进程定期把自己的统计写到 METRICS_DIR/<pid>.json，/metrics 合并所有进程的统计。
+# 慢请求（超过 SLOW_REQUEST_SECONDS）打印各阶段耗时；PROFILE_SAMPLE_RATE > 0 时按比例对请求启用 cProfile
+# （每个进程同一时间只剖析一个请求），慢请求的剖析结果保存到 PROFILE_DIR/<时间>_<进程>_<路由>_<耗时>.prof。
+# 事件循环中同时处理的其它请求也会出现在剖析结果中。
+import contextvars
+import cProfile
+import glob
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图的桶上限（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_REQUEST_SECONDS = 1.0
+PROFILE_SAMPLE_RATE = 0.0     # 剖析的请求比例，0 表示关闭
+PROFILE_DIR = 'profiles'
+
+HELP = {
+    "query_request_seconds": ("histogram", "Request latency by route and query type"),
+    "query_stage_seconds": ("histogram", "Time spent in each stage of a request"),
+    "query_requests_total": ("counter", "Requests by route and status"),
+}
+
+_current = contextvars.ContextVar('metrics_request', default=None)
+
+
+class Registry:
+    """直方图和计数器，键为 (指标名, 标签元组)。"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.histograms = {}   # 键 -> [各桶计数..., 总和, 次数]
+        self.counters = {}     # 键 -> 值
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    h[i] += 1
+                    break
+            h[-2] += value
+            h[-1] += 1
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def snapshot(self):
+        """可以写成 JSON 的副本。"""
+        with self.lock:
+            return {"histograms": [[name, list(labels), list(h)] for (name, labels), h in self.histograms.items()],
+                    "counters": [[name, list(labels), v] for (name, labels), v in self.counters.items()]}
+
+
+def merge(snapshots):
+    """合并多个进程的 snapshot()，返回 (直方图, 计数器) 字典。"""
+    histograms, counters = {}, {}
+    for snap in snapshots:
+        for name, labels, h in snap.get("histograms", []):
+            key = (name, tuple(tuple(label) for label in labels))
+            total = histograms.setdefault(key, [0] * len(h))
+            for i, v in enumerate(h):
+                total[i] += v
+        for name, labels, v in snap.get("counters", []):
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + v
+    return histograms, counters
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    text = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for k, v in items)
+    return '{' + text + '}'
+
+
+def render(snapshots, buckets=BUCKETS):
+    """Prometheus 文本格式（直方图的桶为累计计数）。"""
+    histograms, counters = merge(snapshots)
+    lines = []
+    for metric, (kind, description) in HELP.items():
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        if kind == 'histogram':
+            for (name, labels), h in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, h):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {h[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {h[-2]:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {h[-1]}")
+        else:
+            for (name, labels), v in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{name}{_labels(labels)} {v}")
+    return '\n'.join(lines) + '\n'
+
+
+class _Request:
+    def __init__(self, route):
+        self.route = route
+        self.labels = {"type": ""}  # 同一指标的标签集合保持一致，只有 /search 设置查询类型
+        self.stages = {}
+        self.start = time.perf_counter()
+        self.profiler = None
+
+
+class Metrics:
+    """
+    一个进程的统计。begin(route) / end(status) 包围一个请求，span(stage) 记录请求中的一个阶段，
+    label(key, value) 为当前请求的延迟加上标签（如查询类型）。
+    """
+
+    def __init__(self, metrics_dir, slow_seconds=SLOW_REQUEST_SECONDS, profile_sample_rate=PROFILE_SAMPLE_RATE,
+                 profile_dir=PROFILE_DIR):
+        self.registry = Registry()
+        self.metrics_dir = metrics_dir
+        self.slow_seconds = slow_seconds
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_dir = profile_dir
+        self.profiling = False
+        self.lock = threading.Lock()
+        os.makedirs(metrics_dir, exist_ok=True)
+
+    def begin(self, route):
+        request = _Request(route)
+        _current.set(request)
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            with self.lock:
+                start = not self.profiling
+                self.profiling = True
+            if start:
+                request.profiler = cProfile.Profile()
+                request.profiler.enable()
+        return request
+
+    @staticmethod
+    def label(key, value):
+        request = _current.get()
+        if request is not None:
+            request.labels[key] = value
+
+    @staticmethod
+    @contextmanager
+    def span(stage):
+        request = _current.get()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if request is not None:
+                request.stages[stage] = request.stages.get(stage, 0.0) + time.perf_counter() - start
+
+    def end(self, status):
+        request = _current.get()
+        if request is None:
+            return
+        _current.set(None)
+        elapsed = time.perf_counter() - request.start
+        if request.profiler is not None:
+            request.profiler.disable()
+        route = request.route
+        self.registry.observe("query_request_seconds", dict(request.labels, route=route), elapsed)
+        for stage, seconds in request.stages.items():
+            self.registry.observe("query_stage_seconds", {"route": route, "stage": stage}, seconds)
+        self.registry.inc("query_requests_total", {"route": route, "status": str(status)})
+
+        if elapsed >= self.slow_seconds:
+            stages = ', '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in request.stages.items())
+            print(f"Slow request {route} {request.labels}: {elapsed * 1000:.1f}ms ({stages})")
+            if request.profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                name = (f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_"
+                        f"{route.strip('/').replace('/', '_') or 'root'}_{elapsed * 1000:.0f}ms.prof")
+                request.profiler.dump_stats(os.path.join(self.profile_dir, name))
+        if request.profiler is not None:
+            with self.lock:
+                self.profiling = False
+
+    def _path(self):
+        return os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+
+    def flush(self):
+        """把本进程的统计写到 METRICS_DIR/<pid>.json，供其它 worker 的 /metrics 合并。"""
+        path = self._path()
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def export(self):
+        """所有进程的统计（本进程使用当前的数据，其它进程使用最近写入的文件）。"""
+        snapshots = [self.registry.snapshot()]
+        own = self._path()
+        for path in glob.glob(os.path.join(glob.escape(self.metrics_dir), '*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return render(snapshots, self.registry.buckets)
@@ -1,35 +1,149 @@
-from flask import Flask, request, render_template, Response, jsonify, redirect, url_for, session
-from elasticsearch import Elasticsearch
+from quart import Quart, request, render_template, Response, jsonify, redirect, url_for, session
+from elasticsearch import AsyncElasticsearch, NotFoundError
 from urllib.parse import unquote
+from functools import lru_cache
+import asyncio
+import gzip
 import html
 import json
 import time
 import os
 import datetime
-
-app = Flask(__name__, static_folder=os.path.abspath('../static'))
+import signal
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pagerank'))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'index'))
+from score_store import ScoreStore
+from snapshot_store import SnapshotStore
+from suggest import SuggestionIndex, normalize
+from result_cache import ResultCache
+from query_log import QueryLog
+from recommend import Recommender, RECOMMEND_SIZE, REFRESH_INTERVAL
+from metrics import Metrics
+from bulk_ingest import doc_id
+
+# 异步服务：请求在事件循环中处理，等待 Elasticsearch 时不占用线程；
+# 生产环境用 hypercorn 多进程运行（见 hypercorn.toml），python query.py 为单进程的开发服务器
+app = Quart(__name__, static_folder=os.path.abspath('../static'))
 app.config['SECRET_KEY'] = 'your_secret_key'
 
-es = Elasticsearch(["http://localhost:9200"], verify_certs=False)
-INDEX_NAME = "my_index"
+# 每个 worker 进程一个异步客户端，到每个节点最多 ES_CONNECTIONS 个长连接（同时在途的请求数），
+# 超时的请求重试 ES_RETRIES 次；ES_URL 环境变量可以指定其它地址（如 bench/bench_serving.py 的 mock）
+ES_URL = os.environ.get("ES_URL", "http://localhost:9200")
+ES_CONNECTIONS = 64
+ES_TIMEOUT = 10
+ES_RETRIES = 2
+es = AsyncElasticsearch([ES_URL], verify_certs=False, connections_per_node=ES_CONNECTIONS,
+                        request_timeout=ES_TIMEOUT, retry_on_timeout=True, max_retries=ES_RETRIES)
+INDEX_NAME = "my_index"  # 别名，由 index/index_lifecycle.py 指向当前版本的索引
 PAGE_SIZE = 15  # 设置每页显示的结果数
 
+# 相关性分数与 PageRank 分数的权重：最终得分 = RELEVANCE_WEIGHT * _score + PAGERANK_WEIGHT * pagerank_score，
+# 在 Elasticsearch 中计算（pagerank_score 由 index/enrich_pagerank.py 写入文档）
+RELEVANCE_WEIGHT = 0.7
+PAGERANK_WEIGHT = 0.3
+
 USERS_FILE = 'users.json'
 if not os.path.exists(USERS_FILE):
     with open(USERS_FILE, 'w') as f:
         json.dump([], f)
 
-PAGERANK_SCORES_FILE = "E:\ir24\ir_lab4\ir4_code\pagerank\pagerank_scores.json"
-pagerank_scores = {}
+# pagerank.py 生成的二进制分数文件（不带扩展名），内存映射读取；
+# 重新计算 PageRank 后服务会在 PAGERANK_CHECK_INTERVAL 秒内自动切换到新分数。python query.py 运行时
+# 可以发送 SIGHUP，下一次查询立即切换；hypercorn 运行时向主进程发送 SIGHUP 会重启所有 worker（同样加载新分数）
+PAGERANK_SCORES_BASE = "E:\ir24\ir_lab4\ir4_code\pagerank\pagerank_scores"
+PAGERANK_CHECK_INTERVAL = 5
+pagerank_store = ScoreStore(PAGERANK_SCORES_BASE, check_interval=PAGERANK_CHECK_INTERVAL)
+
+# suggest.py 离线构建的补全索引（不带扩展名），内存映射读取，重新构建后自动切换（与 PageRank 分数相同，也可以发送 SIGHUP）；
+# 尚未构建时 /autocomplete 退回 Elasticsearch 前缀查询
+SUGGESTIONS_BASE = "suggestions"
+AUTOCOMPLETE_SIZE = 10
+suggestion_index = SuggestionIndex(SUGGESTIONS_BASE, check_interval=PAGERANK_CHECK_INTERVAL)
+
+
+# /search 的结果缓存（多个 worker 进程共享同一个 SQLite 文件），见 result_cache.py；
+# 启动时在后台预热查询日志中最常见的 PREWARM_QUERIES 个查询的第一页
+RESULT_CACHE_FILE = 'result_cache.db'
+PREWARM_QUERIES = 50
+PREWARM_CONCURRENCY = 8        # 预热时同时发出的查询数
+GENERATION_CHECK_INTERVAL = 5  # 检查索引别名和 PageRank 分数是否变化的间隔（秒）
+result_cache = ResultCache(RESULT_CACHE_FILE)
+
+
+# 查询日志（SQLite WAL，后台线程批量写入），见 query_log.py；第一次启动时导入原来的 query_log.json
+QUERY_LOG_FILE = 'query_log.db'
+RECENT_SEARCHES = 10   # 搜索框下显示的最近查询数
+HISTORY_SIZE = 100     # /history 显示的最近查询数
+query_log = QueryLog(QUERY_LOG_FILE)
+query_log.import_json('query_log.json')
+
+
+# 请求延迟统计（metrics.py），/metrics 以 Prometheus 文本格式导出；每个 worker 每隔 METRICS_FLUSH_INTERVAL 秒
+# 把自己的统计写到 METRICS_DIR，/metrics 合并所有 worker 的统计（重新部署时清空该目录）。
+# 超过 SLOW_REQUEST_SECONDS 的请求打印各阶段耗时；PROFILE_SAMPLE_RATE > 0 时按比例剖析请求，
+# 慢请求的 cProfile 结果保存到 PROFILE_DIR（用 python -m pstats 查看）
+METRICS_DIR = 'metrics'
+METRICS_FLUSH_INTERVAL = 5
+SLOW_REQUEST_SECONDS = 1.0
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_DIR = 'profiles'
+metrics = Metrics(METRICS_DIR, SLOW_REQUEST_SECONDS, PROFILE_SAMPLE_RATE, PROFILE_DIR)
+span = metrics.span
+
+
+@app.before_request
+async def begin_request_metrics():
+    metrics.begin(request.url_rule.rule if request.url_rule else "unmatched")
+
+
+@app.after_request
+async def end_request_metrics(response):
+    metrics.end(response.status_code)
+    return response
 
-def load_pagerank_scores():
-    global pagerank_scores
-    if os.path.exists(PAGERANK_SCORES_FILE):
-        with open(PAGERANK_SCORES_FILE, "r", encoding="utf-8") as f:
-            pagerank_scores = json.load(f)
-    else:
-        print("pagerank_scores.json 文件未找到")
-        pagerank_scores = {}
+
+@app.teardown_request
+async def end_failed_request_metrics(exc):
+    if exc is not None:
+        metrics.end(500)  # 出错的请求没有经过 after_request
+
+
+@app.route("/metrics")
+async def export_metrics():
+    return Response(metrics.export(), mimetype='text/plain; version=0.0.4')
+
+
+async def flush_metrics():
+    """后台任务：定期把本 worker 的统计写到 METRICS_DIR。"""
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        metrics.flush()
+
+
+def reload_stores(signum, frame):
+    # 只做标记：信号在主线程中处理，此时主线程可能正在 reload() 中持有锁
+    pagerank_store.request_reload()
+    suggestion_index.request_reload()
+
+
+if hasattr(signal, 'SIGHUP'):
+    signal.signal(signal.SIGHUP, reload_stores)
+
+# 网页快照存储（spider.py / index_data.py 写入），快照不在索引中；
+# 最近访问的 SNAPSHOT_CACHE_SIZE 个快照的压缩数据缓存在内存中
+SNAPSHOT_DIR = r"E:\ir24\ir_lab4\ir4_code\JSON\snapshots"
+SNAPSHOT_CACHE_SIZE = 256
+snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+
+
+@lru_cache(maxsize=SNAPSHOT_CACHE_SIZE)
+def read_snapshot(pack, offset, length):
+    # 快照按内容寻址，同一位置的数据不会改变，缓存不需要失效
+    return snapshot_store.read(pack, offset, length)
 
 
 def load_users():
@@ -66,91 +180,49 @@ def add_user(user_id, password):
     save_users(users)
     return True
 
-def read_logs(file_path):
-    """尝试读取日志文件，如果文件不存在或不是有效JSON则返回空列表。"""
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as file:
-            content = file.read()
-            if content:
-                try:
-                    return json.loads(content)
-                except json.JSONDecodeError:
-                    return []
-            else:
-                return []
-    return []
-
-def write_logs(logs, file_path):
-    """将日志数据写入文件，确保是有效的JSON格式。"""
-    with open(file_path, 'w') as file:
-        json.dump(logs, file, indent=4)
-
 def save_search_history(entry):
-    """保存查询历史记录。"""
-    log_file_path = 'query_log.json'
-    logs = read_logs(log_file_path)
-
-    # 移除已存在的相同查询记录
-    logs = [log for log in logs if log['query'] != entry['query']]
-
+    """保存查询历史记录（放入查询日志的写入队列，不等待写入）。"""
     entry['timestamp'] = datetime.datetime.now().isoformat()
     if 'user_id' in session:
         entry['user_id'] = session['user_id']
-    logs.append(entry)
-
-    # 保持日志文件中记录数量不超过100条
-    if len(logs) > 100:
-        logs = logs[-100:]
+    query_log.append(entry)
 
-    write_logs(logs, log_file_path)
-
-@app.route("/get_recent_searches")
-def get_recent_searches():
-    log_file_path = 'query_log.json'
+@app.route("/click")
+async def click():
+    """
+    记录结果页上的点击（供推荐使用），再跳转到该网页。只接受索引中存在的网页（按 URL 的文档 _id 查找），
+    跳转地址和标题都取自索引，不能借此跳转到任意网站，也不能把任意链接写入推荐。
+    """
+    url = request.args.get("url", "")
+    if not url.startswith(("http://", "https://")):
+        return redirect(url_for('home'))
     try:
-        if not os.path.exists(log_file_path):
-            with open(log_file_path, 'w') as file:
-                json.dump([], file)
-            logs = []
-        else:
-            with open(log_file_path, 'r') as file:
-                logs = json.load(file)
-    except json.JSONDecodeError:
-        logs = []
-
+        with span("es"):
+            doc = await es.get(index=INDEX_NAME, id=doc_id(url), source_includes=["title", "url"])
+    except NotFoundError:
+        return redirect(url_for('home'))
+    source = doc["_source"]
+    entry = {"query": request.args.get("q", ""), "url": source.get("url", url), "title": source.get("title", ""),
+             "timestamp": datetime.datetime.now().isoformat()}
     if 'user_id' in session:
-        logs = [l for l in logs if l.get('user_id') == session['user_id']]
+        entry['user_id'] = session['user_id']
+    query_log.append_click(entry)
+    return redirect(entry["url"])
 
-    recent_searches = logs[-10:] if len(logs) > 10 else logs
-    recent_searches.reverse()
-    return jsonify(recent_searches)
+@app.route("/get_recent_searches")
+async def get_recent_searches():
+    return jsonify(await asyncio.to_thread(query_log.recent, session.get('user_id'), RECENT_SEARCHES))
 
 @app.route("/history")
-def history():
+async def history():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    log_file_path = 'query_log.json'
-    if not os.path.exists(log_file_path):
-        with open(log_file_path, 'w') as file:
-            json.dump([], file)
-
-    with open(log_file_path, 'r') as file:
-        try:
-            logs = json.load(file)
-        except json.JSONDecodeError:
-            logs = []
-
-    user_logs = [log for log in logs if log.get('user_id') == session['user_id']]
-
-    return render_template('history.html', history=user_logs)
-
-@app.route("/autocomplete", methods=["GET"])
-def autocomplete():
-    query_term = request.args.get("q", "").strip()
-    if not query_term:
-        return jsonify([])
+    user_logs = await asyncio.to_thread(query_log.recent, session['user_id'], HISTORY_SIZE)
+    user_logs.reverse()  # 按时间顺序显示
+    return await render_template('history.html', history=user_logs)
 
+async def es_autocomplete(query_term, size=AUTOCOMPLETE_SIZE):
     # Elasticsearch 查询，匹配标题或内容前缀
     query_body = {
         "query": {
@@ -158,217 +230,352 @@ def autocomplete():
                 "title": query_term  # 根据标题前缀匹配
             }
         },
-        "size": 10,  # 返回前 10 条结果
+        "size": size,  # 返回前 10 条结果
         "_source": ["title"]
     }
 
-    response = es.search(index=INDEX_NAME, body=query_body)
+    response = await es.search(index=INDEX_NAME, body=query_body)
     hits = response.get("hits", {}).get("hits", [])
 
     # 提取标题字段，确保返回的是字符串列表
-    suggestions = [hit["_source"].get("title", "") for hit in hits if "title" in hit["_source"]]
-    return jsonify(suggestions)
+    return [hit["_source"].get("title", "") for hit in hits if "title" in hit["_source"]]
+
+
+@app.route("/autocomplete", methods=["GET"])
+async def autocomplete():
+    query_term = request.args.get("q", "").strip()
+    if not query_term:
+        return jsonify([])
+    # 按整个标题 / 查询的前缀匹配，按权重取前 AUTOCOMPLETE_SIZE 个，不查询 Elasticsearch
+    if len(suggestion_index):
+        with span("suggest"):
+            completions = suggestion_index.complete(query_term, AUTOCOMPLETE_SIZE)
+        return jsonify(completions)
+    with span("es"):
+        completions = await es_autocomplete(query_term)
+    return jsonify(completions)
 
 
 @app.route("/snapshot")
-def snapshot():
+async def snapshot():
     url = request.args.get('url')
     if not url:
         return "URL parameter is missing", 404
 
     decoded_url = unquote(url)
+    with span("locate"):
+        location = snapshot_store.locate(decoded_url)
+    if location is None:
+        return "No snapshot available for this URL", 404
+
+    # ETag 为快照内容的哈希，浏览器已有相同内容时返回 304
+    etag = location[0]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif 'gzip' in request.accept_encodings:
+        # 直接返回存储中的 gzip 数据，不需要解压再压缩
+        with span("read"):
+            data = read_snapshot(*location[1:])
+        response = Response(data, mimetype='text/html; charset=utf-8')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        with span("read"):
+            data = read_snapshot(*location[1:])
+        with span("decompress"):
+            data = gzip.decompress(data)
+        response = Response(data, mimetype='text/html; charset=utf-8')
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def with_pagerank(query):
+    """用 function_score 把 pagerank_score 加到相关性分数上，排序与按 RELEVANCE_WEIGHT / PAGERANK_WEIGHT 加权求和一致。"""
+    return {
+        "function_score": {
+            "query": query,
+            "field_value_factor": {  # 使用字段的数值加权
+                "field": "pagerank_score",  # 使用 PageRank 分数字段
+                "factor": PAGERANK_WEIGHT / RELEVANCE_WEIGHT,  # 两边同除以 RELEVANCE_WEIGHT，不改变排序
+                "modifier": "none",
+                "missing": 0  # 尚未写入分数的文档只按相关性排序
+            },
+            "boost_mode": "sum"  # 综合搜索得分和 PageRank 分数
+        }
+    }
+
+# 每页只取 PAGE_SIZE 条结果，_source 只取显示需要的字段，正文摘要由高亮返回（不传输整个 content）；
+# 同分时按 url 排序，保证分页稳定，下一页用 search_after 从上一页最后一条结果继续
+RESULT_FIELDS = ["title", "url", "pagerank_score"]
+SNIPPET_SIZE = 200
+RESULT_SORT = [{"_score": "desc"}, {"url": "asc"}]
+DOCUMENT_TYPES = ["pdf", "docx", "xlsx", "doc"]  # 文档查询：带有这些类型附件的网页（attachment_types 字段）
+
+
+async def run_search(es, index_name, query, results_size=PAGE_SIZE, start=0, after=None):
     query_body = {
-        "query": {
-            "term": {
-                "url": decoded_url
-            }
-        },
-        "_source": ["raw_html"]
+        "query": with_pagerank(query),
+        "size": results_size,
+        "_source": RESULT_FIELDS,
+        "sort": RESULT_SORT,
+        "track_scores": True,
+        "highlight": {
+            "fields": {"content": {"fragment_size": SNIPPET_SIZE, "number_of_fragments": 1,
+                                   "no_match_size": SNIPPET_SIZE}},
+            "pre_tags": [""],
+            "post_tags": [""]
+        }
     }
-    response = es.search(index=INDEX_NAME, body=query_body)
-    hits_data = response.get("hits", {})
-    hits = hits_data.get("hits", [])
-    if hits:
-        raw_html = hits[0]['_source'].get('raw_html', 'No content available')
-        return Response(raw_html, mimetype='text/html; charset=utf-8')
+    if after:
+        query_body["search_after"] = after
     else:
-        return "No snapshot available for this URL", 404
+        query_body["from"] = start
+    return await es.search(index=index_name, body=query_body)
 
-def standard_search(es, query_term, index_name, results_size=1000):
-    query_body = {
-        "query": {
-            "function_score": {  # 使用 function_score 将 pagerank_score 加权
-                "query": {
-                    "multi_match": {
-                        "query": query_term,
-                        "fields": ["title", "content", "anchor_texts"]
-                    }
-                },
-                "field_value_factor": {  # 使用字段的数值加权
-                    "field": "pagerank_score",  # 使用 PageRank 分数字段
-                    "factor": 1.0,  # 加权因子，调整影响程度
-                    "modifier": "log1p",  # 对分数取对数 +1，使分数分布更均匀
-                    "missing": 1  # 如果字段不存在，默认值为1
-                },
-                "boost_mode": "sum"  # 综合搜索得分和 PageRank 分数
-            }
-        },
-        "size": results_size
+
+async def standard_search(es, query_term, index_name, results_size=PAGE_SIZE, start=0, after=None):
+    query = {
+        "multi_match": {
+            "query": query_term,
+            "fields": ["title", "content", "anchor_texts"]
+        }
     }
-    return es.search(index=index_name, body=query_body)
+    return await run_search(es, index_name, query, results_size, start, after)
 
 
-def phrase_search(es, query_term, index_name, results_size=1000):
-    query_body = {
-        "query": {
-            "match_phrase": {
-                "content": {
+async def phrase_search(es, query_term, index_name, results_size=PAGE_SIZE, start=0, after=None):
+    query = {
+        "match_phrase": {
+            "content": {
+                "query": query_term,
+                "slop": 0
+            }
+        }
+    }
+    return await run_search(es, index_name, query, results_size, start, after)
+
+async def document_search(es, query_term, index_name, results_size=PAGE_SIZE, start=0, after=None):
+    # 按导入时写入的 attachment_types 过滤（filter 不参与评分、可缓存），分页和总数都只包含带附件的网页
+    query = {
+        "bool": {
+            "must": {
+                "multi_match": {
                     "query": query_term,
-                    "slop": 0
+                    "fields": ["title", "content", "anchor_texts"]
                 }
-            }
-        },
-        "size": results_size
+            },
+            "filter": {"terms": {"attachment_types": DOCUMENT_TYPES}}
+        }
     }
-    return es.search(index=index_name, body=query_body)
+    return await run_search(es, index_name, query, results_size, start, after)
 
-def document_search(es, query_term, index_name, results_size=1000):
-    response = standard_search(es, query_term, index_name)
-    hits_data = response.get("hits", {})
-    hits = hits_data.get("hits", [])
-    filtered_hits = []
-    for hit in hits:
-        attachments = hit["_source"].get("attachments", [])
-        if any(att.endswith('.pdf') or att.endswith('.docx') or att.endswith('.xlsx') or att.endswith('.doc') for att in attachments):
-            filtered_hits.append(hit)
-    return {"hits": {"hits": filtered_hits}}
+WILDCARD_FIELDS = {"title.infix": 3, "content.infix": 2, "anchor_texts.infix": 1}  # 设置权重，title最高
 
-DEFAULT_RESULTS_SIZE = 1000
 
-def wildcard_search(es, query_term, index_name, results_size=1000):
+async def wildcard_search(es, query_term, index_name, results_size=PAGE_SIZE, start=0, after=None):
     """
-    使用 query_string 在 text 字段上进行通配符查询。
-    支持 * 匹配多个字符，? 匹配单个字符。
+    在 wildcard 类型的 infix 子字段上进行通配符查询（不区分大小写）。
+    支持 * 匹配多个字符，? 匹配单个字符；不含通配符的词按包含匹配，多个词（空格分隔）都要匹配。
     """
-    query_body = {
-        "query": {
-            "query_string": {
-                "query": f"*{query_term}*",
-                "fields": ["title^3", "content^2", "anchor_texts"],  # 设置权重，title最高
-                "default_operator": "AND"  # 默认操作符
-            }
-        },
-        "size": results_size
-    }
-    response = es.search(index=index_name, body=query_body)
-    return response
+    clauses = []
+    for term in query_term.split():
+        pattern = term if '*' in term or '?' in term else f"*{term}*"
+        clauses.append({"bool": {"should": [
+            {"wildcard": {field: {"value": pattern, "case_insensitive": True, "boost": boost}}}
+            for field, boost in WILDCARD_FIELDS.items()]}})
+    query = {"bool": {"must": clauses}}
+    return await run_search(es, index_name, query, results_size, start, after)
 
 
 @app.route("/", methods=["GET"])
-def home():
-    return render_template("search.html",
-                           message=None,
-                           logged_in=('user_id' in session),
-                           user_id=session.get('user_id'))
+async def home():
+    return await render_template("search.html",
+                                 message=None,
+                                 logged_in=('user_id' in session),
+                                 user_id=session.get('user_id'))
+
+async def check_cache_generation():
+    """索引别名指向的版本或 PageRank 分数变化时，使结果缓存中的旧条目失效。"""
+    try:
+        target = ",".join(sorted(await es.indices.get_alias(name=INDEX_NAME)))
+    except Exception:
+        target = INDEX_NAME  # 尚未使用别名（或 Elasticsearch 暂时不可用）
+    await asyncio.to_thread(result_cache.set_generation, f"{target}|{pagerank_store.version()}")
+
+
+async def watch_cache_generation():
+    """
+    后台任务：每隔 GENERATION_CHECK_INTERVAL 秒检查一次，不占用请求的处理时间；
+    同时写入缓存命中时记录的访问时间，并按上限淘汰条目（不在每次写入缓存时统计整个表）。
+    """
+    while True:
+        await asyncio.sleep(GENERATION_CHECK_INTERVAL)
+        await check_cache_generation()
+        await asyncio.to_thread(result_cache.evict)
+
+
+SEARCH_FUNCS = {
+    "document": document_search,
+    "wildcard": wildcard_search,
+    "phrase": phrase_search,
+}
+
+
+async def cached_search(query_term, query_type, page, after):
+    """
+    查询一页结果，返回 {"total": 结果总数, "hits": [...]}；相同的查询和页码直接从结果缓存返回。
+    结果缓存读写 SQLite（可能等待其它 worker 的写锁），在线程池中执行，不阻塞事件循环。
+    """
+    key = json.dumps([normalize(query_term), query_type, page, after], ensure_ascii=False)
+    with span("cache"):
+        cached = await asyncio.to_thread(result_cache.get, key)
+    if cached is not None:
+        return cached
+    search_func = SEARCH_FUNCS.get(query_type, standard_search)
+    with span("es"):
+        response = await search_func(es, query_term, INDEX_NAME, PAGE_SIZE, (page - 1) * PAGE_SIZE, after)
+    hits_data = response.get("hits", {})
+    result = {
+        "total": hits_data.get("total", {}).get("value", 0),
+        "hits": [{field: hit[field] for field in ("_score", "_source", "sort", "highlight") if field in hit}
+                 for hit in hits_data.get("hits", [])],
+    }
+    with span("cache_put"):
+        await asyncio.to_thread(result_cache.put, key, result)
+    return result
+
+
+async def prewarm_cache():
+    """按出现次数（其次按时间）取查询日志中最常见的查询，预先缓存它们的第一页（同时发出 PREWARM_CONCURRENCY 个查询）。"""
+    popular = await asyncio.to_thread(query_log.popular, PREWARM_QUERIES)
+    limit = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+    async def warm(query_term, query_type):
+        async with limit:
+            try:
+                await cached_search(query_term, query_type, 1, None)
+                return True
+            except Exception as e:
+                print(f"Prewarming '{query_term}' failed: {e}")
+                return False
+
+    warmed = await asyncio.gather(*(warm(query_term, query_type) for query_term, query_type in popular))
+    print(f"Prewarmed result cache with {sum(warmed)} queries")
+
+
+@app.route("/cache_stats")
+async def cache_stats():
+    """结果缓存的命中率（本进程）和占用（整个缓存），用于调整 result_cache.py 中的上限。"""
+    return jsonify(await asyncio.to_thread(result_cache.stats))
 
-# 调用一次加载 PageRank 分数
-load_pagerank_scores()
 
 def get_pagerank_score(url):
-    """根据 URL 从本地文件中获取 PageRank 分数"""
-    return pagerank_scores.get(url, 0.0)
+    """根据 URL 从分数文件中获取 PageRank 分数"""
+    return pagerank_store.get(url)
+
+def parse_after(value):
+    """分页链接中上一页最后一条结果的排序值（search_after）。"""
+    try:
+        after = json.loads(value) if value else None
+    except ValueError:
+        return None
+    return after if isinstance(after, list) else None
+
 
 @app.route("/search", methods=["GET", "POST"])
-def search():
-    query_term = request.form.get("q", "").strip()
-    query_type = request.form.get("type", "standard")
-    page = int(request.args.get("page", 1))
+async def search():
+    # 搜索框以 POST 提交，分页链接以 GET 传递相同的参数
+    values = await request.values
+    query_term = values.get("q", "").strip()
+    query_type = values.get("type", "standard")
+    if query_type not in SEARCH_FUNCS:
+        query_type = "standard"  # 未知类型按标准查询处理，统计标签和缓存键只有这几种取值
+    page = max(1, values.get("page", 1, type=int))
+    after = parse_after(values.get("after"))
+    metrics.label("type", query_type)
 
     log_entry = {
         "query": query_term,
         "type": query_type,
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
     }
-    save_search_history(log_entry)
+    if page == 1 and query_term:  # 翻页不重复记录
+        with span("log"):
+            save_search_history(log_entry)
 
     if not query_term:
-        return render_template("search.html",
-                               message="请输入查询词",
-                               logged_in=('user_id' in session),
-                               user_id=session.get('user_id'))
-
-    start = (page - 1) * PAGE_SIZE
-    if query_type == "document":
-        response = document_search(es, query_term, INDEX_NAME)
-    elif query_type == "wildcard":
-        response = wildcard_search(es, query_term, INDEX_NAME)
-    elif query_type == "phrase":
-        response = phrase_search(es, query_term, INDEX_NAME, DEFAULT_RESULTS_SIZE)
-    else:
-        response = standard_search(es, query_term, INDEX_NAME)
-
-    hits_data = response.get("hits", {})
-    total_data = hits_data.get("total", {})
-    total_results = total_data.get("value", 0)
-    hits = hits_data.get("hits", [])
-
-    # 定义权重参数
-    alpha = 0.7  # Elasticsearch 相关性分数权重
-    beta = 0.3   # PageRank 分数权重
-
+        return await render_template("search.html",
+                                     message="请输入查询词",
+                                     logged_in=('user_id' in session),
+                                     user_id=session.get('user_id'))
+
+    response = await cached_search(query_term, query_type, page, after)
+    total_results = response["total"]
+    hits = response["hits"]
+
+    # 结果已由 Elasticsearch 按相关性和 PageRank 的加权分数排好序；
+    # 文档中还没有 pagerank_score 时（尚未运行 enrich_pagerank.py）从分数文件中查出用于显示
+    with span("pagerank"):
+        pageranks = pagerank_store.get_many([hit["_source"].get("url", "") for hit in hits])
     results = [{"title": hit["_source"].get("title", ""),
                 "url": hit["_source"].get("url", ""),
                 "score": hit["_score"],
-                "pagerank": get_pagerank_score(hit["_source"].get("url", "")),
-                "final_score": alpha * hit["_score"] + beta * get_pagerank_score(hit["_source"].get("url", "")),
-                "snippet": hit["_source"].get("content", "")[:200] + "..."} for hit in hits]
-    # 根据最终分数排序
-    results.sort(key=lambda x: x["final_score"], reverse=True)
-
-    return render_template("results.html",
-                           query=query_term,
-                           results=results,
-                           total_results=total_results,
-                           page=page,
-                           page_size=PAGE_SIZE,
-                           logged_in=('user_id' in session),
-                           user_id=session.get('user_id'))
+                "pagerank": hit["_source"].get("pagerank_score", pagerank),
+                "final_score": RELEVANCE_WEIGHT * hit["_score"],  # 即 RELEVANCE_WEIGHT * 相关性 + PAGERANK_WEIGHT * PageRank
+                "snippet": hit.get("highlight", {}).get("content", [""])[0] + "..."}
+               for hit, pagerank in zip(hits, pageranks)]
+    # 结果总数正好是 PAGE_SIZE 的倍数时，最后一页也是满的，还要按总数判断是否有下一页
+    has_next = len(hits) == PAGE_SIZE and page * PAGE_SIZE < total_results
+    next_after = json.dumps(hits[-1]["sort"]) if has_next else None
+
+    with span("render"):
+        return await render_template("results.html",
+                                     query=query_term,
+                                     results=results,
+                                     total_results=total_results,
+                                     query_type=query_type,
+                                     page=page,
+                                     page_size=PAGE_SIZE,
+                                     next_after=next_after,
+                                     logged_in=('user_id' in session),
+                                     user_id=session.get('user_id'))
 
 @app.route("/register", methods=["GET", "POST"])
-def register():
+async def register():
     if request.method == "POST":
-        user_id = request.form.get("user_id", "").strip()
-        password = request.form.get("password", "").strip()
+        form = await request.form
+        user_id = form.get("user_id", "").strip()
+        password = form.get("password", "").strip()
         if not user_id or not password:
-            return render_template("register.html", message="用户ID和密码不能为空")
+            return await render_template("register.html", message="用户ID和密码不能为空")
         if user_exists(user_id):
-            return render_template("register.html", message="用户ID已存在，请更换")
+            return await render_template("register.html", message="用户ID已存在，请更换")
         if add_user(user_id, password):
             return redirect(url_for('login'))
         else:
-            return render_template("register.html", message="用户创建失败，请重试")
-    return render_template("register.html")
+            return await render_template("register.html", message="用户创建失败，请重试")
+    return await render_template("register.html")
 
 @app.route("/login", methods=["GET", "POST"])
-def login():
+async def login():
     if request.method == "POST":
-        user_id = request.form.get("user_id", "").strip()
-        password = request.form.get("password", "").strip()
+        form = await request.form
+        user_id = form.get("user_id", "").strip()
+        password = form.get("password", "").strip()
         if verify_user(user_id, password):
             session['user_id'] = user_id
             return redirect(url_for('home'))
         else:
-            return render_template("login.html", message="用户名或密码错误")
-    return render_template("login.html")
+            return await render_template("login.html", message="用户名或密码错误")
+    return await render_template("login.html")
 
 @app.route("/logout")
-def logout():
+async def logout():
     session.pop('user_id', None)
     return redirect(url_for('home'))
 
 # 新增个性化推荐页面（用户主页）
 @app.route("/user_home")
-def user_home():
+async def user_home():
     # 未登录则跳转登录
     if 'user_id' not in session:
         return redirect(url_for('login'))
@@ -384,30 +591,52 @@ def user_home():
         {"title": "南开大学研究生院", "url": "https://graduate.nankai.edu.cn"}
     ]
 
-    # 2. 基于历史记录的五条推荐
-    # 从用户历史查询中取最后一次查询，或最后几个查询，然后重新搜索获取结果。
-    log_file_path = 'query_log.json'
-    logs = read_logs(log_file_path)
-    user_logs = [log for log in logs if log.get('user_id') == user_id]
-    user_logs.sort(key=lambda x: x.get('timestamp', ''), reverse=True)  # 按时间降序
-    history_recommendations = []
-    if user_logs:
-        # 取用户最近的一条查询记录
-        last_query = user_logs[0]["query"]
-        # 用last_query再搜索，取前五条作为推荐
-        resp = standard_search(es, last_query, INDEX_NAME, results_size=5)
-        rec_hits = resp.get("hits", {}).get("hits", [])
-        for rhit in rec_hits:
-            rsource = rhit["_source"]
-            history_recommendations.append({
-                "title": rsource.get("title", ""),
-                "url": rsource.get("url", "")
-            })
-
-    return render_template("user_home.html",
-                           user_id=user_id,
-                           today_recommendations=today_recommendations,
-                           history_recommendations=history_recommendations)
+    # 2. 基于历史记录的五条推荐：由后台任务根据用户最近的查询、所有用户的查询共现和点击预先计算（见 recommend.py）
+    with span("recommendations"):
+        history_recommendations = await asyncio.to_thread(recommender.get, user_id)
+
+    with span("render"):
+        return await render_template("user_home.html",
+                                     user_id=user_id,
+                                     today_recommendations=today_recommendations,
+                                     history_recommendations=history_recommendations)
+
+
+def recommend_search(query_term):
+    """推荐不足时的补足：最近一次查询的前几条搜索结果（在推荐线程中调用，查询交给服务的事件循环执行）。"""
+    future = asyncio.run_coroutine_threadsafe(
+        standard_search(es, query_term, INDEX_NAME, results_size=RECOMMEND_SIZE), event_loop)
+    resp = future.result(timeout=ES_TIMEOUT * (ES_RETRIES + 1))
+    return [{"title": hit["_source"].get("title", ""), "url": hit["_source"].get("url", "")}
+            for hit in resp.get("hits", {}).get("hits", [])]
+
+
+# /user_home 的推荐（recommend.py），每隔 REFRESH_INTERVAL 秒在后台根据新增的查询日志更新
+RECOMMENDATIONS_FILE = 'recommendations.db'
+recommender = Recommender(RECOMMENDATIONS_FILE, query_log, search=recommend_search)
+event_loop = None
+background_tasks = []
+
+
+@app.before_serving
+async def start_background_tasks():
+    # 在 worker 的事件循环启动后运行：预热结果缓存、定期检查缓存版本、写出延迟统计、推荐线程
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+    # 先确定缓存版本，再开始预热和处理请求，否则写入的条目没有版本，之后永远不会命中
+    await check_cache_generation()
+    background_tasks.extend([asyncio.create_task(prewarm_cache()),
+                             asyncio.create_task(watch_cache_generation()),
+                             asyncio.create_task(flush_metrics())])
+    threading.Thread(target=recommender.run, args=(REFRESH_INTERVAL,), daemon=True).start()
+
+
+@app.after_serving
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    metrics.flush()
+    await es.close()
 
 
 if __name__ == "__main__":
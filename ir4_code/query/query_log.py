@@ -0,0 +1,199 @@
+# query_log.py
+# 查询日志，代替每次查询都整个读写一遍的 query_log.json：
+# - 只追加的 SQLite 表（WAL 模式，多个 worker 进程可同时写入和读取），保留全部历史，不再截断为 100 条
+# - append() 只把记录放入队列，由后台写入线程每隔 FLUSH_INTERVAL 秒（或攒够 BATCH_SIZE 条）在一个事务中批量写入，
+#   不占用请求的处理时间
+# - (user_id, id) 和 (norm, id) 上的索引：最近查询、某个用户的历史按 id 倒序读取，只扫描需要的最近几条；
+#   norm 为 suggest.normalize 规范化后的查询，用于统计同一查询出现的次数
+# 最近查询 / 历史中同一查询只显示最近的一次（与原来写入时删除旧记录的效果相同），表中保留每一次查询。
+# 结果页上的点击（/click）记录在 clicks 表中，与查询一起批量写入，供 recommend.py 计算推荐。
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+
+from suggest import normalize
+
+BATCH_SIZE = 500        # 一个事务最多写入的记录数
+FLUSH_INTERVAL = 1.0    # 队列中的记录最多等待多久写入（秒）
+
+QUERY_INSERT = "INSERT INTO queries (user_id, query, norm, type, timestamp) VALUES (?, ?, ?, ?, ?)"
+CLICK_INSERT = "INSERT INTO clicks (user_id, query, norm, url, title, timestamp) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+class QueryLog:
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS queries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT,"
+                " query TEXT,"
+                " norm TEXT,"
+                " type TEXT,"
+                " timestamp TEXT)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS clicks ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user_id TEXT,"
+                " query TEXT,"
+                " norm TEXT,"
+                " url TEXT,"
+                " title TEXT,"
+                " timestamp TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS queries_user ON queries (user_id, id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS queries_norm ON queries (norm, id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS clicks_user ON clicks (user_id, id)")
+            self.conn.commit()
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def append(self, entry):
+        """记录一次查询（entry 含 query、type、timestamp，登录时含 user_id），立即返回。"""
+        query = entry.get("query", "")
+        self.pending.put((QUERY_INSERT, (entry.get("user_id"), query, normalize(query),
+                                         entry.get("type", "standard"), entry.get("timestamp", ""))))
+
+    def append_click(self, entry):
+        """记录一次结果点击（entry 含 query、url、title、timestamp，登录时含 user_id），立即返回。"""
+        query = entry.get("query", "")
+        self.pending.put((CLICK_INSERT, (entry.get("user_id"), query, normalize(query), entry.get("url", ""),
+                                         entry.get("title", ""), entry.get("timestamp", ""))))
+
+    def _write_loop(self):
+        while True:
+            rows = [self.pending.get()]
+            stop = rows[0] is None
+            try:
+                while not stop and len(rows) < self.batch_size:
+                    row = self.pending.get(timeout=self.flush_interval)
+                    stop = row is None
+                    rows.append(row)
+            except queue.Empty:
+                pass
+            rows = [row for row in rows if row is not None]
+            if rows:
+                try:
+                    self._insert(rows)
+                except sqlite3.Error as e:
+                    print(f"写入查询日志失败（{len(rows)} 条）: {e}")
+            for _ in range(len(rows) + stop):
+                self.pending.task_done()
+            if stop:
+                return
+
+    def _insert(self, rows):
+        """rows 为 (INSERT 语句, 参数) 列表，在一个事务中写入。"""
+        with self.lock:
+            for sql in dict.fromkeys(sql for sql, _ in rows):
+                self.conn.executemany(sql, [args for s, args in rows if s == sql])
+            self.conn.commit()
+
+    def flush(self):
+        """等待队列中的记录全部写入。"""
+        self.pending.join()
+
+    def close(self):
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+
+    def recent(self, user_id=None, limit=10):
+        """最近的 limit 个不同查询（新的在前）；user_id 为 None 时为所有用户的查询。"""
+        if user_id is None:
+            sql, args = "SELECT query, type, timestamp, user_id FROM queries ORDER BY id DESC", ()
+        else:
+            sql, args = ("SELECT query, type, timestamp, user_id FROM queries WHERE user_id = ? "
+                         "ORDER BY id DESC", (user_id,))
+        result, seen = [], set()
+        with self.lock:
+            # 游标按索引倒序逐行读取，取够 limit 个不同查询即停止
+            for query, query_type, timestamp, uid in self.conn.execute(sql, args):
+                if query in seen:
+                    continue
+                seen.add(query)
+                entry = {"query": query, "type": query_type, "timestamp": timestamp}
+                if uid is not None:
+                    entry["user_id"] = uid
+                result.append(entry)
+                if len(result) == limit:
+                    break
+        return result
+
+    def popular(self, limit):
+        """出现次数最多的 limit 个 (查询, 类型)，次数相同时最近的在前。"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT q.query, q.type FROM"
+                " (SELECT MAX(id) AS last, COUNT(*) AS n FROM queries WHERE norm != '' GROUP BY norm, type) g"
+                " JOIN queries q ON q.id = g.last ORDER BY g.n DESC, g.last DESC LIMIT ?", (limit,)).fetchall()
+        return rows
+
+    def queries(self):
+        """全部查询（含重复，按时间顺序），用于构建搜索建议。"""
+        with self.lock:
+            rows = self.conn.execute("SELECT query FROM queries ORDER BY id").fetchall()
+        return [row[0] for row in rows]
+
+    def queries_since(self, last_id, limit=BATCH_SIZE):
+        """id 大于 last_id 的查询记录 [(id, user_id, norm, timestamp)]（按 id 顺序，最多 limit 条）。"""
+        with self.lock:
+            return self.conn.execute("SELECT id, user_id, norm, timestamp FROM queries WHERE id > ? "
+                                     "ORDER BY id LIMIT ?", (last_id, limit)).fetchall()
+
+    def clicks_since(self, last_id, limit=BATCH_SIZE):
+        """id 大于 last_id 的点击记录 [(id, user_id, norm, url, title)]（按 id 顺序，最多 limit 条）。"""
+        with self.lock:
+            return self.conn.execute("SELECT id, user_id, norm, url, title FROM clicks WHERE id > ? "
+                                     "ORDER BY id LIMIT ?", (last_id, limit)).fetchall()
+
+    def clicked_urls(self, user_id, limit=100):
+        """用户最近点击过的 URL。"""
+        with self.lock:
+            rows = self.conn.execute("SELECT url FROM clicks WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                                     (user_id, limit)).fetchall()
+        return {row[0] for row in rows}
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+
+    def import_json(self, json_path):
+        """
+        把原来的 query_log.json（按写入顺序）导入空的日志表（只在第一次启动时执行），返回导入的条数。
+        多个 worker 进程同时启动时，检查表是否为空和写入在同一个 BEGIN IMMEDIATE 事务中，只有一个进程会导入。
+        """
+        if not os.path.exists(json_path):
+            return 0
+        with open(json_path, 'r', encoding='utf-8') as f:
+            try:
+                logs = json.load(f)
+            except json.JSONDecodeError:
+                return 0
+        rows = [(log.get("user_id"), log.get("query", ""), normalize(log.get("query", "")),
+                 log.get("type", "standard"), log.get("timestamp", "")) for log in logs]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]:
+                    rows = []
+                else:
+                    self.conn.executemany(QUERY_INSERT, rows)
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+        return len(rows)
@@ -0,0 +1,191 @@
+# recommend.py
+# /user_home 的个性化推荐，由后台任务预先计算，页面只需按 user_id 查一次表。
+# 从查询日志（query_log.py）中统计：
+# - 点击：每个规范化查询下各 URL 被点击的次数（所有登录用户，未登录的点击不计入）
+# - 查询共现：同一用户在 SESSION_GAP 秒内先后提交的两个不同查询（双向计数）
+# 用户 u 的推荐：对其最近 RECENT_QUERIES 个不同查询 q（越近权重越大，每往前一个乘以 DECAY），
+#   score(url) += w(q) * P(url | q) + CO_WEIGHT * w(q) * Σ_q' P(q' | q) * P(url | q')
+# P(url | q) 为 q 下点击 url 的比例，P(q' | q) 为与 q 共现的查询中 q' 的比例；去掉用户最近点击过的 URL，
+# 不足 RECOMMEND_SIZE 条时用最近一次查询的搜索结果补足（搜索也在后台完成）。
+# 统计量和推荐结果保存在 recommendations.db（SQLite WAL）：refresh() 只读取上次处理之后新增的日志记录，
+# 更新计数并把有新记录的用户标记为待更新，再只为这些用户重新计算推荐。
+# 多个 worker 进程同时运行 refresh() 时，计数在一个写事务中完成，不会重复计数。
+# get() 使用单独的只读连接（WAL 模式下读不等待写），不与后台任务的写事务争用同一个锁。
+import datetime
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+
+from suggest import normalize
+
+RECOMMEND_SIZE = 5        # 每个用户保存的推荐数
+RECENT_QUERIES = 5        # 使用用户最近的几个查询
+DECAY = 0.7               # 查询每往前一个，权重乘以该值
+CO_WEIGHT = 0.5           # 共现查询的点击相对于查询本身的点击的权重
+CO_QUERIES = 10           # 每个查询最多使用的共现查询数
+CLICK_URLS = 20           # 每个查询最多使用的点击 URL 数
+SESSION_GAP = 30 * 60     # 相邻两次查询间隔不超过该值（秒）才算共现
+REFRESH_INTERVAL = 30     # 后台任务的刷新间隔（秒）
+
+
+def _parse_time(timestamp):
+    try:
+        return datetime.datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+
+
+class Recommender:
+    """
+    refresh() 处理新增的查询日志并更新待更新用户的推荐，get(user_id) 返回 [{"title", "url"}]。
+    search(query) 为可选的补足函数，返回 [{"title", "url"}]。
+    """
+
+    def __init__(self, path, query_log, search=None):
+        self.query_log = query_log
+        self.search = search
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            for sql in (
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)",
+                "CREATE TABLE IF NOT EXISTS cooc (a TEXT, b TEXT, n INTEGER, PRIMARY KEY (a, b))",
+                "CREATE TABLE IF NOT EXISTS clicks (norm TEXT, url TEXT, n INTEGER, PRIMARY KEY (norm, url))",
+                "CREATE TABLE IF NOT EXISTS titles (url TEXT PRIMARY KEY, title TEXT)",
+                "CREATE TABLE IF NOT EXISTS last_query (user_id TEXT PRIMARY KEY, norm TEXT, timestamp TEXT)",
+                "CREATE TABLE IF NOT EXISTS dirty (user_id TEXT PRIMARY KEY)",
+                "CREATE TABLE IF NOT EXISTS recs (user_id TEXT PRIMARY KEY, data TEXT, updated REAL)",
+            ):
+                self.conn.execute(sql)
+        self.reader = sqlite3.connect(pathlib.Path(path).absolute().as_uri() + '?mode=ro', uri=True,
+                                      check_same_thread=False)
+        self.read_lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.read_lock:
+            row = self.reader.execute("SELECT data FROM recs WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def refresh(self):
+        """处理新增的日志记录并更新待更新用户的推荐，返回更新的用户数。"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")  # 同一时间只有一个进程更新计数
+            try:
+                self._count()
+                users = [row[0] for row in self.conn.execute("SELECT user_id FROM dirty").fetchall()]
+                self.conn.execute("DELETE FROM dirty")
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        for i, user_id in enumerate(users):
+            try:
+                self.update_user(user_id)
+            except BaseException:
+                # 没有更新的用户留到下次
+                with self.lock:
+                    self.conn.executemany("INSERT OR IGNORE INTO dirty VALUES (?)", [(u,) for u in users[i:]])
+                raise
+        return len(users)
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _count(self):
+        execute = self.conn.execute
+        last_id = self._meta('query_id')
+        while True:
+            rows = self.query_log.queries_since(last_id)
+            if not rows:
+                break
+            for _, user_id, norm, timestamp in rows:
+                if user_id is None or not norm:
+                    continue
+                prev = execute("SELECT norm, timestamp FROM last_query WHERE user_id = ?", (user_id,)).fetchone()
+                if prev and prev[0] != norm:
+                    start, end = _parse_time(prev[1]), _parse_time(timestamp)
+                    if start and end and abs((end - start).total_seconds()) <= SESSION_GAP:
+                        for a, b in ((prev[0], norm), (norm, prev[0])):
+                            execute("INSERT INTO cooc VALUES (?, ?, 1) ON CONFLICT (a, b) DO UPDATE SET n = n + 1",
+                                    (a, b))
+                execute("INSERT OR REPLACE INTO last_query VALUES (?, ?, ?)", (user_id, norm, timestamp))
+                execute("INSERT OR IGNORE INTO dirty VALUES (?)", (user_id,))
+            last_id = rows[-1][0]
+        execute("INSERT OR REPLACE INTO meta VALUES ('query_id', ?)", (last_id,))
+
+        last_id = self._meta('click_id')
+        while True:
+            rows = self.query_log.clicks_since(last_id)
+            if not rows:
+                break
+            for _, user_id, norm, url, title in rows:
+                if user_id is None or not norm or not url:
+                    continue
+                execute("INSERT INTO clicks VALUES (?, ?, 1) ON CONFLICT (norm, url) DO UPDATE SET n = n + 1",
+                        (norm, url))
+                if title:
+                    execute("INSERT OR REPLACE INTO titles VALUES (?, ?)", (url, title))
+                execute("INSERT OR IGNORE INTO dirty VALUES (?)", (user_id,))
+            last_id = rows[-1][0]
+        execute("INSERT OR REPLACE INTO meta VALUES ('click_id', ?)", (last_id,))
+
+    def _click_share(self, norm):
+        """P(url | norm)：{url: 比例}。"""
+        rows = self.conn.execute("SELECT url, n FROM clicks WHERE norm = ? ORDER BY n DESC LIMIT ?",
+                                 (norm, CLICK_URLS)).fetchall()
+        total = self.conn.execute("SELECT SUM(n) FROM clicks WHERE norm = ?", (norm,)).fetchone()[0]
+        return {url: n / total for url, n in rows}
+
+    def recommend(self, user_id):
+        """计算用户的推荐（不保存）。"""
+        recent = self.query_log.recent(user_id, RECENT_QUERIES)
+        clicked = self.query_log.clicked_urls(user_id)
+        scores = {}
+        with self.lock:
+            for i, entry in enumerate(recent):
+                norm, weight = normalize(entry["query"]), DECAY ** i
+                for url, share in self._click_share(norm).items():
+                    scores[url] = scores.get(url, 0.0) + weight * share
+                rows = self.conn.execute("SELECT b, n FROM cooc WHERE a = ? ORDER BY n DESC LIMIT ?",
+                                         (norm, CO_QUERIES)).fetchall()
+                total = self.conn.execute("SELECT SUM(n) FROM cooc WHERE a = ?", (norm,)).fetchone()[0]
+                for other, n in rows:
+                    for url, share in self._click_share(other).items():
+                        scores[url] = scores.get(url, 0.0) + CO_WEIGHT * weight * n / total * share
+            ranked = sorted((url for url in scores if url not in clicked), key=scores.get, reverse=True)
+            result = []
+            for url in ranked[:RECOMMEND_SIZE]:
+                row = self.conn.execute("SELECT title FROM titles WHERE url = ?", (url,)).fetchone()
+                result.append({"title": row[0] if row else url, "url": url})
+
+        if len(result) < RECOMMEND_SIZE and recent and self.search is not None:
+            urls = {rec["url"] for rec in result}
+            for rec in self.search(recent[0]["query"]):
+                if len(result) == RECOMMEND_SIZE:
+                    break
+                if rec["url"] not in urls:
+                    urls.add(rec["url"])
+                    result.append(rec)
+        return result
+
+    def update_user(self, user_id):
+        result = self.recommend(user_id)
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO recs VALUES (?, ?, ?)",
+                              (user_id, json.dumps(result, ensure_ascii=False), time.time()))
+
+    def run(self, interval=REFRESH_INTERVAL):
+        """后台任务：每隔 interval 秒刷新一次。"""
+        while True:
+            try:
+                updated = self.refresh()
+                if updated:
+                    print(f"Updated recommendations for {updated} users")
+            except Exception as e:
+                print(f"更新推荐失败: {e}")
+            time.sleep(interval)
@@ -0,0 +1,121 @@
+# result_cache.py
+# /search 的结果缓存，保存在 SQLite 文件中（WAL 模式），同一台机器上的多个 worker 进程共享。
+# - 键为规范化的 (查询, 类型, 页码, search_after)，值为这一页结果的 JSON
+# - 条目超过 ttl 秒失效；条目数或总字节数超过上限时按最近访问时间淘汰（LRU）。淘汰需要统计整个表，
+#   不在每次 put() 中进行，由服务的后台任务定期调用 evict()，两次之间缓存可能暂时略超上限
+# - 每个条目记录写入时的“版本”（索引别名指向的版本 + PageRank 分数文件），版本变化后旧条目全部失效
+# - 命中时不写数据库：访问时间先记在内存中，下一次 put() 或定期的 evict() 在一个事务中批量写入
+#   （只用于 LRU 淘汰，写入失败时丢弃即可）
+# - hits / misses 为本进程的统计，entries / bytes 为整个缓存的占用，用于调整上限
+# 所有方法都会访问 SQLite（可能等待其它进程的写锁），异步服务中应在线程池中调用。
+import json
+import sqlite3
+import threading
+import time
+
+TTL = 300                         # 条目有效期（秒）
+MAX_ENTRIES = 10000
+MAX_BYTES = 64 * 1024 * 1024
+EVICT_FRACTION = 0.1              # 超出上限时一次淘汰的比例
+
+
+class ResultCache:
+    def __init__(self, path, ttl=TTL, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = None
+        self.accessed = {}  # 命中但尚未写入的访问时间：键 -> 时间
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " generation TEXT,"
+                " value BLOB,"
+                " size INTEGER,"
+                " created REAL,"
+                " accessed REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            self.conn.commit()
+
+    def set_generation(self, generation):
+        """切换到新版本（别名或 PageRank 分数变化），删除其它版本的条目。"""
+        if generation == self.generation:
+            return
+        self.generation = generation
+        with self.lock:
+            # IS NOT：设置版本之前写入的条目（generation 为 NULL）也要删除
+            self.conn.execute("DELETE FROM results WHERE generation IS NOT ?", (generation,))
+            self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, generation, created FROM results WHERE key = ?",
+                                    (key,)).fetchone()
+            if row is not None and row[1] == self.generation and now - row[2] < self.ttl:
+                self.accessed[key] = now
+                self.hits += 1
+                return json.loads(row[0])
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        now = time.time()
+        with self.lock:
+            self._write_accessed()
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, self.generation, data, len(data), now, now))
+            self.conn.commit()
+
+    def _write_accessed(self):
+        accessed, self.accessed = self.accessed, {}
+        self.conn.executemany("UPDATE results SET accessed = ? WHERE key = ?",
+                              [(t, key) for key, t in accessed.items()])
+
+    def evict(self):
+        """删除过期条目，超出上限时按最近访问时间淘汰；数据库忙时留到下次。"""
+        now = time.time()
+        with self.lock:
+            try:
+                self._write_accessed()
+                self.conn.execute("DELETE FROM results WHERE created < ?", (now - self.ttl,))
+                while True:
+                    count, size = self.conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+                    if count <= self.max_entries and size <= self.max_bytes:
+                        break
+                    self.conn.execute("DELETE FROM results WHERE key IN "
+                                      "(SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                                      (max(1, int(count * EVICT_FRACTION)),))
+                self.conn.commit()
+            except sqlite3.OperationalError:
+                self.conn.rollback()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM results")
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,283 @@
+# suggest.py
+# /autocomplete 使用的进程内前缀补全索引，不再为每次按键查询 Elasticsearch。
+# 候选项为网页标题和查询日志（query_log.db）中的查询，规范化（NFKC、小写、合并空白）后去重，权重为：
+#   标题：1 + 该标题页面的最大 PageRank（按最大值归一化到 0~1）；查询：每出现一次加 QUERY_WEIGHT
+# 索引文件（离线构建，python suggest.py）：
+#   头部 | 键的前 8 字节 uint64[n] | 权重 float32[n] | 键偏移 uint32[n+1] | 显示文本偏移 uint32[n+1]
+#   | 稀疏表 int32[levels][n] | 键 | 显示文本
+# 键按 UTF-8 字节序排序，前缀对应一个连续区间，先在键的前 8 字节（大端整数）上用 searchsorted 定位，
+# 前缀超过 8 字节时再在该范围内对完整的键二分查找；稀疏表给出任意区间内权重最大的候选项，
+# 取前 k 个时每次取出区间最大值后把区间一分为二，只需 O(k) 次区间查询，与匹配的候选项数无关。
+# 与 score_store.py 相同，每次构建写入新版本文件并原子切换指针文件 suggestions.current，
+# 查询服务以内存映射方式读取，发现指针文件变化（或收到 SIGHUP，由 request_reload() 标记）时切换到新版本。
+import glob
+import heapq
+import mmap
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+
+MAGIC = b'SUGGEST1'
+HEADER = np.dtype([('magic', 'S8'), ('n', '<u8'), ('levels', '<u8'), ('key_bytes', '<u8'), ('text_bytes', '<u8')])
+KEEP_VERSIONS = 2     # 保留最近几个版本的索引文件（旧版本可能仍被正在运行的服务映射）
+QUERY_WEIGHT = 2.0    # 查询日志中每出现一次的权重
+MAX_LENGTH = 64       # 超过该长度（字符）的标题不作为候选项
+
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(text):
+    """补全匹配用的键：NFKC（全角转半角）、小写、合并空白。"""
+    return _SPACES.sub(' ', unicodedata.normalize('NFKC', text).lower()).strip()
+
+
+def _pointer_path(base):
+    return base + '.current'
+
+
+def _head(key):
+    """键的前 8 字节（不足补 0）作为大端整数，与键的字节序一致。"""
+    return int.from_bytes(key[:8].ljust(8, b'\0'), 'big')
+
+
+def _align(f):
+    f.write(b'\0' * (-f.tell() % 8))
+
+
+def collect(titles, queries):
+    """
+    titles 为 (标题, PageRank 分数) 序列，queries 为查询字符串序列；
+    返回按键排序的 [(键, 显示文本, 权重)]，同一个键保留出现最多的显示文本。
+    """
+    titles = [(t.strip(), s or 0.0) for t, s in titles if t and t.strip() and len(t.strip()) <= MAX_LENGTH]
+    top_score = max((s for _, s in titles), default=0.0) or 1.0
+    title_weight, query_weight, forms = {}, {}, {}
+    for text, score in titles:
+        key = normalize(text)
+        title_weight[key] = max(title_weight.get(key, 0.0), 1.0 + score / top_score)
+        forms.setdefault(key, {}).setdefault(text, 0)
+        forms[key][text] += 1
+    for text in queries:
+        key = normalize(text or '')
+        if key:
+            query_weight[key] = query_weight.get(key, 0.0) + QUERY_WEIGHT
+            forms.setdefault(key, {}).setdefault(text.strip(), 0)
+            forms[key][text.strip()] += 1
+    entries = [(key.encode('utf-8'), max(variants, key=variants.get),
+                title_weight.get(key, 0.0) + query_weight.get(key, 0.0)) for key, variants in forms.items()]
+    entries.sort(key=lambda e: e[0])
+    return entries
+
+
+def write_suggestions(entries, base):
+    """把 collect() 的结果写成新版本的索引文件，并把指针文件切换到它。返回新文件的路径。"""
+    n = len(entries)
+    weights = np.array([w for _, _, w in entries], dtype='<f4')
+    keys = [k for k, _, _ in entries]
+    texts = [t.encode('utf-8') for _, t, _ in entries]
+    key_offsets = np.zeros(n + 1, dtype='<u4')
+    key_offsets[1:] = np.cumsum([len(k) for k in keys])
+    text_offsets = np.zeros(n + 1, dtype='<u4')
+    text_offsets[1:] = np.cumsum([len(t) for t in texts])
+
+    # 稀疏表：table[j][i] 为区间 [i, i + 2^j) 中权重最大的候选项
+    levels = max(1, n.bit_length())
+    table = np.zeros((levels, n), dtype='<i4')
+    table[0] = np.arange(n)
+    for j in range(1, levels):
+        half = 1 << (j - 1)
+        prev = table[j - 1]
+        table[j] = prev
+        if n - 2 * half + 1 > 0:
+            a, b = prev[:n - 2 * half + 1], prev[half:n - half + 1]
+            table[j, :n - 2 * half + 1] = np.where(weights[b] > weights[a], b, a)
+
+    path = f"{base}.{time.strftime('%Y%m%d_%H%M%S')}.bin"
+    with open(path + '.tmp', 'wb') as f:
+        header = np.array([(MAGIC, n, levels, int(key_offsets[-1]), int(text_offsets[-1]))], dtype=HEADER)
+        f.write(header.tobytes())
+        _align(f)
+        heads = np.array([_head(k) for k in keys], dtype='<u8')
+        for array in (heads, weights, key_offsets, text_offsets, table):
+            f.write(array.tobytes())
+            _align(f)
+        f.write(b''.join(keys))
+        f.write(b''.join(texts))
+    os.replace(path + '.tmp', path)
+
+    pointer = _pointer_path(base)
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(path))
+    os.replace(pointer + '.tmp', pointer)
+
+    for old in sorted(glob.glob(f"{glob.escape(base)}.*.bin"))[:-KEEP_VERSIONS]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+
+class _Keys:
+    """按序号取出第 i 个键（bytes），供 bisect 使用。"""
+
+    def __init__(self, data, offsets, start, n):
+        self.data, self.offsets, self.start, self.n = data, offsets, start, n
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        return self.data[self.start + self.offsets[i]:self.start + self.offsets[i + 1]]
+
+
+class _Snapshot:
+    """一个版本的索引文件的内存映射；各数组都是映射上的 memoryview，不复制数据。"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = np.frombuffer(self.data, dtype=HEADER, count=1)[0] if len(self.data) >= HEADER.itemsize else None
+        if header is None or header['magic'] != MAGIC:
+            raise ValueError(f"{path} 不是补全索引文件")
+        self.path = path
+        n, levels = int(header['n']), int(header['levels'])
+        view = memoryview(self.data)
+        pos = HEADER.itemsize + (-HEADER.itemsize % 8)
+
+        def section(fmt, count, size=4):
+            nonlocal pos
+            part = view[pos:pos + size * count].cast(fmt)
+            pos += size * count
+            pos += -pos % 8
+            return part
+
+        self.n = n
+        self.heads = np.frombuffer(section('Q', n, 8), dtype='<u8')
+        self.weights = section('f', n)
+        key_offsets = section('I', n + 1)
+        self.text_offsets = section('I', n + 1)
+        self.table = section('i', levels * n)
+        self.keys = _Keys(self.data, key_offsets, pos, n)
+        self.text_start = pos + int(header['key_bytes'])
+
+    def best(self, lo, hi):
+        """区间 [lo, hi] 中权重最大的候选项。"""
+        j = (hi - lo + 1).bit_length() - 1
+        a, b = self.table[j * self.n + lo], self.table[j * self.n + hi - (1 << j) + 1]
+        return b if self.weights[b] > self.weights[a] else a
+
+    def text(self, i):
+        start = self.text_start
+        return self.data[start + self.text_offsets[i]:start + self.text_offsets[i + 1]].decode('utf-8')
+
+    def complete(self, prefix, k):
+        key = normalize(prefix).encode('utf-8')
+        head = _head(key)
+        if len(key) < 8:
+            # 前 8 字节落在 [head, head 之后补满 0xff] 之间的键都以 key 开头
+            upper = head | ((1 << (8 * (8 - len(key)))) - 1)
+            lo = int(self.heads.searchsorted(np.uint64(head), 'left'))
+            hi = int(self.heads.searchsorted(np.uint64(upper), 'right')) - 1
+        else:
+            lo = int(self.heads.searchsorted(np.uint64(head), 'left'))
+            end = int(self.heads.searchsorted(np.uint64(head), 'right'))
+            lo = bisect_left(self.keys, key, lo, end)
+            hi = bisect_left(self.keys, key + b'\xff', lo, end) - 1  # UTF-8 中不会出现 0xff
+        if lo > hi:
+            return []
+        m = self.best(lo, hi)
+        heap = [(-self.weights[m], m, lo, hi)]
+        result = []
+        while heap and len(result) < k:
+            _, m, lo, hi = heapq.heappop(heap)
+            result.append(self.text(m))
+            for a, b in ((lo, m - 1), (m + 1, hi)):
+                if a <= b:
+                    best = self.best(a, b)
+                    heapq.heappush(heap, (-self.weights[best], best, a, b))
+        return result
+
+
+class SuggestionIndex:
+    """
+    只读的补全索引。complete(prefix, k) 返回权重最高的 k 个以 prefix 开头的候选项；
+    每隔 check_interval 秒检查一次指针文件的修改时间，变化时自动切换到新版本，也可以直接调用 reload()，
+    或调用 request_reload() 让下一次查询重新加载。
+    """
+
+    def __init__(self, base, check_interval=5.0):
+        self.base = base
+        self.check_interval = check_interval
+        self.snapshot = None
+        self.mtime = None
+        self.next_check = 0.0
+        self.reload_requested = False
+        self.lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """重新读取指针文件并映射其指向的索引文件；失败时保留当前版本。"""
+        pointer = _pointer_path(self.base)
+        with self.lock:
+            try:
+                mtime = os.path.getmtime(pointer)
+                with open(pointer, 'r', encoding='utf-8') as f:
+                    name = f.read().strip()
+                snapshot = _Snapshot(os.path.join(os.path.dirname(pointer), name))
+            except (OSError, ValueError) as e:
+                if self.snapshot is None:
+                    print(f"补全索引不可用: {e}")
+                return False
+            self.snapshot = snapshot
+            self.mtime = mtime
+            print(f"Loaded suggestions: {snapshot.path} ({snapshot.n} entries)")
+            return True
+
+    def request_reload(self):
+        """标记为需要重新加载（不获取锁，可以在信号处理函数中调用），下一次查询时执行。"""
+        self.reload_requested = True
+        self.next_check = 0.0
+
+    def _current(self):
+        now = time.monotonic()
+        if now >= self.next_check:
+            self.next_check = now + self.check_interval
+            requested, self.reload_requested = self.reload_requested, False
+            try:
+                changed = os.path.getmtime(_pointer_path(self.base)) != self.mtime
+            except OSError:
+                changed = False
+            if changed or requested:
+                self.reload()
+        return self.snapshot
+
+    def complete(self, prefix, k=10):
+        snapshot = self._current()
+        if snapshot is None or not snapshot.n:
+            return []
+        return snapshot.complete(prefix, k)
+
+    def __len__(self):
+        snapshot = self.snapshot
+        return 0 if snapshot is None else snapshot.n
+
+
+if __name__ == '__main__':
+    # 从索引中的标题（及 pagerank_score）和查询日志构建补全索引：python suggest.py   （在 query 目录下运行）
+    from elasticsearch import Elasticsearch, helpers
+
+    es = Elasticsearch(["http://localhost:9200"], verify_certs=False, request_timeout=360)
+    titles = ((hit["_source"].get("title", ""), hit["_source"].get("pagerank_score"))
+              for hit in helpers.scan(es, index="my_index", query={"query": {"match_all": {}}},
+                                      _source=["title", "pagerank_score"], size=2000))
+    from query_log import QueryLog
+
+    queries = QueryLog('query_log.db').queries()
+    entries = collect(titles, queries)
+    print(f"Saved {write_suggestions(entries, 'suggestions')} ({len(entries)} entries)")
@@ -0,0 +1,268 @@
+# shards.py
+# 流式分片读写：每个页面一行 JSON（JSONL），可选 gzip / zstd 压缩。
+# - 每条记录单独压缩为一个 gzip member / zstd frame，爬到一页写一页，不在内存中攒批
+# - 每个分片配一个偏移索引文件（.idx，uint64 数组），可以按序号直接 seek 读取单条记录
+# - manifest.json 记录目录下所有分片的文件名、记录数、字节数和压缩方式
+# 读取端 iter_docs() 同时兼容旧的 data_N.json（整个 JSON 数组）格式，旧格式用 ijson 流式读取。
+import gzip
+import io
+import json
+import os
+import re
+import time
+from array import array
+
+import ijson
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST_FILE = 'manifest.json'
+# 与分片放在同一目录、但不是页面数据的文件
+NON_SHARD_FILES = {MANIFEST_FILE, 'aliases.jsonl'}
+EXTENSIONS = {None: '.jsonl', 'gzip': '.jsonl.gz', 'zstd': '.jsonl.zst'}
+
+
+def _compressor(compression):
+    if compression is None:
+        return lambda data: data
+    if compression == 'gzip':
+        return lambda data: gzip.compress(data, compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd 压缩需要安装 zstandard：pip install zstandard")
+        return zstandard.ZstdCompressor(level=3).compress
+    raise ValueError(f"不支持的压缩方式: {compression}")
+
+
+def _decompressor(path):
+    if path.endswith('.gz'):
+        return gzip.decompress
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("读取 .zst 分片需要安装 zstandard：pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress
+    return lambda data: data
+
+
+class ShardWriter:
+    """
+    流式分片写入器：write(doc) 立即写入当前分片，达到 max_records 条后切换到下一个分片。
+    新建时从第 1 个分片开始写，并删除目录中上一次写入的同名前缀分片和偏移索引（list_shards 列出的是目录，
+    留下的旧分片会被当作本次的数据读取），manifest.json 同时清空；
+    state() / ShardWriter(..., resume_state=...) 用于配合抓取 checkpoint 断点续写。
+    """
+
+    def __init__(self, out_dir, prefix='data', max_records=3000, compression='gzip', resume_state=None):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.max_records = max_records
+        self.compression = compression
+        self.compress = _compressor(compression)
+        self.file = None
+        self.index_file = None
+        if resume_state:
+            self._resume(resume_state)
+        else:
+            self._remove_old_shards()
+            self.manifest = {'shards': []}
+            save_manifest(out_dir, self.manifest)
+            self.shard_index = 1
+            self.records = 0
+            self.size = 0
+
+    def _paths(self, n):
+        name = f'{self.prefix}_{n:05d}{EXTENSIONS[self.compression]}'
+        return os.path.join(self.out_dir, name), os.path.join(self.out_dir, f'{self.prefix}_{n:05d}.idx')
+
+    def _remove_old_shards(self):
+        pattern = re.compile(rf'^{re.escape(self.prefix)}_\d{{5}}(\.jsonl(\.gz|\.zst)?|\.idx)$')
+        for name in os.listdir(self.out_dir):
+            if pattern.match(name):
+                os.remove(os.path.join(self.out_dir, name))
+
+    def _open(self, mode):
+        path, index_path = self._paths(self.shard_index)
+        self.file = open(path, mode)
+        self.index_file = open(index_path, mode)
+
+    def _resume(self, state):
+        # 把当前分片截断到 checkpoint 时的长度，丢弃之后写入的半截数据
+        self.shard_index = state['shard_index']
+        self.records = state['records']
+        self.size = state['size']
+        self.manifest = load_manifest(self.out_dir)
+        self.manifest['shards'] = [s for s in self.manifest['shards'] if s['shard_index'] < self.shard_index]
+        # checkpoint 之后才创建的分片全部删除
+        n = self.shard_index + 1
+        while os.path.exists(self._paths(n)[0]):
+            for stale in self._paths(n):
+                os.remove(stale)
+            n += 1
+        path, index_path = self._paths(self.shard_index)
+        if os.path.exists(path):
+            self._open('r+b')
+            self.file.truncate(self.size)
+            self.index_file.truncate(self.records * 8)
+            self.file.seek(0, os.SEEK_END)
+            self.index_file.seek(0, os.SEEK_END)
+
+    def write(self, doc):
+        if self.file is None:
+            self._open('wb')
+        data = self.compress(json.dumps(doc, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.index_file.write(array('Q', [self.size]).tobytes())
+        self.file.write(data)
+        self.size += len(data)
+        self.records += 1
+        if self.records >= self.max_records:
+            self._close_shard()
+
+    def _close_shard(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.index_file.close()
+        self.file = None
+        self.index_file = None
+        path, index_path = self._paths(self.shard_index)
+        self.manifest['shards'].append({
+            'shard_index': self.shard_index,
+            'file': os.path.basename(path),
+            'index': os.path.basename(index_path),
+            'records': self.records,
+            'bytes': self.size,
+            'compression': self.compression,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+        save_manifest(self.out_dir, self.manifest)
+        print(f"保存 {self.records} 个页面到 {path}")
+        self.shard_index += 1
+        self.records = 0
+        self.size = 0
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+            self.index_file.flush()
+            os.fsync(self.file.fileno())
+            os.fsync(self.index_file.fileno())
+
+    def state(self):
+        """当前写入位置，保存在抓取 checkpoint 中。"""
+        self.flush()
+        return {'shard_index': self.shard_index, 'records': self.records, 'size': self.size}
+
+    def close(self):
+        self._close_shard()
+
+
+def load_manifest(data_dir):
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'shards': []}
+
+
+def save_manifest(data_dir, manifest):
+    path = os.path.join(data_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def is_shard(filename):
+    return filename.endswith(('.json', '.jsonl', '.jsonl.gz', '.jsonl.zst')) and filename not in NON_SHARD_FILES
+
+
+def list_shards(data_dir):
+    """目录下的所有数据文件（新的 JSONL 分片和旧的 .json 文件），按文件名排序。"""
+    return [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir)) if is_shard(name)]
+
+
+def iter_lines(path):
+    """逐行读取一个 JSONL 分片（自动解压），返回每条记录的原始字节。"""
+    if path.endswith('.gz'):
+        f = gzip.open(path, 'rb')
+    elif path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("读取 .zst 分片需要安装 zstandard：pip install zstandard")
+        raw = open(path, 'rb')
+        f = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+    else:
+        f = open(path, 'rb')
+    with f:
+        lines = _lines(f) if path.endswith('.zst') else f
+        for line in lines:
+            if line.strip():
+                yield line
+
+
+def iter_records(path):
+    """逐条读取一个数据文件中的文档，内存占用与单条记录大小相关，与文件大小无关。"""
+    if path.endswith('.json'):
+        # 旧格式：整个文件是一个 JSON 数组或单个对象，用 ijson 流式解析，不把整个文件读入内存
+        with open(path, 'rb') as f:
+            head = f.read(64).lstrip()
+            f.seek(0)
+            yield from ijson.items(f, 'item' if head.startswith(b'[') else '', use_float=True)
+        return
+    for line in iter_lines(path):
+        yield json.loads(line)
+
+
+def _lines(stream, chunk_size=1 << 20):
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        yield from lines
+    if pending:
+        yield pending
+
+
+def iter_docs(data_dir):
+    """逐条读取目录下所有数据文件中的文档。"""
+    for path in list_shards(data_dir):
+        print(f"Processing file: {os.path.basename(path)}")
+        yield from iter_records(path)
+
+
+def read_offsets(path):
+    """读取分片的偏移索引，返回每条记录的起始字节位置。"""
+    index_path = path.rsplit('.jsonl', 1)[0] + '.idx'
+    offsets = array('Q')
+    with open(index_path, 'rb') as f:
+        offsets.frombytes(f.read())
+    return offsets
+
+
+def read_record(path, i, offsets=None):
+    """根据偏移索引直接读取分片中的第 i 条记录，不读取整个分片。"""
+    if offsets is None:
+        offsets = read_offsets(path)
+    with open(path, 'rb') as f:
+        f.seek(offsets[i])
+        data = f.read(offsets[i + 1] - offsets[i]) if i + 1 < len(offsets) else f.read()
+    return json.loads(_decompressor(path)(data))
+
+
+def read_record_range(path, start, stop, offsets=None):
+    """根据偏移索引读取分片中第 start 到 stop-1 条记录，返回原始字节行的列表；只读取这一段数据。"""
+    if offsets is None:
+        offsets = read_offsets(path)
+    with open(path, 'rb') as f:
+        f.seek(offsets[start])
+        data = f.read(offsets[stop] - offsets[start]) if stop < len(offsets) else f.read()
+    if path.endswith('.gz'):
+        data = gzip.decompress(data)  # 多个 gzip member 连续解压
+    elif path.endswith('.zst'):
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True) as reader:
+            data = reader.read()
+    return [line for line in data.split(b'\n') if line.strip()]
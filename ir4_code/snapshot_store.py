@@ -0,0 +1,242 @@
+# snapshot_store.py
+# 网页快照（raw_html）的本地存储，代替在 Elasticsearch 中保存不参与检索的 raw_html 字段：
+# - 按内容寻址：快照按内容的 sha1 去重，内容相同的页面（或重复导入的同一页面）只保存一份
+# - 每个快照单独 gzip 压缩后追加到包文件（pack_00001.pack，超过 PACK_SIZE 换下一个），
+#   查询服务可以把压缩数据直接作为 Content-Encoding: gzip 的响应返回，不需要解压再压缩
+# - URL -> (内容哈希, 包文件, 偏移, 长度) 的索引：index.bin 为按 URL 指纹排序的定长记录数组，
+#   之后新写入的记录先追加到 journal.bin，flush() 时合并进 index.bin
+# - 读取端对包文件做内存映射，查找是对索引的二分查找
+# 只允许一个写入进程（爬虫或导入程序），读取进程可以有多个：写入端打开时对 writer.lock 加排它锁，
+# 已被其它进程持有时立即失败（进程退出时操作系统自动释放锁，崩溃后不会留下过期的锁，fork 出的子进程不持有锁）。
+import gzip
+import hashlib
+import mmap
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from frontier import url_fingerprint
+
+PACK_SIZE = 256 * 1024 * 1024  # 单个包文件的大小上限
+INDEX_FILE = 'index.bin'
+JOURNAL_FILE = 'journal.bin'
+LOCK_FILE = 'writer.lock'
+PACK_PATTERN = re.compile(r'^pack_(\d+)\.pack$')
+
+RECORD = np.dtype([('url', '<u8'), ('digest', 'S20'), ('pack', '<u4'), ('offset', '<u8'), ('length', '<u4')])
+
+
+def snapshot_digest(data):
+    """快照内容（bytes）的 sha1，同时用作 ETag。"""
+    return hashlib.sha1(data).digest()
+
+
+def compress_snapshot(data):
+    # mtime=0：相同内容压缩结果相同
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _pack_path(store_dir, n):
+    return os.path.join(store_dir, f'pack_{n:05d}.pack')
+
+
+def _lock_writer(store_dir):
+    """对存储目录的 writer.lock 加非阻塞的排它锁，返回打开的锁文件；已被其它进程持有时抛出 RuntimeError。"""
+    f = open(os.path.join(store_dir, LOCK_FILE), 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            # lockf（POSIX 记录锁）不会被 fork 出的子进程继承：写入端之后启动的解析进程池在主进程崩溃后
+            # 仍然存活时，也不会继续持有锁
+            fcntl.lockf(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.seek(0)
+        owner = f.read().strip() or '?'
+        f.close()
+        raise RuntimeError(f"快照存储 {store_dir} 已被另一个写入进程（pid {owner}）打开，爬虫和导入程序不能同时写入")
+    f.truncate(0)
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+def _read_records(path):
+    """读取记录文件；末尾不完整的记录（写入时中断）被忽略。"""
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=RECORD)
+    with open(path, 'rb') as f:
+        data = f.read()
+    usable = len(data) - len(data) % RECORD.itemsize
+    return np.frombuffer(data[:usable], dtype=RECORD)
+
+
+def _merge_records(*arrays):
+    """合并多个记录数组，同一 URL 以后出现的记录为准，返回按 URL 指纹排序的数组。"""
+    records = np.concatenate(arrays)
+    if len(records) == 0:
+        return records
+    order = np.argsort(records['url'], kind='stable')
+    records = records[order]
+    last = np.append(records['url'][1:] != records['url'][:-1], True)
+    return records[last]
+
+
+class SnapshotWriter:
+    """
+    快照写入端：put(url, html_bytes) 保存一个页面的快照，flush() 合并索引，close() 关闭。
+    同一存储目录同时只能打开一个写入端，否则抛出 RuntimeError。
+    """
+
+    def __init__(self, store_dir, pack_size=PACK_SIZE):
+        self.store_dir = store_dir
+        self.pack_size = pack_size
+        os.makedirs(store_dir, exist_ok=True)
+        # 先加锁再读取索引和包文件的写入位置，两个进程不会按各自的偏移追加同一个包文件
+        self.lock_file = _lock_writer(store_dir)
+        self.index_path = os.path.join(store_dir, INDEX_FILE)
+        self.journal_path = os.path.join(store_dir, JOURNAL_FILE)
+
+        # 已有快照的位置（内容哈希 -> (包文件, 偏移, 长度)），用于去重
+        records = _merge_records(_read_records(self.index_path), _read_records(self.journal_path))
+        self.records = {int(r['url']): r for r in records}
+        self.locations = {bytes(r['digest']): (int(r['pack']), int(r['offset']), int(r['length'])) for r in records}
+
+        packs = [int(m.group(1)) for m in map(PACK_PATTERN.match, os.listdir(store_dir)) if m]
+        self.pack_no = max(packs, default=1)
+        self.pack = open(_pack_path(store_dir, self.pack_no), 'ab')
+        self.pack_offset = self.pack.tell()
+        self.journal = open(self.journal_path, 'ab')
+        # 截掉中断时写了一半的记录
+        self.journal.truncate(self.journal.tell() - self.journal.tell() % RECORD.itemsize)
+        self.journal.seek(0, os.SEEK_END)
+        self.added = 0
+
+    def __contains__(self, digest):
+        return digest in self.locations
+
+    def put(self, url, data):
+        """保存快照（data 为 bytes），内容已存在时只记录 URL。返回内容哈希。"""
+        digest = snapshot_digest(data)
+        self.put_compressed(url, digest, None if digest in self.locations else compress_snapshot(data))
+        return digest
+
+    def put_compressed(self, url, digest, blob):
+        """保存已经在别处（如导入程序的解析进程）压缩好的快照；内容已存在时 blob 可以为 None。"""
+        location = self.locations.get(digest)
+        if location is None:
+            location = self._append(blob)
+            self.locations[digest] = location
+            self.added += 1
+        fp = url_fingerprint(url)
+        old = self.records.get(fp)
+        if old is not None and bytes(old['digest']) == digest:
+            return
+        record = np.array([(fp, digest) + location], dtype=RECORD)[0]
+        self.records[fp] = record
+        self.journal.write(record.tobytes())
+        self.journal.flush()  # 读取端在 flush() 之前也能看到新快照
+
+    def _append(self, blob):
+        if self.pack_offset and self.pack_offset + len(blob) > self.pack_size:
+            self.pack.close()
+            self.pack_no += 1
+            self.pack = open(_pack_path(self.store_dir, self.pack_no), 'ab')
+            self.pack_offset = 0
+        offset = self.pack_offset
+        self.pack.write(blob)
+        self.pack.flush()  # 快照数据先于 journal 中的记录写出
+        self.pack_offset += len(blob)
+        return self.pack_no, offset, len(blob)
+
+    def flush(self):
+        """包文件先落盘，再把 journal 合并进排序后的 index.bin。"""
+        self.pack.flush()
+        os.fsync(self.pack.fileno())
+        self.journal.flush()
+        records = np.array(list(self.records.values()), dtype=RECORD)
+        records = records[np.argsort(records['url'], kind='stable')] if len(records) else records
+        with open(self.index_path + '.tmp', 'wb') as f:
+            f.write(records.tobytes())
+        os.replace(self.index_path + '.tmp', self.index_path)
+        self.journal.truncate(0)
+        self.journal.seek(0)
+
+    def close(self):
+        self.flush()
+        self.pack.close()
+        self.journal.close()
+        self.lock_file.close()  # 关闭文件即释放锁
+
+
+class SnapshotStore:
+    """
+    快照读取端：locate(url) 返回 (ETag, 包文件, 偏移, 长度)，read(pack, offset, length) 返回 gzip 压缩的快照。
+    每隔 check_interval 秒检查一次索引是否有更新（写入端正在运行时也能读到新快照）。
+    """
+
+    def __init__(self, store_dir, check_interval=5.0):
+        self.store_dir = store_dir
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.records = np.zeros(0, dtype=RECORD)
+        self.mtimes = None
+        self.next_check = 0.0
+        self.maps = {}
+
+    def _mtimes(self):
+        result = []
+        for name in (INDEX_FILE, JOURNAL_FILE):
+            try:
+                stat = os.stat(os.path.join(self.store_dir, name))
+                result.append((stat.st_mtime, stat.st_size))
+            except OSError:
+                result.append(None)
+        return result
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+        mtimes = self._mtimes()
+        if mtimes == self.mtimes:
+            return
+        # 只替换引用，正在查找的请求继续使用旧的数组
+        self.records = _merge_records(_read_records(os.path.join(self.store_dir, INDEX_FILE)),
+                                      _read_records(os.path.join(self.store_dir, JOURNAL_FILE)))
+        self.mtimes = mtimes
+
+    def locate(self, url):
+        with self.lock:
+            self._refresh()
+        records = self.records
+        fp = np.uint64(url_fingerprint(url))
+        i = int(np.searchsorted(records['url'], fp))
+        if i == len(records) or records['url'][i] != fp:
+            return None
+        r = records[i]
+        return bytes(r['digest']).hex(), int(r['pack']), int(r['offset']), int(r['length'])
+
+    def read(self, pack, offset, length):
+        with self.lock:
+            mapped = self.maps.get(pack)
+            if mapped is None or offset + length > len(mapped):
+                # 写入端还在向该包文件追加数据时，重新映射到当前大小
+                with open(_pack_path(self.store_dir, pack), 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.maps[pack] = mapped
+        return mapped[offset:offset + length]
+
+    def get(self, url):
+        """返回 (ETag, gzip 压缩的快照)，没有快照时返回 None。"""
+        location = self.locate(url)
+        if location is None:
+            return None
+        return location[0], self.read(*location[1:])
@@ -1,16 +1,23 @@
 import requests
-from bs4 import BeautifulSoup
 import json
 import os
+import shutil
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 from urllib.parse import urljoin, urlparse
-from collections import deque
 import re
 
+from extract import ATTACHMENT_PATTERN, extract_page
+from fetcher import CrawlEngine
+from frontier import Frontier, PriorityFrontier
+from crawl_meta import CrawlMetaStore, content_hash
+from dedup import NearDupIndex, simhash
+from shards import ShardWriter
+from snapshot_store import SnapshotWriter, compress_snapshot, snapshot_digest
+
 # 设置保存路径
 SAVE_PATH = r'E:\ir24\ir_lab4\ir4_code\JSON'
-if not os.path.exists(SAVE_PATH):
-    os.makedirs(SAVE_PATH)
 
 # 初始URL
 START_URL = 'https://cc.nankai.edu.cn/'
@@ -23,15 +30,40 @@ HEADERS = {
 
 # 设置爬取限制
 MAX_PAGES = 100000  # 最大爬取页面数
-BATCH_SIZE = 3000   # 每个JSON文件保存的页面数
-DELAY = 1            # 每次请求的延时（秒）
+BATCH_SIZE = 3000   # 每个分片保存的页面数
+SHARD_COMPRESSION = 'gzip'  # 分片压缩方式：'gzip'、'zstd'（需安装 zstandard）或 None
+DELAY = 1            # 同一主机两次请求之间的最小间隔（秒）
+CONCURRENCY = 16     # 同时在途的请求数
+PER_HOST_CONCURRENCY = 2  # 每个主机同时在途的请求数
+PARSE_WORKERS = os.cpu_count() or 1  # 解析页面的进程数
+STATS_INTERVAL = 100  # 每爬取多少页输出一次速度统计
+CHECKPOINT_INTERVAL = 300  # 每隔多少秒保存一次数据和抓取状态（checkpoint）
+RESUME = True        # 状态目录中有checkpoint时，从上次中断处继续爬取
+STATE_DIR = 'crawl_state'  # 抓取状态目录（位于SAVE_PATH下）
+# 调度方式：'bfs' 广度优先；'opic' 按 OPIC 在线重要性估计优先抓取重要页面（适合有 MAX_PAGES 预算的抓取）
+SCHEDULER = 'bfs'
+
+# 增量抓取：发送条件请求，只把新增或变化的页面写入 SAVE_PATH 下新的 delta_* 目录，
+# 已删除的页面（404/410）记录在该目录的 removed.txt 中
+INCREMENTAL = False
+META_DB = 'crawl_meta.db'  # URL 元数据库（ETag、Last-Modified、内容哈希、出链），位于SAVE_PATH下
+
+# 近似重复检测：与已保存页面的 SimHash 汉明距离不超过 SIMHASH_DISTANCE 的页面不再保存，
+# 只在输出目录的 aliases.jsonl 中记录为已保存页面（canonical）的别名
+DEDUP = True
+SIMHASH_DISTANCE = 3
+
+# 网页快照：保存的页面同时写入压缩的本地快照存储（按内容去重），供 query.py 的 /snapshot 使用
+SNAPSHOTS = True
+SNAPSHOT_DIR = 'snapshots'  # 快照存储目录（位于SAVE_PATH下）
 
 # 解析robots.txt
-def parse_robots(url):
+def parse_robots(url, session=None):
     parsed = urlparse(url)
     robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
     try:
-        response = requests.get(robots_url, headers=HEADERS, timeout=10)
+        getter = session.get if session is not None else requests.get
+        response = getter(robots_url, headers=HEADERS, timeout=10)
         if response.status_code == 200:
             disallow = []
             for line in response.text.split('\n'):
@@ -55,11 +87,28 @@ def is_allowed(url, disallow_list):
             return False
     return True
 
+# 按主机缓存robots.txt规则，每个主机只请求一次
+class RobotsCache:
+    def __init__(self, session=None):
+        self.session = session
+        self.rules = {}
+        self.lock = threading.Lock()
+
+    def allowed(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            disallow_list = self.rules.get(host)
+        if disallow_list is None:
+            # 锁外请求，避免一个慢主机阻塞其它主机的检查；并发时最多重复请求一次
+            disallow_list = parse_robots(url, self.session)
+            with self.lock:
+                self.rules[host] = disallow_list
+        return is_allowed(url, disallow_list)
+
 # 提取页面中的所有链接，并区分附件链接
 def extract_links(soup, base_url, domain):
     links = set()
     attachments = set()
-    attachment_pattern = re.compile(r'.*\.(pdf|docx?|xlsx?|pptx?)$', re.IGNORECASE)
 
     for a_tag in soup.find_all('a', href=True):
         href = a_tag['href'].strip()
@@ -69,12 +118,18 @@ def extract_links(soup, base_url, domain):
             full_url = full_url.split('#')[0]
             if re.match(r'^https?://', full_url):
                 # 判断是否是附件
-                if attachment_pattern.match(full_url):
+                if ATTACHMENT_PATTERN.match(full_url):
                     attachments.add(full_url)
                 else:
                     links.add(full_url)
     return links, attachments
 
+# 在解析进程中执行：提取页面信息并计算近似重复检测用的 SimHash 指纹
+def parse_page(url, content, domain):
+    page_info = extract_page(url, content, domain)
+    fingerprint = simhash(page_info['title'] + page_info['content']) if DEDUP else None
+    return page_info, fingerprint
+
 # 提取页面信息
 def extract_page_info(url, soup, anchor_texts, outlinks, attachments, raw_html):
     title_tag = soup.find('title')
@@ -100,77 +155,198 @@ def extract_page_info(url, soup, anchor_texts, outlinks, attachments, raw_html):
     }
 
 def main():
+    if not os.path.exists(SAVE_PATH):
+        os.makedirs(SAVE_PATH)
+
     parsed_start = urlparse(START_URL)
     domain = parsed_start.netloc
 
-    disallow_list = parse_robots(START_URL)
-    if not is_allowed(START_URL, disallow_list):
+    engine = CrawlEngine(HEADERS, concurrency=CONCURRENCY, per_host=PER_HOST_CONCURRENCY, delay=DELAY)
+    robots = RobotsCache(engine.session)
+    if not robots.allowed(START_URL):
         print(f"起始URL {START_URL} 被robots.txt禁止爬取。")
         return
 
-    queue = deque([START_URL])
-    visited = set()
-    data_buffer = []
-    file_index = 1
-    page_count = 0
+    meta_store = CrawlMetaStore(os.path.join(SAVE_PATH, META_DB))
+    snapshots = SnapshotWriter(os.path.join(SAVE_PATH, SNAPSHOT_DIR)) if SNAPSHOTS else None
+    near_dups = NearDupIndex(SIMHASH_DISTANCE)
 
-    while queue and page_count < MAX_PAGES:
-        current_url = queue.popleft()
-        if current_url in visited:
-            continue
-        if not is_allowed(current_url, disallow_list):
-            print(f"跳过被robots.txt禁止的URL: {current_url}")
-            continue
+    # 入队时去重的磁盘溢出队列；全量抓取与增量抓取使用各自的状态目录
+    state_dir = os.path.join(SAVE_PATH, 'delta_state' if INCREMENTAL else STATE_DIR)
+    frontier_class = PriorityFrontier if SCHEDULER == 'opic' else Frontier
+    frontier = frontier_class(state_dir)
+    meta = frontier.load() if RESUME else None
+    if meta and not meta.get('finished'):
+        out_dir = meta['out_dir']
+        writer = ShardWriter(out_dir, max_records=BATCH_SIZE, compression=SHARD_COMPRESSION,
+                             resume_state=meta['writer'])
+        page_count = meta['page_count']
+        near_dups.load(os.path.join(state_dir, 'near_dups.jsonl'))
+        print(f"从checkpoint恢复：已爬取 {page_count} 页，队列中 {len(frontier)} 个URL")
+    else:
+        if meta:
+            # 上次抓取已正常结束，清空状态重新开始
+            shutil.rmtree(state_dir)
+            frontier = frontier_class(state_dir)
+        if INCREMENTAL:
+            out_dir = os.path.join(SAVE_PATH, time.strftime('delta_%Y%m%d_%H%M%S'))
+            os.makedirs(out_dir)
+        else:
+            out_dir = SAVE_PATH
+        # 每爬取一页立即写入 JSONL 分片，不在内存中攒批
+        writer = ShardWriter(out_dir, max_records=BATCH_SIZE, compression=SHARD_COMPRESSION)
+        page_count = 0
+        frontier.push(START_URL)
+    unchanged_count = 0
+    duplicate_count = 0
+    last_checkpoint = time.monotonic()
 
-        try:
-            response = requests.get(current_url, headers=HEADERS, timeout=10)
-            if response.status_code != 200:
-                print(f"无法访问URL: {current_url} 状态码: {response.status_code}")
-                continue
+    # 页面解析是CPU密集型工作，放到进程池中与抓取并行
+    parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
 
-            soup = BeautifulSoup(response.content, 'html.parser')
+    # 在工作线程中执行：检查robots.txt（按主机缓存）后抓取，增量模式下发送条件请求；
+    # 新增或变化的页面提交到进程池解析，返回主线程处理所需的全部信息
+    def fetch_task(url):
+        if not robots.allowed(url):
+            print(f"跳过被robots.txt禁止的URL: {url}")
+            return None
+        record = meta_store.get(url) if INCREMENTAL else None
+        response = engine.fetch(url, headers=meta_store.conditional_headers(record))
+        result = {
+            'status': response.status_code,
+            'record': record,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'nbytes': len(response.content),
+            'digest': None,
+            'page': None,
+            'simhash': None,
+            'snapshot': None,
+        }
+        if response.status_code == 200:
+            result['digest'] = content_hash(response.content)
+            if not (record and record['content_hash'] == result['digest']):
+                page_info, fingerprint = parse_pool.submit(parse_page, url, response.content, domain).result()
+                page_info['raw_html'] = response.text
+                result['page'] = page_info
+                result['simhash'] = fingerprint
+                if snapshots is not None:
+                    # 压缩在工作线程中完成，主线程只追加写入
+                    html = page_info['raw_html'].encode('utf-8')
+                    result['snapshot'] = (snapshot_digest(html), compress_snapshot(html))
+        return result
 
-            # 收集当前页面的锚文本
-            anchor_texts = set(a.get_text(strip=True) for a in soup.find_all('a', href=True) if a.get_text(strip=True))
+    # 分片和快照先落盘再保存队列状态（含分片写入位置），保证恢复后不会丢页面
+    def checkpoint(finished=False):
+        nonlocal last_checkpoint
+        if finished:
+            writer.close()
+        if snapshots is not None:
+            if finished:
+                snapshots.close()
+            else:
+                snapshots.flush()
+        meta_store.commit()
+        near_dups.save(os.path.join(state_dir, 'near_dups.jsonl'))
+        frontier.checkpoint({'out_dir': out_dir, 'writer': writer.state(),
+                             'page_count': page_count, 'finished': finished})
+        last_checkpoint = time.monotonic()
 
-            # 提取新的链接
-            outlinks, attachments = extract_links(soup, current_url, domain)
+    def enqueue(current_url, outlinks):
+        if page_count >= MAX_PAGES:
+            engine.stop()
+        else:
+            # 将 outlinks 加入队列（已见过的URL会被frontier丢弃）
+            frontier.push_links(current_url, outlinks)
 
-            # 构建页面信息
-            page_info = extract_page_info(current_url, soup, anchor_texts, outlinks, attachments, response.text)
-            data_buffer.append(page_info)
+    # 保存数据、将出链加入队列
+    def process(current_url, result):
+        nonlocal page_count, unchanged_count, duplicate_count
+        status = result['status']
+        record = result['record']
+        if status == 304 and record:
+            # 页面未变化：沿用上次保存的出链继续遍历
+            meta_store.touch(current_url)
             page_count += 1
-            print(f"爬取页面 {page_count}: {current_url}")
-
-            # 保存数据
-            if page_count % BATCH_SIZE == 0:
-                file_path = os.path.join(SAVE_PATH, f'data_{file_index}.json')
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(data_buffer, f, ensure_ascii=False, indent=4)
-                print(f"保存 {BATCH_SIZE} 个页面到 {file_path}")
-                data_buffer = []
-                file_index += 1
-
-            # 将 outlinks 加入队列
-            for link in outlinks:
-                if link not in visited:
-                    queue.append(link)
-
-            visited.add(current_url)
-            time.sleep(DELAY)  # 延时防止对服务器造成压力
-
-        except Exception as e:
-            print(f"处理URL {current_url} 时出错: {e}")
-            continue
+            unchanged_count += 1
+            engine.stats.record()
+            enqueue(current_url, record['outlinks'])
+            return
+        if status in (404, 410) and record:
+            meta_store.remove(current_url)
+            with open(os.path.join(out_dir, 'removed.txt'), 'a', encoding='utf-8') as f:
+                f.write(current_url + '\n')
+        if status != 200:
+            print(f"无法访问URL: {current_url} 状态码: {status}")
+            engine.stats.record(ok=False)
+            return
+
+        page_info = result['page']
+        if page_info is None:
+            # 服务器不支持条件请求，但内容哈希相同，同样视为未变化
+            meta_store.update(current_url, result['etag'], result['last_modified'], result['digest'],
+                              record['outlinks'])
+            page_count += 1
+            unchanged_count += 1
+            engine.stats.record(nbytes=result['nbytes'])
+            enqueue(current_url, record['outlinks'])
+            return
+
+        outlinks = page_info['outlinks']
+        meta_store.update(current_url, result['etag'], result['last_modified'], result['digest'], outlinks)
+
+        fingerprint = result['simhash']
+        if fingerprint is not None:
+            canonical = near_dups.find(fingerprint)
+            if canonical is not None and canonical != current_url:
+                # 近似重复：只记录别名，不保存整页
+                with open(os.path.join(out_dir, 'aliases.jsonl'), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'url': current_url, 'canonical': canonical}, ensure_ascii=False) + '\n')
+                page_count += 1
+                duplicate_count += 1
+                engine.stats.record(nbytes=result['nbytes'])
+                enqueue(current_url, outlinks)
+                return
+            near_dups.add(fingerprint, current_url)
+
+        writer.write(page_info)
+        if result['snapshot'] is not None:
+            snapshots.put_compressed(current_url, *result['snapshot'])
+        page_count += 1
+        engine.stats.record(nbytes=result['nbytes'])
+        print(f"爬取页面 {page_count}: {current_url}")
+        if page_count % STATS_INTERVAL == 0:
+            print(f"抓取速度: {engine.stats.summary()}")
+
+        enqueue(current_url, outlinks)
+
+    # 在主线程中执行
+    def handle(current_url, result):
+        if page_count >= MAX_PAGES:
+            # 超出页数上限的结果直接丢弃
+            return
+        if result is not None:
+            process(current_url, result)
+        # 出链入队之后再标记完成（OPIC 调度在入队时需要该页面持有的现金）
+        frontier.done(current_url)
+
+        if time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+            checkpoint()
+
+    try:
+        engine.run(frontier.pop, fetch_task, handle)
+    finally:
+        parse_pool.shutdown()
 
-    # 保存剩余的数据
-    if data_buffer:
-        file_path = os.path.join(SAVE_PATH, f'data_{file_index}.json')
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data_buffer, f, ensure_ascii=False, indent=4)
-        print(f"保存剩余的 {len(data_buffer)} 个页面到 {file_path}")
+    # 关闭最后一个分片；正常结束时标记完成，下次运行重新开始（中途崩溃则从checkpoint恢复）
+    checkpoint(finished=True)
+    meta_store.close()
 
-    print("爬取完成。")
+    if duplicate_count:
+        print(f"{duplicate_count} 个近似重复页面记录为别名：{os.path.join(out_dir, 'aliases.jsonl')}")
+    if INCREMENTAL:
+        print(f"增量抓取完成：{unchanged_count} 个页面未变化，变化的页面保存在 {out_dir}")
+    print(f"爬取完成。{engine.stats.summary()}")
 
 if __name__ == '__main__':
     main()